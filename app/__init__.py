@@ -8,6 +8,10 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    # Levels / text or JSON lines / rate limit for the services' loggers
+    from app.services.logs import configure_logging
+    configure_logging(app)
+
     db.init_app(app)
 
     from app.routes import main
@@ -16,18 +20,37 @@ def create_app(config_class=Config):
     import os
     app.jinja_env.filters['basename'] = os.path.basename
 
-    # Enable Write Ahead Logging (WAL) for better concurrency
-    from sqlalchemy import event
-    from sqlalchemy.engine import Engine
+    # Hot-path instrumentation (no-op unless METRICS_ENABLED)
+    from app.services import metrics
+    metrics.configure(app)
+
+    # Per-request timing / SQL counts (no-op unless PROFILE_REQUESTS)
+    from app.services.profiling import init_profiling
+    init_profiling(app)
+
+    # Filesystem watcher (started by the first request if WATCH_LIBRARIES)
+    from app.services.watcher import init_watcher
+    init_watcher(app)
 
-    @event.listens_for(Engine, "connect")
-    def set_sqlite_pragma(dbapi_connection, connection_record):
-        cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA journal_mode=WAL")
-        cursor.execute("PRAGMA synchronous=NORMAL")
-        cursor.close()
+    # SQLite tuning (WAL, mmap, cache...), read-only browsing session, maintenance
+    from app.database import configure_sqlite, ensure_columns
 
     with app.app_context():
+        configure_sqlite(app)
         db.create_all()
+        ensure_columns()
+
+        # Timeline aggregate, GPS index, people index, album queue and semantic index cleanup
+        # triggers (backfilled the first time)
+        from app.services.timeline import install_timeline
+        from app.services.geo import install_geo
+        from app.services.people import install_people
+        from app.services.albums import install_albums
+        from app.services.semantic import install_semantic
+        install_timeline()
+        install_geo()
+        install_people()
+        install_albums()
+        install_semantic()
 
     return app
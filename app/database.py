@@ -0,0 +1,201 @@
+"""
+SQLite connection management.
+
+- Tuned pragmas on every connection (WAL, mmap, cache, temp_store, busy timeout).
+- A read-only engine/session for browsing routes (PRAGMA query_only), so grid
+  requests never take write locks or see half-flushed request state.
+- A single background write queue: scans, the watcher and other jobs submit their
+  DB work here, so at most one background writer ever competes with request writes.
+- Retry with exponential backoff on "database is locked" instead of a huge busy timeout.
+- Periodic PRAGMA optimize + passive WAL checkpoints.
+"""
+import random
+import threading
+import time
+import concurrent.futures
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import scoped_session, sessionmaker
+from flask_sqlalchemy.query import Query
+from app import db
+from app.services import metrics
+from app.services.logs import get_logger
+
+log = get_logger(__name__)
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 268435456,   # 256 MB memory-mapped reads
+    'cache_size': -65536,     # 64 MB page cache (negative = KiB)
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,     # ms; SQLite's busy handler sleeps with increasing backoff up to this
+}
+
+# Read-only session for browsing routes. Bound in configure_sqlite().
+# Uses Flask-SQLAlchemy's Query class so .paginate() keeps working.
+read_session = scoped_session(sessionmaker(query_cls=Query))
+
+_write_queue = None
+_maintenance_thread = None
+
+def _apply_pragmas(dbapi_connection, pragmas, query_only=False):
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    if query_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+def is_locked_error(exc):
+    return isinstance(exc, OperationalError) and 'locked' in str(exc).lower()
+
+def retry_on_locked(fn, *args, attempts=6, base_delay=0.05, **kwargs):
+    """
+    Calls fn(*args, **kwargs), retrying with exponential backoff + jitter while SQLite
+    reports the database as locked/busy. Rolls back the session between attempts.
+    """
+    for attempt in range(attempts):
+        try:
+            return fn(*args, **kwargs)
+        except OperationalError as e:
+            if not is_locked_error(e) or attempt == attempts - 1:
+                raise
+            db.session.rollback()
+            delay = base_delay * (2 ** attempt) * (1 + random.random())
+            log.warning("Database busy, retrying in %.2fs (%d/%d)...", delay, attempt + 1, attempts - 1)
+            time.sleep(delay)
+
+class WriteQueue:
+    """
+    Single background writer thread.
+    Jobs are callables run one at a time inside the writer's own app context (its own
+    session and pooled connection), then committed. submit() returns a Future.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.jobs = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+
+    def _run(self, fn, args, kwargs, retry):
+        with self.app.app_context():
+            def attempt():
+                result = fn(*args, **kwargs)
+                with metrics.DB_COMMIT.time(kind='write_queue'):
+                    db.session.commit()
+                return result
+            try:
+                if retry:
+                    return retry_on_locked(attempt)
+                return attempt()
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def submit(self, fn, *args, retry=False, **kwargs):
+        """
+        Queues fn(*args, **kwargs). Pass retry=True only for jobs that can safely be
+        re-run from scratch if SQLite stays locked beyond the busy timeout.
+        """
+        return self.jobs.submit(self._run, fn, args, kwargs, retry)
+
+    def run(self, fn, *args, retry=False, **kwargs):
+        """Submits and waits. Must not be called from the writer thread itself."""
+        return self.submit(fn, *args, retry=retry, **kwargs).result()
+
+def get_write_queue(app):
+    """Returns the process-wide WriteQueue, creating it on first use."""
+    global _write_queue
+    if _write_queue is None:
+        _write_queue = WriteQueue(app)
+    return _write_queue
+
+def run_maintenance(engine):
+    """PRAGMA optimize (refresh planner stats where useful) + non-blocking WAL checkpoint."""
+    with engine.connect() as conn:
+        conn.execute(text("PRAGMA optimize"))
+        conn.execute(text("PRAGMA wal_checkpoint(PASSIVE)"))
+
+def _maintenance_loop(app, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            with app.app_context():
+                run_maintenance(db.engine)
+        except Exception as e:
+            log.error("SQLite maintenance error: %s", e)
+
+def ensure_columns():
+    """
+    Minimal forward-only migration, run after db.create_all() (which only creates
+    missing tables): adds model columns and indexes missing from existing tables.
+    """
+    inspector = inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            missing = [c for c in table.columns if c.name not in existing]
+            for column in missing:
+                ddl_type = column.type.compile(dialect=db.engine.dialect)
+                log.info("Schema upgrade: adding %s.%s", table.name, column.name)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {ddl_type}'))
+            known = {i['name'] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in known:
+                    log.info("Schema upgrade: adding index %s", index.name)
+                    index.create(conn, checkfirst=True)
+
+def ensure_triggers(statements):
+    """
+    Creates the given triggers / virtual tables ({name: CREATE statement}) that are
+    missing from the schema. Returns the names that were created, so callers can
+    backfill whatever the new objects would have maintained.
+    """
+    with db.engine.begin() as conn:
+        existing = {name for (name,) in conn.execute(text("SELECT name FROM sqlite_master"))}
+        missing = [name for name in statements if name not in existing]
+        for name in missing:
+            conn.execute(text(statements[name]))
+    return missing
+
+def configure_sqlite(app):
+    """
+    Installs pragmas on the app engine, binds the read-only session and starts
+    periodic maintenance. Called from create_app() inside an app context,
+    before the first connection is opened.
+    """
+    engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        read_session.configure(bind=engine)
+        return
+
+    pragmas = dict(DEFAULT_PRAGMAS)
+    pragmas.update(app.config.get('SQLITE_PRAGMAS', {}))
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragma(dbapi_connection, connection_record):
+        _apply_pragmas(dbapi_connection, pragmas)
+
+    if engine.url.database in (None, '', ':memory:'):
+        # A separate connection would see a different in-memory DB
+        read_session.configure(bind=engine)
+    else:
+        readonly_engine = create_engine(engine.url, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+
+        @event.listens_for(readonly_engine, "connect")
+        def set_readonly_pragma(dbapi_connection, connection_record):
+            _apply_pragmas(dbapi_connection, pragmas, query_only=True)
+
+        read_session.configure(bind=readonly_engine)
+
+    @app.teardown_appcontext
+    def remove_read_session(exc):
+        read_session.remove()
+
+    global _maintenance_thread
+    interval = app.config.get('SQLITE_MAINTENANCE_INTERVAL', 0)
+    if interval and _maintenance_thread is None:
+        _maintenance_thread = threading.Thread(target=_maintenance_loop, args=(app, interval),
+                                               name='sqlite-maintenance', daemon=True)
+        _maintenance_thread.start()
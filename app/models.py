@@ -1,6 +1,10 @@
+import os
 from app import db
 from datetime import datetime
+from sqlalchemy import and_, event, func, inspect, or_, select
 from sqlalchemy.dialects.sqlite import JSON
+from sqlalchemy.orm import Session, deferred
+from app.services.metadata import extract_coordinates
 
 # Association table for rejected matches (Memory)
 rejected_matches = db.Table('rejected_matches',
@@ -13,12 +17,32 @@ class Asset(db.Model):
     __tablename__ = 'assets'
     id = db.Column(db.Integer, primary_key=True)
     file_path = db.Column(db.String, nullable=False, unique=True, index=True)
+    dir_path = db.Column(db.String, index=True) # os.path.dirname(file_path), kept in sync by _sync_dir_path
     file_hash = db.Column(db.String, index=True)
+    # 64-bit perceptual hashes of the image (signed, see services/phash.py), set when the
+    # thumbnail is generated: difference, average and DCT hash. dhash drives near-duplicate
+    # search; ahash / phash are for similarity search and burst grouping
+    dhash = db.Column(db.BigInteger)
+    ahash = db.Column(db.BigInteger)
+    phash = db.Column(db.BigInteger)
     added_at = db.Column(db.DateTime, default=datetime.utcnow)
     captured_at = db.Column(db.DateTime, index=True)
+    # Decimal degrees parsed from meta_json at ingest (see _sync_coordinates); mirrored into
+    # the asset_geo R*Tree by triggers (services/geo.py)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
     media_type = db.Column(db.String)
     title = db.Column(db.String)
-    meta_json = db.Column(JSON)
+    # Multi-KB ExifTool dump: deferred so list queries don't fetch/deserialize it (load with undefer() when needed)
+    meta_json = deferred(db.Column(JSON))
+    # Set when title / rating / people change in the DB; cleared by /sync once written to the file.
+    # The version lets sync clear the flag only if nothing changed while the write was running.
+    metadata_dirty = db.Column(db.Boolean, default=False, index=True)
+    # Part of the dirty state: the people in the photo changed, so /sync must (re)write the
+    # people list even if it is now empty. Otherwise people are only written when the DB
+    # has confirmed faces, leaving names other tools put in the file alone.
+    people_dirty = db.Column(db.Boolean, default=False)
+    metadata_version = db.Column(db.Integer, default=0)
 
     faces = db.relationship('Face', backref='asset', lazy='dynamic')
 
@@ -43,9 +67,256 @@ class Face(db.Model):
     confidence = db.Column(db.Float)
     is_confirmed = db.Column(db.Boolean, default=False)
 
+    __table_args__ = (
+        db.Index('ix_faces_asset_person', 'asset_id', 'person_id'),
+        db.Index('ix_faces_person_confirmed', 'person_id', 'is_confirmed'),
+    )
+
+class AssetPerson(db.Model):
+    """
+    Who is in which photo: one row per (asset, person) with at least one face assigned,
+    derived from faces by SQLite triggers (services/people.py). Person filters,
+    co-occurrence counts and person galleries are index lookups here instead of scans
+    of the face rows and their encodings.
+    """
+    __tablename__ = 'asset_people'
+    asset_id = db.Column(db.Integer, db.ForeignKey('assets.id'), primary_key=True)
+    person_id = db.Column(db.Integer, db.ForeignKey('people.id'), primary_key=True)
+    confirmed = db.Column(db.Boolean, nullable=False) # At least one of the faces is confirmed
+
+    __table_args__ = (
+        db.Index('ix_asset_people_person', 'person_id', 'confirmed', 'asset_id'),
+    )
+
+class Folder(db.Model):
+    """
+    Precomputed folder tree (one row per directory under a library root), maintained by
+    services/folders.py after scans and watcher batches. The folder browser renders from
+    this table instead of listing directories on disk.
+    """
+    __tablename__ = 'folders'
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String, nullable=False, unique=True, index=True)
+    parent_path = db.Column(db.String, nullable=True, index=True) # None for library roots
+    library_path = db.Column(db.String, nullable=False, index=True)
+    name = db.Column(db.String, nullable=False)
+    asset_count = db.Column(db.Integer, default=0) # Assets directly in this folder
+    recursive_count = db.Column(db.Integer, default=0) # Assets in this folder and all subfolders
+    cover_asset_id = db.Column(db.Integer, db.ForeignKey('assets.id'), nullable=True) # Newest image (direct, else from a subfolder)
+    last_change = db.Column(db.DateTime, nullable=True) # Newest added_at in the subtree
+
+class GeoCell(db.Model):
+    """
+    Pre-aggregated map grid: geotagged assets per grid cell for each low / mid zoom
+    level (services/geo.py). Maintained by SQLite triggers on assets, so zoomed-out
+    map views never touch individual points.
+    """
+    __tablename__ = 'geo_cells'
+    level = db.Column(db.Integer, primary_key=True) # Web-map zoom level
+    cx = db.Column(db.Integer, primary_key=True) # Cell column, counted from longitude -180
+    cy = db.Column(db.Integer, primary_key=True) # Cell row, counted from latitude -90
+    count = db.Column(db.Integer, nullable=False, default=0)
+    sum_lat = db.Column(db.Float, nullable=False, default=0.0) # For the cell's mean position
+    sum_lng = db.Column(db.Float, nullable=False, default=0.0)
+    max_id = db.Column(db.Integer) # Newest asset in the cell (marker thumbnail)
+
+class TimelineDay(db.Model):
+    """
+    Assets captured per calendar day. Maintained by SQLite triggers on assets
+    (services/timeline.py), so the timeline never needs a GROUP BY over assets.
+    """
+    __tablename__ = 'timeline_days'
+    day = db.Column(db.String, primary_key=True) # 'YYYY-MM-DD'
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class DuplicateGroup(db.Model):
+    """
+    Precomputed duplicate groups (services/duplicates.py), rebuilt on demand so the
+    duplicates pages only read and paginate this table.
+    kind 'exact': same file_hash. kind 'similar': dHashes within DUPLICATE_MAX_DISTANCE bits.
+    """
+    __tablename__ = 'duplicate_groups'
+    __table_args__ = (db.Index('ix_duplicate_groups_kind_size', 'kind', 'size'),)
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String, nullable=False)
+    hash_key = db.Column(db.String) # file_hash, or the representative dHash as hex
+    size = db.Column(db.Integer, nullable=False) # Number of assets
+    cover_asset_id = db.Column(db.Integer, db.ForeignKey('assets.id'))
+    built_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DuplicateMember(db.Model):
+    __tablename__ = 'duplicate_members'
+    group_id = db.Column(db.Integer, db.ForeignKey('duplicate_groups.id'), primary_key=True)
+    asset_id = db.Column(db.Integer, db.ForeignKey('assets.id'), primary_key=True, index=True)
+    distance = db.Column(db.Integer, default=0) # Bits from the group's representative (0 for exact)
+
+class SemanticIndex(db.Model):
+    """Where an asset's image embedding lives in the embedding matrix (services/semantic.py)."""
+    __tablename__ = 'semantic_index'
+    asset_id = db.Column(db.Integer, db.ForeignKey('assets.id'), primary_key=True)
+    model = db.Column(db.String, nullable=False) # Embedding model key (one matrix file per model)
+    row = db.Column(db.Integer, nullable=False) # Row in that model's float16 matrix
+    embedded_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_semantic_index_model_row', 'model', 'row', unique=True),
+    )
+
+class Album(db.Model):
+    """
+    Smart album: a saved set of rules (date, folder, person, camera, rating, keyword).
+    Matching assets are materialized in album_members and kept current incrementally
+    (services/albums.py), so album pages never evaluate the rules.
+    """
+    __tablename__ = 'albums'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False, unique=True)
+    rules = db.Column(JSON, nullable=False) # {'match': 'all'|'any', 'rules': [...]}, see services/albums.py
+    asset_count = db.Column(db.Integer, nullable=False, default=0)
+    cover_asset_id = db.Column(db.Integer, db.ForeignKey('assets.id'), nullable=True) # Newest member
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    built_at = db.Column(db.DateTime) # Last full evaluation (creation / rule change / rebuild)
+
+class AlbumMember(db.Model):
+    __tablename__ = 'album_members'
+    album_id = db.Column(db.Integer, db.ForeignKey('albums.id'), primary_key=True)
+    asset_id = db.Column(db.Integer, db.ForeignKey('assets.id'), primary_key=True, index=True)
+    # captured_at (added_at for undated assets), copied here so album pages are keyset
+    # scans of one index: (album_id, sort_key, asset_id)
+    sort_key = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_album_members_album_sort', 'album_id', 'sort_key', 'asset_id'),
+    )
+
+class AlbumPending(db.Model):
+    """Assets whose album membership must be re-evaluated; queued by SQLite triggers (services/albums.py)."""
+    __tablename__ = 'album_pending'
+    asset_id = db.Column(db.Integer, primary_key=True)
+
 class LibraryPath(db.Model):
     __tablename__ = 'library_paths'
     id = db.Column(db.Integer, primary_key=True)
     path = db.Column(db.String, nullable=False, unique=True)
     added_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_scanned = db.Column(db.DateTime, nullable=True)
+
+class ScanManifest(db.Model):
+    """
+    One row per scanned directory. Lets a rescan skip directories whose mtime
+    hasn't changed since the last successful scan (see scanner.scan_directory).
+    """
+    __tablename__ = 'scan_manifest'
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String, nullable=False, unique=True, index=True)
+    library_path = db.Column(db.String, nullable=False, index=True)
+    mtime_ns = db.Column(db.Integer, nullable=False)
+    entry_count = db.Column(db.Integer, default=0)
+    subdirs = db.Column(JSON) # Names of non-hidden child directories at last scan
+    last_scanned = db.Column(db.DateTime, default=datetime.utcnow)
+    last_verified = db.Column(db.DateTime, nullable=True) # Only set on the library root row: last full walk
+
+class MetadataBackup(db.Model):
+    """
+    Catalog of metadata snapshots in .metadata_history (written by metadata_backup.create_backups).
+    Makes the per-asset history an indexed lookup instead of a walk of the whole backup tree.
+    """
+    __tablename__ = 'metadata_backups'
+    id = db.Column(db.Integer, primary_key=True)
+    asset_id = db.Column(db.Integer, db.ForeignKey('assets.id'), nullable=True, index=True)
+    original_path = db.Column(db.String, nullable=False, index=True)
+    backup_path = db.Column(db.String, nullable=False, unique=True) # Backup reference: JSON file path or 'store:...' id
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+    content_hash = db.Column(db.String, index=True) # SHA256 of the canonical JSON snapshot
+    storage_ref = db.Column(db.String, nullable=True) # 'segment:offset:length' in the backup store (None = legacy JSON file)
+
+
+@event.listens_for(Asset.file_path, 'set')
+def _sync_dir_path(target, value, oldvalue, initiator):
+    """Keeps Asset.dir_path in step with file_path for ORM inserts and moves (bulk rows set it themselves)."""
+    target.dir_path = os.path.dirname(value) if value else None
+
+def under_path(column, path, include_self=False):
+    """
+    Index-friendly "column lies below the directory path" condition.
+    startswith() compiles to LIKE, which SQLite's case-insensitive LIKE can't answer from
+    an index; a half-open range on the same prefix can:  path/ <= column < path0
+    (the upper bound is the prefix with its last character, the separator, bumped by one).
+    include_self also matches the column equal to path itself (e.g. dir_path of the folder).
+    Returns: SQL condition
+    """
+    prefix = path if path.endswith(os.path.sep) else path + os.path.sep
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    condition = and_(column >= prefix, column < upper)
+    if include_self:
+        condition = or_(column == (prefix.rstrip(os.path.sep) or os.path.sep), condition)
+    return condition
+
+@event.listens_for(Asset.meta_json, 'set')
+def _sync_coordinates(target, value, oldvalue, initiator):
+    """Keeps Asset.latitude / longitude in step with meta_json (bulk rows set them themselves)."""
+    target.latitude, target.longitude = extract_coordinates(value)
+
+# --- Metadata dirty tracking (see services/metadata_sync.py) ---
+
+def mark_metadata_dirty(session, asset_ids=None, person_ids=None):
+    """
+    Flags assets whose people changed for the next /sync: the given asset ids (their
+    faces changed) and/or every asset with a face of the given people. Needed after bulk
+    query updates, which skip the flush hook below.
+    """
+    conditions = []
+    if asset_ids:
+        conditions.append(Asset.id.in_(list(asset_ids)))
+    if person_ids:
+        conditions.append(Asset.id.in_(select(Face.asset_id).where(Face.person_id.in_(list(person_ids)))))
+    if not conditions:
+        return
+    session.execute(
+        Asset.__table__.update().where(or_(*conditions)).values(
+            metadata_dirty=True,
+            people_dirty=True,
+            metadata_version=func.coalesce(Asset.metadata_version, 0) + 1
+        )
+    )
+
+def _rating_changed(state):
+    # Ratings live in meta_json under the clean 'rating' key (see routes.update_metadata).
+    # File re-reads replace meta_json without that key and must not count as an edit.
+    history = state.attrs.meta_json.history
+    if not history.added:
+        return False
+    new = history.added[0] or {}
+    old = history.deleted[0] if history.deleted else None
+    return 'rating' in new and (old or {}).get('rating') != new['rating']
+
+@event.listens_for(Session, 'before_flush')
+def _track_metadata_changes(session, flush_context, instances):
+    """Marks assets dirty when title, rating or people change through the ORM."""
+    asset_ids = set()
+    person_ids = set()
+
+    for obj in session.dirty:
+        if isinstance(obj, Asset):
+            state = inspect(obj)
+            if state.attrs.title.history.has_changes() or _rating_changed(state):
+                obj.metadata_dirty = True
+                obj.metadata_version = func.coalesce(Asset.metadata_version, 0) + 1
+        elif isinstance(obj, Face):
+            state = inspect(obj)
+            if (state.attrs.person_id.history.has_changes() or state.attrs.person.history.has_changes()
+                    or state.attrs.is_confirmed.history.has_changes()):
+                asset_ids.add(obj.asset_id)
+        elif isinstance(obj, Person):
+            if inspect(obj).attrs.name.history.has_changes():
+                person_ids.add(obj.id)
+
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, Face) and (obj.person_id or obj.person) and obj.asset_id:
+            asset_ids.add(obj.asset_id)
+        elif isinstance(obj, Person) and obj in session.deleted:
+            person_ids.add(obj.id)
+
+    # Assets being deleted in this flush don't need a sync
+    asset_ids.difference_update(o.id for o in session.deleted if isinstance(o, Asset))
+    mark_metadata_dirty(session, asset_ids, person_ids)
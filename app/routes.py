@@ -1,17 +1,32 @@
-from flask import Blueprint, render_template, current_app, flash, redirect, url_for, send_file, request, jsonify
+from flask import Blueprint, render_template, current_app, flash, redirect, url_for, send_file, request, jsonify, Response
 import subprocess
 import os
+from sqlalchemy.orm import undefer
 from app.models import Asset, Person, Face
 from app import db
+from app.database import read_session, get_write_queue
 from datetime import datetime
-from app.services.scanner import scan_directory
-from app.models import Asset, Person, Face, LibraryPath
+from app.services.scanner import scan_directory, scan_libraries
+from app.models import Asset, Person, Face, LibraryPath, Folder, DuplicateGroup, Album, mark_metadata_dirty, under_path
 from app.services.vision import process_all_faces, scan_unknowns_for_match
 from app.services.metadata import extract_ai_info, extract_camera_info, extract_gps_info, get_metadata
 from app.services import metadata_writer, metadata_backup
+from app.services.metadata_sync import sync_dirty_metadata, mark_all_dirty, clear_dirty
 from app.utils import generate_thumbnail
+from app.services.watcher import refresh_watched_roots
+from app.services.grid import tile_query, paginate_tiles, paginate_ranked, to_tiles
+from app.services.folders import rebuild_folders, remove_library_folders
+from app.services.timeline import timeline_counts, undated_count, parse_period
+from app.services.geo import cluster_bbox, parse_bbox
+from app.services import metrics, profiling
+from app.services.duplicates import duplicate_page, rebuild_duplicates
+from app.services.semantic import is_natural_language, search as semantic_search
+from app.services import albums as album_service
+from app.services.people import cooccurrence, people_condition, person_gallery
+from app.services.logs import get_logger
 
 main = Blueprint('main', __name__)
+log = get_logger(__name__)
 
 @main.route('/')
 def index():
@@ -19,17 +34,34 @@ def index():
     per_page = request.args.get('per_page', 50, type=int)
     sort_by = request.args.get('sort', 'date_desc')
     path_filter = request.args.get('path_filter')
+    person_ids = request.args.getlist('person', type=int)
 
-    query = Asset.query
+    # Browsing uses the read-only session (never takes write locks) and selects only
+    # the columns a tile needs (see services/grid.py)
+    query = tile_query(read_session)
     
     if path_filter:
-        # Filter for files starting with the path. 
-        # Ensure path ends with separator to avoid partial matches (e.g. /foo/bar matching /foo/bar_baz)
-        # But we also want /foo/bar to match /foo/bar/image.jpg
-        pf = path_filter
-        if not pf.endswith(os.path.sep):
-            pf += os.path.sep
-        query = query.filter(Asset.file_path.startswith(pf))
+        # Filter for files below the path (range on the file_path index; under_path adds
+        # the separator so /foo/bar doesn't match /foo/bar_baz)
+        query = query.filter(under_path(Asset.file_path, path_filter))
+
+    # ?person=1&person=2: photos showing all of them (confirmed), via the asset_people index
+    filter_people = []
+    if person_ids:
+        query = query.filter(people_condition(person_ids))
+        filter_people = read_session.query(Person.id, Person.name).filter(Person.id.in_(person_ids)).all()
+
+    # Timeline jump (?date=YYYY[-MM[-DD]]): start the date-sorted grid at that period.
+    # A range condition on the captured_at index, so the DB seeks straight there.
+    jump_date = request.args.get('date')
+    period = parse_period(jump_date) if sort_by in ('date_desc', 'date_asc') else None
+    if period:
+        if sort_by == 'date_asc':
+            query = query.filter(Asset.captured_at >= period[0])
+        else:
+            query = query.filter(Asset.captured_at < period[1])
+    else:
+        jump_date = None
 
     if sort_by == 'date_asc':
         query = query.order_by(Asset.captured_at.asc())
@@ -40,7 +72,7 @@ def index():
     else: # date_desc default
         query = query.order_by(Asset.captured_at.desc())
     
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    pagination = paginate_tiles(query, page, per_page)
     assets = pagination.items
 
     return render_template('index.html', 
@@ -48,7 +80,60 @@ def index():
                          pagination=pagination, 
                          sort_by=sort_by, 
                          search_query=None,
-                         path_filter=path_filter)
+                         path_filter=path_filter,
+                         person_ids=person_ids,
+                         filter_people=filter_people,
+                         jump_date=jump_date,
+                         timeline_years=timeline_counts(read_session, 'year'))
+
+@main.route('/api/timeline')
+def timeline():
+    """
+    Asset counts per year / month / day from the maintained aggregate table.
+    ?level=year|month|day, optionally narrowed with ?year= and ?month=.
+    """
+    level = request.args.get('level', 'year')
+    if level not in ('year', 'month', 'day'):
+        return jsonify({'error': 'level must be year, month or day'}), 400
+    year = request.args.get('year', type=int)
+    month = request.args.get('month', type=int)
+
+    buckets = timeline_counts(read_session, level, year=year, month=month)
+    return jsonify({
+        'level': level,
+        'buckets': [{'period': p, 'count': c, 'url': url_for('main.index', date=p)} for p, c in buckets],
+        'undated': undated_count(read_session),
+    })
+
+@main.route('/api/map/clusters')
+def map_clusters():
+    """
+    Grid-bucketed marker counts for a map viewport.
+    ?bbox=west,south,east,north (degrees) &zoom=<web-map zoom level>
+    """
+    bbox = parse_bbox(request.args.get('bbox'))
+    if bbox is None:
+        return jsonify({'error': 'bbox must be west,south,east,north'}), 400
+    zoom = request.args.get('zoom', 0, type=int)
+
+    clusters, total = cluster_bbox(read_session, bbox, zoom)
+    for cluster in clusters:
+        cluster['thumb'] = url_for('main.serve_thumbnail', asset_id=cluster['asset_id']) if cluster['asset_id'] else None
+    return jsonify({'zoom': zoom, 'total': total, 'clusters': clusters})
+
+@main.route('/metrics')
+def metrics_export():
+    """Hot-path timings and counters in the Prometheus text format (needs METRICS_ENABLED=1)."""
+    if not metrics.enabled:
+        return Response("Metrics are disabled. Start the app with METRICS_ENABLED=1.\n", status=404, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@main.route('/api/profiling')
+def profiling_report():
+    """Per-route request times and SQL counts, plus the recent slow requests (needs PROFILE_REQUESTS=1)."""
+    if not profiling.enabled:
+        return jsonify({'error': 'Request profiling is disabled. Start the app with PROFILE_REQUESTS=1.'}), 404
+    return jsonify(profiling.report())
 
 @main.route('/browse_folder')
 def browse_folder():
@@ -77,8 +162,13 @@ def browse_folders():
     roots = [lp.path for lp in library_paths]
     
     if not req_path:
-        # Show roots
-        return render_template('folders.html', current_path='', folders=roots, assets=[], is_root=True)
+        # Show roots (counts / covers from the precomputed folder tree)
+        cataloged = {f.path: f for f in read_session.query(Folder).filter(Folder.parent_path.is_(None))}
+        folders = []
+        for root in roots:
+            f = cataloged.get(root.rstrip(os.sep) or os.sep)
+            folders.append(_folder_entry(root, root, f))
+        return render_template('folders.html', current_path='', folders=folders, assets=[], is_root=True)
     
     # Check if req_path is valid
     is_valid = False
@@ -92,7 +182,29 @@ def browse_folders():
         flash("Access denied or invalid path.", "error")
         return redirect(url_for('main.browse_folders'))
 
-    # List contents
+    parent_path = os.path.dirname(req_path)
+    from_disk = request.args.get('disk') == '1'
+
+    # Fast path: the folder tree table + one indexed query on Asset.dir_path, no disk access
+    folder_row = None
+    if not from_disk:
+        folder_row = read_session.query(Folder).filter(Folder.path == (req_path.rstrip(os.sep) or os.sep)).first()
+    if folder_row is not None:
+        children = read_session.query(Folder).filter(Folder.parent_path == folder_row.path).order_by(Folder.name)
+        subfolders = [_folder_entry(f.name, f.path, f) for f in children]
+        assets = to_tiles(tile_query(read_session).filter(Asset.dir_path == folder_row.path).order_by(Asset.file_path))
+        display_files = [{'name': os.path.basename(a.file_path), 'path': a.file_path, 'asset': a} for a in assets]
+        return render_template('folders.html', 
+                               current_path=req_path, 
+                               parent_path=parent_path, 
+                               folder=folder_row,
+                               folders=subfolders, 
+                               files=display_files,
+                               from_disk=False,
+                               is_root=False)
+
+    # Slow path (folder not cataloged yet, or ?disk=1): list the directory itself,
+    # which also shows files that were never scanned
     try:
         subfolders = []
         files = []
@@ -114,7 +226,7 @@ def browse_folders():
         # Note: os.scandir returns relative names in entry.name
         
         full_file_paths = [os.path.join(req_path, f) for f in files]
-        assets = Asset.query.filter(Asset.file_path.in_(full_file_paths)).all()
+        assets = to_tiles(tile_query(read_session).filter(Asset.file_path.in_(full_file_paths)))
         
         # Sort assets based on file list order or keep DB order? 
         # DB query result order is undefined unless ordered.
@@ -130,37 +242,45 @@ def browse_folders():
                 'asset': asset_map.get(full_path)
             })
             
-        parent_path = os.path.dirname(req_path)
-        
         return render_template('folders.html', 
                                current_path=req_path, 
                                parent_path=parent_path, 
-                               folders=subfolders, 
+                               folder=None,
+                               folders=[_folder_entry(name, os.path.join(req_path, name)) for name in subfolders], 
                                files=display_files,
+                               from_disk=True,
                                is_root=False)
 
     except Exception as e:
         flash(f"Error accessing path: {e}", "error")
         return redirect(url_for('main.browse_folders'))
 
+def _folder_entry(name, path, folder=None):
+    """Template dict for one folder card (counts / cover only known for cataloged folders)."""
+    return {
+        'name': name,
+        'path': path,
+        'asset_count': folder.asset_count if folder else None,
+        'recursive_count': folder.recursive_count if folder else None,
+        'cover_asset_id': folder.cover_asset_id if folder else None,
+    }
+
 @main.route('/scan/delete/<int:id>', methods=['POST'])
 def delete_library(id):
     lp = LibraryPath.query.get_or_404(id)
     path_name = lp.path
     
     # Automatic Cleanup: Remove assets associated with this path
-    search_path = path_name
-    if not search_path.endswith(os.path.sep):
-        search_path += os.path.sep
-        
-    assets_to_delete = Asset.query.filter(Asset.file_path.startswith(search_path)).all()
+    assets_to_delete = Asset.query.filter(under_path(Asset.file_path, path_name)).all()
     count = len(assets_to_delete)
     
     for asset in assets_to_delete:
         db.session.delete(asset)
 
+    remove_library_folders(lp.path)
     db.session.delete(lp)
     db.session.commit()
+    refresh_watched_roots()
     flash(f"Stopped tracking folder: {path_name} and removed {count} associated records.", 'success')
     return redirect(url_for('main.scan'))
 
@@ -205,6 +325,7 @@ def cleanup_orphans():
             
     if deleted_count > 0:
         db.session.commit()
+        rebuild_folders()
         flash(f"Cleanup complete. Removed {deleted_count} items ({missing_count} missing from disk, {untracked_count} from untracked folders).", 'success')
     else:
         flash("No orphaned files found.", 'info')
@@ -213,23 +334,104 @@ def cleanup_orphans():
 
 @main.route('/scan/all', methods=['POST'])
 def scan_all_libraries():
-    paths = LibraryPath.query.all()
+    paths = [lp for lp in LibraryPath.query.all() if os.path.exists(lp.path)]
     total_added = 0
     total_errors = 0
     scanned_count = 0
     
+    # All roots are scanned concurrently (one worker pool per physical disk)
+    results = scan_libraries([lp.path for lp in paths])
     for lp in paths:
-        if os.path.exists(lp.path):
-            a, s, e = scan_directory(lp.path)
-            lp.last_scanned = datetime.utcnow()
-            total_added += a
-            total_errors += e
-            scanned_count += 1
+        a, s, e = results[lp.path]
+        lp.last_scanned = datetime.utcnow()
+        total_added += a
+        total_errors += e
+        scanned_count += 1
             
     db.session.commit()
     flash(f"Scanned {scanned_count} libraries. Added {total_added} new items. Errors: {total_errors}", 'success')
     return redirect(url_for('main.scan'))
 
+@main.route('/duplicates')
+def duplicates():
+    """Exact (same file hash) or similar (close dHash) groups, paged from the precomputed tables."""
+    kind = request.args.get('kind', 'exact')
+    if kind not in ('exact', 'similar'):
+        kind = 'exact'
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 20, type=int)
+
+    pagination, members = duplicate_page(read_session, kind, page, per_page)
+    built_at = read_session.query(db.func.max(DuplicateGroup.built_at)).scalar()
+    return render_template('duplicates.html', kind=kind, pagination=pagination, members=members, built_at=built_at)
+
+@main.route('/duplicates/rebuild', methods=['POST'])
+def rebuild_duplicate_groups():
+    counts = get_write_queue(current_app._get_current_object()).run(rebuild_duplicates)
+    flash(f"Duplicates updated: {counts['exact']} exact groups, {counts['similar']} similar groups "
+          f"({counts['hashed']} images have a perceptual hash).", 'success')
+    return redirect(url_for('main.duplicates', kind=request.form.get('kind', 'exact')))
+
+@main.route('/albums', methods=['GET', 'POST'])
+def albums():
+    """Smart album list; POST saves a new album from the rule form and evaluates it."""
+    if request.method == 'POST':
+        try:
+            rules = album_service.rules_from_form(request.form)
+            album_id = get_write_queue(current_app._get_current_object()).run(
+                album_service.save_album, None, request.form.get('name'), rules)
+            return redirect(url_for('main.album_detail', album_id=album_id))
+        except ValueError as e:
+            flash(str(e), 'error')
+        return redirect(url_for('main.albums'))
+
+    album_list = read_session.query(Album).order_by(Album.name).all()
+    people = read_session.query(Person.id, Person.name).order_by(Person.name).all()
+    people_names = dict(people)
+    descriptions = {album.id: album_service.describe_rules(album.rules, people_names) for album in album_list}
+    return render_template('albums.html', albums=album_list, people=people, descriptions=descriptions)
+
+@main.route('/album/<int:album_id>')
+def album_detail(album_id):
+    """Keyset-paged album grid read from album_members (?after=<cursor of the previous page's last tile>)."""
+    album = read_session.get(Album, album_id)
+    if album is None:
+        return "Album not found", 404
+
+    # Changes since the last refresh (e.g. edits made in the app) are still queued: have
+    # the write queue apply them, but don't wait for it (a scan keeps it busy); the page
+    # evaluates the queued assets itself meanwhile
+    pending = album_service.has_pending(read_session)
+    if pending:
+        album_service.schedule_refresh(current_app._get_current_object())
+
+    per_page = request.args.get('per_page', 24, type=int)
+    after = album_service.parse_cursor(request.args.get('after'))
+    assets, next_cursor = album_service.album_page(read_session, album, per_page, after, pending=pending)
+
+    people_names = dict(read_session.query(Person.id, Person.name).all())
+    return render_template('album_detail.html', album=album, assets=assets, next_cursor=next_cursor,
+                           is_first_page=after is None, per_page=per_page,
+                           description=album_service.describe_rules(album.rules, people_names))
+
+@main.route('/album/<int:album_id>/rebuild', methods=['POST'])
+def rebuild_album(album_id):
+    def rebuild():
+        album = db.session.get(Album, album_id)
+        return album_service.build_album(album) if album else None
+
+    count = get_write_queue(current_app._get_current_object()).run(rebuild)
+    if count is None:
+        return "Album not found", 404
+    flash(f"Album rebuilt: {count} items.", 'success')
+    return redirect(url_for('main.album_detail', album_id=album_id))
+
+@main.route('/album/<int:album_id>/delete', methods=['POST'])
+def delete_album(album_id):
+    get_write_queue(current_app._get_current_object()).run(album_service.delete_album, album_id)
+    flash("Album deleted. The photos themselves are untouched.", 'success')
+    return redirect(url_for('main.albums'))
+
 @main.route('/scan', methods=['GET', 'POST'])
 def scan():
     if request.method == 'POST':
@@ -243,6 +445,7 @@ def scan():
                     lp = LibraryPath(path=new_path)
                     db.session.add(lp)
                     db.session.commit()
+                    refresh_watched_roots()
                     flash(f"Added library path: {new_path}", 'success')
                 else:
                     flash("Path already exists.", 'warning')
@@ -269,7 +472,8 @@ def scan():
     libraries = LibraryPath.query.all()
     
     # Optional: Ad-hoc scan (legacy support or just one-off)
-    return render_template('scan.html', libraries=libraries)
+    # Step timings of the last scans / face runs / syncs (only with METRICS_ENABLED)
+    return render_template('scan.html', libraries=libraries, recent_jobs=metrics.recent_jobs())
 
 @main.route('/asset/<int:asset_id>/image')
 def serve_image(asset_id):
@@ -333,7 +537,7 @@ def serve_thumbnail(asset_id):
                     img_io.seek(0)
                     return send_file(img_io, mimetype='image/jpeg')
             except Exception as e:
-                print(f"Error cropping face: {e}")
+                log.warning("Error cropping face: %s", e)
                 # Fallback to full thumb
                 pass
 
@@ -347,7 +551,7 @@ def serve_thumbnail(asset_id):
 
 @main.route('/asset/<int:asset_id>')
 def asset_detail(asset_id):
-    asset = Asset.query.get_or_404(asset_id)
+    asset = Asset.query.options(undefer(Asset.meta_json)).get_or_404(asset_id)
     
     # Navigation Logic (Previous/Next)
     sort_by = request.args.get('sort', 'date_desc')
@@ -371,12 +575,9 @@ def asset_detail(asset_id):
         if not path_filter:
             path_filter = folder_path
 
-    query = Asset.query
+    query = read_session.query(Asset)
     if path_filter:
-        pf = path_filter
-        if not pf.endswith(os.path.sep):
-            pf += os.path.sep
-        query = query.filter(Asset.file_path.startswith(pf))
+        query = query.filter(under_path(Asset.file_path, path_filter))
 
     if sort_by == 'date_asc':
         query = query.order_by(Asset.captured_at.asc())
@@ -515,7 +716,7 @@ def refresh_metadata(asset_id):
 
 @main.route('/asset/<int:asset_id>/update_metadata', methods=['POST'])
 def update_metadata(asset_id):
-    asset = Asset.query.get_or_404(asset_id)
+    asset = Asset.query.options(undefer(Asset.meta_json)).get_or_404(asset_id)
     
     # Get form data
     title = request.form.get('title', '').strip()
@@ -566,17 +767,19 @@ def update_metadata(asset_id):
         'rating': rating
     }
     
-    if metadata_writer.write_metadata(asset.file_path, write_data):
+    written, new_official_meta = metadata_writer.write_metadata_and_read(asset.file_path, write_data)
+    if written:
         flash("Metadata saved and written to file (Backup created).", "success")
         
-        # Optional: Re-read immediately to get the 'official' ExifTool JSON structure back?
-        # This prevents drift between our 'clean keys' and the 'raw keys'.
-        # But it adds latency. Let's do it for correctness.
-        from app.services.metadata import get_metadata
-        new_official_meta = get_metadata(asset.file_path)
+        # The writer re-reads the file in the same ExifTool run, giving us the 'official'
+        # ExifTool JSON structure back. This prevents drift between our 'clean keys' and the 'raw keys'.
         if new_official_meta:
             asset.meta_json = new_official_meta
             db.session.commit()
+
+        # The file now has this title and rating: nothing left for /sync unless its people changed
+        clear_dirty(db.session, [(asset.id, asset.metadata_version)], people_written=False)
+        db.session.commit()
             
     else:
         flash("Saved to Database, but FAILED to write to file. Check logs.", "warning")
@@ -585,20 +788,98 @@ def update_metadata(asset_id):
 
     return redirect(url_for('main.asset_detail', asset_id=asset_id))
 
+@main.route('/assets/bulk_edit', methods=['POST'])
+def bulk_edit():
+    """
+    Applies the same metadata change to every selected asset (multi-select on the grid).
+    Only fields that were filled in are changed. One batched backup + one ExifTool run per
+    group of identical changes (see metadata_writer.write_metadata_batch).
+    """
+    next_url = request.form.get('next') or url_for('main.index')
+    asset_ids = request.form.getlist('asset_ids', type=int)
+    if not asset_ids:
+        flash("No photos selected.", "warning")
+        return redirect(next_url)
+
+    changes = {}
+    title = request.form.get('title', '').strip()
+    description = request.form.get('description', '').strip()
+    rating_str = request.form.get('rating', '').strip()
+    keywords_str = request.form.get('keywords', '').strip()
+
+    if title:
+        changes['title'] = title
+    if description:
+        changes['description'] = description
+    if rating_str:
+        try:
+            changes['rating'] = max(0, min(5, int(rating_str)))
+        except ValueError:
+            pass
+    if keywords_str:
+        changes['keywords'] = [k.strip() for k in keywords_str.split(',') if k.strip()]
+
+    if not changes:
+        flash("Nothing to change: fill in at least one field.", "warning")
+        return redirect(next_url)
+
+    paths = {}
+    was_dirty = set()
+    for i in range(0, len(asset_ids), 500):
+        rows = db.session.query(Asset.id, Asset.file_path, Asset.metadata_dirty).filter(Asset.id.in_(asset_ids[i:i + 500]))
+        for asset_id, file_path, dirty in rows:
+            paths[asset_id] = file_path
+            if dirty:
+                was_dirty.add(asset_id)
+
+    results = metadata_writer.write_metadata_batch({path: changes for path in paths.values()})
+
+    # Mirror successful writes into the DB (same clean keys as update_metadata).
+    # Loaded after the write: the backup step commits the session, which would expire
+    # rows loaded earlier and reload them one by one.
+    written_ids = [asset_id for asset_id, path in paths.items() if results.get(path)]
+    for i in range(0, len(written_ids), 500):
+        chunk = Asset.query.options(undefer(Asset.meta_json)).filter(Asset.id.in_(written_ids[i:i + 500]))
+        for asset in chunk:
+            current_meta = dict(asset.meta_json) if asset.meta_json else {}
+            current_meta.update(changes)
+            asset.meta_json = current_meta
+            if 'title' in changes:
+                asset.title = changes['title']
+    db.session.commit()
+
+    # Written files are in sync now, unless an earlier unsynced edit touched a field this
+    # one didn't write (sync writes title and rating; the people list is never written here)
+    in_sync = written_ids
+    if not {'title', 'rating'} <= changes.keys():
+        in_sync = [asset_id for asset_id in written_ids if asset_id not in was_dirty]
+    for i in range(0, len(in_sync), 500):
+        versions = db.session.query(Asset.id, Asset.metadata_version).filter(Asset.id.in_(in_sync[i:i + 500])).all()
+        clear_dirty(db.session, versions, people_written=False)
+    db.session.commit()
+
+    written = len(written_ids)
+    failed = len(paths) - written
+    if failed:
+        flash(f"Updated {written} photos; {failed} could not be written (check logs).", "warning")
+    else:
+        flash(f"Updated {written} photos (backups created).", "success")
+    return redirect(next_url)
+
 @main.route('/asset/<int:asset_id>/history', methods=['GET'])
 def get_asset_history(asset_id):
     """API to get backup list for an asset"""
     asset = Asset.query.get_or_404(asset_id)
-    backups = metadata_backup.get_backup_info(asset.file_path)
+    backups = metadata_backup.get_backup_info(asset.file_path, asset_id=asset.id)
     return {'backups': backups} # Flask auto-jsonify
 
 @main.route('/asset/<int:asset_id>/restore', methods=['POST'])
 def restore_backup(asset_id):
     """Restores metadata from a specific backup file."""
-    asset = Asset.query.get_or_404(asset_id)
+    asset = Asset.query.options(undefer(Asset.meta_json)).get_or_404(asset_id)
     backup_path = request.form.get('backup_path')
     
-    if not backup_path or not os.path.exists(backup_path):
+    if not backup_path or not metadata_backup.backup_exists(backup_path):
         flash("Invalid backup path.", "danger")
         return redirect(url_for('main.asset_detail', asset_id=asset_id))
         
@@ -666,12 +947,13 @@ def restore_backup(asset_id):
         restore_data['keywords'] = list(set(tags)) # dedup
         
     # 3. Write to File (Trigger Safe Write)
-    if metadata_writer.write_metadata(asset.file_path, restore_data):
+    written, fresh_meta = metadata_writer.write_metadata_and_read(asset.file_path, restore_data)
+    if written:
         flash(f"Restored metadata from backup {os.path.basename(backup_path)}.", "success")
         
         # 4. Update DB from File Source of Truth
-        # We re-read the file to ensure the DB matches exactly what ExifTool sees (and what the UI expects keys-wise)
-        fresh_meta = get_metadata(asset.file_path)
+        # The writer re-read the file in the same ExifTool run, so the DB matches exactly what
+        # ExifTool sees (and what the UI expects keys-wise)
         if fresh_meta:
             asset.meta_json = fresh_meta
             
@@ -682,7 +964,7 @@ def restore_backup(asset_id):
                  asset.title = restore_data['title']
         else:
             # Fallback if read fails (unlikely)
-            print("Warning: Failed to re-read metadata after restore.")
+            log.warning("Failed to re-read metadata after restore of %s.", asset.file_path)
             current = dict(asset.meta_json) if asset.meta_json else {}
             current.update(restore_data)
             asset.meta_json = current
@@ -764,20 +1046,40 @@ def assign_face(face_id, person_id):
 @main.route('/person/<int:person_id>')
 def person_detail(person_id):
     person = Person.query.get_or_404(person_id)
-    confirmed_faces = Face.query.filter_by(person_id=person.id, is_confirmed=True).all()
+    page = request.args.get('page', 1, type=int)
+    suggested_page = request.args.get('suggested_page', 1, type=int)
+    per_page = request.args.get('per_page', 48, type=int)
+
+    # Confirmed photos: a page of the asset_people index, newest first
+    confirmed = person_gallery(read_session, person.id, page, per_page)
+    # The face on each photo (for the face crop / "Incorrect?" link), for this page only
+    face_ids = dict(read_session.query(Face.asset_id, Face.id).filter(
+        Face.person_id == person.id, Face.is_confirmed.is_(True),
+        Face.asset_id.in_([tile.id for tile in confirmed.items])
+    ).all()) if confirmed.items else {}
+
     # Sort suggested faces by confidence (Highest first)
-    suggested_faces = Face.query.filter_by(person_id=person.id, is_confirmed=False).order_by(Face.confidence.desc()).all()
+    suggested = Face.query.filter_by(person_id=person.id, is_confirmed=False).order_by(
+        Face.confidence.desc(), Face.id).paginate(page=suggested_page, per_page=per_page, error_out=False)
     
     # Fetch all people for the reassignment modal
     people = Person.query.order_by(Person.name).all()
     
-    # We need asset data for thumbnails
     return render_template('person_detail.html', 
                          person=person, 
-                         confirmed=confirmed_faces, 
-                         suggested=suggested_faces,
+                         confirmed=confirmed, 
+                         face_ids=face_ids,
+                         suggested=suggested,
+                         together=cooccurrence(read_session, person.id, limit=12),
                          people=people)
 
+@main.route('/api/people/<int:person_id>/together')
+def people_together(person_id):
+    """People photographed with person_id (confirmed faces), with shared photo counts."""
+    limit = request.args.get('limit', type=int)
+    return jsonify([{'id': pid, 'name': name, 'photos': count}
+                    for pid, name, count in cooccurrence(read_session, person_id, limit=limit)])
+
 @main.route('/face/<int:face_id>/confirm/<int:person_id>')
 def confirm_face(face_id, person_id):
     face = Face.query.get_or_404(face_id)
@@ -835,7 +1137,10 @@ def find_matches(person_id):
 def confirm_all_matches(person_id):
     person = Person.query.get_or_404(person_id)
     # Find all unconfirmed faces for this person
-    count = Face.query.filter_by(person_id=person.id, is_confirmed=False).update({
+    suggested = Face.query.filter_by(person_id=person.id, is_confirmed=False)
+    # Bulk update skips the flush hook: flag the affected assets for /sync explicitly
+    mark_metadata_dirty(db.session, asset_ids=[f.asset_id for f in suggested.with_entities(Face.asset_id)])
+    count = suggested.update({
         'is_confirmed': True
     })
     db.session.commit()
@@ -933,6 +1238,8 @@ def merge_into_person(source_person_id):
         return redirect(url_for('main.person_detail', person_id=source_person_id))
         
     # Perform Merge
+    # Bulk update skips the flush hook: flag the affected assets for /sync explicitly
+    mark_metadata_dirty(db.session, person_ids=[source_person.id])
     fn_count = Face.query.filter_by(person_id=source_person.id).update({
         'person_id': target_person.id,
         'is_confirmed': True 
@@ -976,40 +1283,24 @@ def get_face_matches(face_id):
             
         return jsonify(data)
     except Exception as e:
-        print(f"Match API Error: {e}")
+        log.error("Match API error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
 @main.route('/sync')
 def sync_all():
-    # Example sync: Sync confirmed people names to keywords? or Title?
-    # For MVP, let's just sync the Title from DB to File if changed.
-    # Or Sync People names to 'Subject' or 'PersonInImage' (XMP) logic?
-    # Let's simple sync: Title -> Title.
-    
-    assets = Asset.query.all()
-    count = 0
-    for asset in assets:
-        tags = {}
-        if asset.title:
-            tags['Title'] = asset.title
-        
-        # Sync People
-        confirmed_faces = asset.faces.filter_by(is_confirmed=True).all()
-        people_names = [f.person.name for f in confirmed_faces if f.person]
-        if people_names:
-            tags['Subject'] = people_names # ExifTool handles list for Subject/Keywords usually, or repeated args.
-            # subprocess list logic might need care, usually -Subject=Name1 -Subject=Name2
-            # Our simple wrapper does -key=value. 
-            # We might need to update wrapper for list support or join with specific delimiter.
-            # ExifTool often accepts comma separated for some tags?
-            # Let's stick to Title for MVP safety.
-        
-        if tags:
-            if write_metadata(asset.file_path, tags):
-                count += 1
-                
-    return f"Synced metadata for {count} assets. <a href='/'>Home</a>"
+    """
+    Writes DB edits (title, rating, confirmed people) back to the files.
+    Only assets marked dirty are touched; ?all=1 forces a full resync.
+    """
+    if request.args.get('all') == '1':
+        mark_all_dirty()
+
+    synced, failed = sync_dirty_metadata()
+    message = f"Synced metadata for {synced} assets."
+    if failed:
+        message += f" {failed} failed (still marked for the next sync)."
+    return f"{message} <a href='/'>Home</a>"
 
 @main.route('/search')
 def search():
@@ -1023,21 +1314,40 @@ def search():
     # We can cast to text or just search the column if SQLAlchemy allows.
     # For SQLite, JSON columns are often just text.
     
-    search_term = f"%{query}%"
-    base_query = Asset.query.filter(
-        (Asset.title.like(search_term)) | 
-        (Asset.meta_json.cast(db.String).like(search_term))
-    )
+    # Natural-language queries ("dad fixing the car") go to the image embeddings when
+    # semantic search is set up (services/semantic.py); ?mode=text / ?mode=semantic force
+    # one or the other. Otherwise (or with nothing indexed yet) it's the metadata search.
+    mode = request.args.get('mode')
+    ranked = None
+    if mode == 'semantic' or (mode != 'text' and is_natural_language(query, current_app.config.get('SEMANTIC_MIN_WORDS', 3))):
+        ranked = semantic_search(current_app._get_current_object(), query)
+
+    if ranked is not None:
+        mode = 'semantic'
+        base_query = tile_query(read_session).filter(Asset.id.in_([asset_id for asset_id, _ in ranked]))
+    else:
+        mode = 'text' if current_app.config.get('SEMANTIC_MODEL') else None
+        search_term = f"%{query}%"
+        base_query = tile_query(read_session).filter(
+            (Asset.title.like(search_term)) | 
+            (Asset.meta_json.cast(db.String).like(search_term))
+        )
     # Re-use path filtering logic if provided
     path_filter = request.args.get('path_filter')
     if path_filter:
-        pf = path_filter
-        if not pf.endswith(os.path.sep):
-            pf += os.path.sep
-        base_query = base_query.filter(Asset.file_path.startswith(pf))
+        base_query = base_query.filter(under_path(Asset.file_path, path_filter))
+
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 50, type=int)
+
+    # Semantic hits default to best match first
+    sort_by = request.args.get('sort', 'relevance' if mode == 'semantic' else 'date_desc')
+    if mode == 'semantic' and sort_by == 'relevance':
+        pagination = paginate_ranked(base_query, [asset_id for asset_id, _ in ranked], page, per_page)
+        return render_template('index.html', assets=pagination.items, pagination=pagination, sort_by=sort_by,
+                               search_query=query, search_mode=mode, path_filter=path_filter)
 
     # Re-use sort logic
-    sort_by = request.args.get('sort', 'date_desc')
     if sort_by == 'date_asc':
         base_query = base_query.order_by(Asset.captured_at.asc())
     elif sort_by == 'added_desc':
@@ -1047,10 +1357,8 @@ def search():
     else:
         base_query = base_query.order_by(Asset.captured_at.desc())
 
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 50, type=int)
-    
-    pagination = base_query.paginate(page=page, per_page=per_page, error_out=False)
+    pagination = paginate_tiles(base_query, page, per_page)
     results = pagination.items
     
-    return render_template('index.html', assets=results, pagination=pagination, sort_by=sort_by, search_query=query, path_filter=path_filter)
+    return render_template('index.html', assets=results, pagination=pagination, sort_by=sort_by, search_query=query,
+                           search_mode=mode, path_filter=path_filter)
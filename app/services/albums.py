@@ -0,0 +1,361 @@
+"""
+Smart albums: saved rules whose matches are materialized in album_members.
+
+An album's rules (models.Album.rules) are a JSON document:
+
+    {"match": "all",            # or "any"
+     "rules": [
+        {"field": "date", "from": "2019-06", "to": "2019-08"},   # YYYY[-MM[-DD]], either bound optional
+        {"field": "folder", "path": "/photos/Trips"},             # the folder and its subfolders
+        {"field": "person", "person_id": 3},                      # a confirmed face of the person
+        {"field": "camera", "contains": "X-T3"},                  # make or model
+        {"field": "rating", "min": 4},                            # and/or "max"
+        {"field": "keyword", "value": "beach"}                    # exact keyword, any case
+     ]}
+
+rule_condition() compiles them to one SQL condition on assets, so evaluating an album is
+a single INSERT ... SELECT.
+
+Membership is maintained incrementally:
+- SQLite triggers on assets (insert, delete, changes of captured_at / path / metadata)
+  and faces (people assigned, confirmed or removed) queue the asset id in album_pending.
+  They fire for every write path: the scanner's bulk upserts, ORM edits, face runs.
+- refresh_pending() re-evaluates only the queued assets against every album. It runs
+  after scans and watcher batches, and is scheduled (not awaited) when an album page
+  finds assets still queued (edits made in the app); until it has run, album_page()
+  evaluates the queued assets read-only.
+- build_album() evaluates one album over the whole library: on creation, rule changes
+  and explicit rebuilds.
+Album pages read album_members in (album_id, sort_key, asset_id) index order, paging by
+keyset (the last row's sort key and id), so page 1000 costs the same as page 1.
+"""
+import threading
+from datetime import datetime
+from sqlalchemy import Integer, and_, cast, delete, func, insert, literal, or_, select, text, true, tuple_, union_all
+from app import db
+from app.database import ensure_triggers, get_write_queue
+from app.models import Album, AlbumMember, AlbumPending, Asset, under_path
+from app.services.grid import TILE_COLUMNS, to_tiles
+from app.services.logs import get_logger
+from app.services.people import people_condition
+from app.services.timeline import parse_period
+
+log = get_logger(__name__)
+
+FIELDS = ('date', 'folder', 'person', 'camera', 'rating', 'keyword')
+# meta_json keys holding keywords: ExifTool's IPTC / XMP names and the app's clean key
+KEYWORD_KEYS = ('Keywords', 'Subject', 'keywords')
+# Pending assets re-evaluated per statement
+REFRESH_CHUNK = 5000
+
+_refresh_queued = threading.Event()
+
+_ASSET_CHANGED = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in ('captured_at', 'added_at', 'file_path', 'meta_json'))
+
+# Upsert, not INSERT OR IGNORE: SQLite applies the conflict policy of the statement that
+# fired a trigger to the trigger's own OR clauses, so under the scanner's
+# INSERT ... ON CONFLICT DO UPDATE an OR IGNORE would fail on an already queued asset.
+def _queue(asset_id):
+    return (f"INSERT INTO album_pending (asset_id) SELECT {asset_id} WHERE {asset_id} IS NOT NULL "
+            f"ON CONFLICT(asset_id) DO NOTHING;")
+
+TRIGGERS = {
+    'albums_queue_asset_insert': f"""
+        CREATE TRIGGER albums_queue_asset_insert AFTER INSERT ON assets
+        BEGIN {_queue('NEW.id')} END""",
+    'albums_queue_asset_delete': f"""
+        CREATE TRIGGER albums_queue_asset_delete AFTER DELETE ON assets
+        BEGIN {_queue('OLD.id')} END""",
+    'albums_queue_asset_update': f"""
+        CREATE TRIGGER albums_queue_asset_update AFTER UPDATE OF captured_at, added_at, file_path, meta_json ON assets
+        WHEN {_ASSET_CHANGED}
+        BEGIN {_queue('NEW.id')} END""",
+    'albums_queue_face_insert': f"""
+        CREATE TRIGGER albums_queue_face_insert AFTER INSERT ON faces
+        WHEN NEW.person_id IS NOT NULL
+        BEGIN {_queue('NEW.asset_id')} END""",
+    'albums_queue_face_delete': f"""
+        CREATE TRIGGER albums_queue_face_delete AFTER DELETE ON faces
+        WHEN OLD.person_id IS NOT NULL
+        BEGIN {_queue('OLD.asset_id')} END""",
+    'albums_queue_face_update': f"""
+        CREATE TRIGGER albums_queue_face_update AFTER UPDATE OF person_id, is_confirmed, asset_id ON faces
+        WHEN OLD.person_id IS NOT NEW.person_id OR OLD.is_confirmed IS NOT NEW.is_confirmed
+            OR OLD.asset_id IS NOT NEW.asset_id
+        BEGIN {_queue('OLD.asset_id')} {_queue('NEW.asset_id')} END""",
+}
+# Earlier trigger versions (INSERT OR IGNORE), replaced at startup
+STALE_TRIGGERS = ('albums_asset_insert', 'albums_asset_delete', 'albums_asset_update',
+                  'albums_face_insert', 'albums_face_delete', 'albums_face_update')
+
+# Album order: captured_at, added_at for undated assets
+SORT_KEY = func.coalesce(Asset.captured_at, Asset.added_at, literal('1970-01-01 00:00:00.000000'))
+
+def _json(path):
+    return func.json_extract(Asset.meta_json, path)
+
+def _date_bound(value, end=False):
+    period = parse_period(str(value))
+    if period is None:
+        raise ValueError(f"Invalid date '{value}' (use YYYY, YYYY-MM or YYYY-MM-DD).")
+    return period[1] if end else period[0]
+
+def _condition(rule):
+    field = rule.get('field')
+    if field == 'date':
+        parts = []
+        if rule.get('from'):
+            parts.append(Asset.captured_at >= _date_bound(rule['from']))
+        if rule.get('to'):
+            parts.append(Asset.captured_at < _date_bound(rule['to'], end=True))
+        if not parts:
+            raise ValueError("Date rule needs 'from' and/or 'to'.")
+        return and_(*parts)
+    if field == 'folder':
+        if not rule.get('path'):
+            raise ValueError("Folder rule needs a 'path'.")
+        return under_path(Asset.file_path, rule['path'])
+    if field == 'person':
+        try:
+            person_id = int(rule.get('person_id'))
+        except (TypeError, ValueError):
+            raise ValueError("Person rule needs a 'person_id'.")
+        return people_condition([person_id])
+    if field == 'camera':
+        if not rule.get('contains'):
+            raise ValueError("Camera rule needs 'contains'.")
+        camera = func.coalesce(_json('$.Make'), '') + ' ' + func.coalesce(_json('$.Model'), '')
+        return camera.like(f"%{rule['contains']}%")
+    if field == 'rating':
+        # The app's clean key (set by edits) wins over the file's XMP rating
+        rating = cast(func.coalesce(_json('$.rating'), _json('$.Rating'), 0), Integer)
+        parts = []
+        try:
+            if rule.get('min') not in (None, ''):
+                parts.append(rating >= int(rule['min']))
+            if rule.get('max') not in (None, ''):
+                parts.append(rating <= int(rule['max']))
+        except (TypeError, ValueError):
+            raise ValueError("Rating rule bounds must be numbers.")
+        if not parts:
+            raise ValueError("Rating rule needs 'min' and/or 'max'.")
+        return and_(*parts)
+    if field == 'keyword':
+        keyword = str(rule.get('value') or '').strip().lower()
+        if not keyword:
+            raise ValueError("Keyword rule needs a 'value'.")
+        # json_each() yields the elements of a list, or the value itself for a single string
+        matches = []
+        for key in KEYWORD_KEYS:
+            each = func.json_each(Asset.meta_json, f'$.{key}').table_valued('value')
+            matches.append(select(1).select_from(each).where(func.lower(each.c.value) == keyword).exists())
+        return or_(*matches)
+    raise ValueError(f"Unknown rule field '{field}' (expected one of {', '.join(FIELDS)}).")
+
+def rule_condition(rules):
+    """
+    Compiles an album's rules to a SQL condition on assets.
+    Raises ValueError for malformed rules (shown to the user when saving an album).
+    """
+    conditions = [_condition(rule) for rule in (rules or {}).get('rules', [])]
+    if not conditions:
+        raise ValueError("An album needs at least one rule.")
+    return or_(*conditions) if rules.get('match') == 'any' else and_(*conditions)
+
+def _insert_members(album, condition):
+    """INSERT ... SELECT of the album's matching assets (within `condition`). Returns: rows added."""
+    matches = select(literal(album.id), Asset.id, SORT_KEY).where(rule_condition(album.rules), condition)
+    result = db.session.execute(insert(AlbumMember).from_select(['album_id', 'asset_id', 'sort_key'], matches))
+    return result.rowcount
+
+def _update_cover(album):
+    album.cover_asset_id = db.session.execute(
+        select(AlbumMember.asset_id).where(AlbumMember.album_id == album.id)
+        .order_by(AlbumMember.sort_key.desc(), AlbumMember.asset_id.desc()).limit(1)
+    ).scalar()
+
+def build_album(album):
+    """Evaluates one album over the whole library (run on the write queue; the queue commits). Returns: member count."""
+    db.session.execute(delete(AlbumMember).where(AlbumMember.album_id == album.id))
+    album.asset_count = _insert_members(album, true())
+    album.built_at = datetime.utcnow()
+    _update_cover(album)
+    return album.asset_count
+
+def save_album(album_id, name, rules):
+    """
+    Creates (album_id None) or updates an album and evaluates it. Run on the write queue.
+    Returns: the album id. Raises ValueError for bad rules or a duplicate name.
+    """
+    rule_condition(rules) # Validate before touching anything
+    name = (name or '').strip()
+    if not name:
+        raise ValueError("An album needs a name.")
+    clash = Album.query.filter(Album.name == name, Album.id != (album_id or 0)).first()
+    if clash:
+        raise ValueError(f"An album named '{name}' already exists.")
+
+    album = db.session.get(Album, album_id) if album_id else Album()
+    if album is None:
+        raise ValueError("Album not found.")
+    album.name = name
+    album.rules = rules
+    db.session.add(album)
+    db.session.flush()
+    count = build_album(album)
+    log.info("Album '%s' built: %d assets.", name, count, extra={'data': {'album_id': album.id, 'assets': count}})
+    return album.id
+
+def delete_album(album_id):
+    """Run on the write queue."""
+    db.session.execute(delete(AlbumMember).where(AlbumMember.album_id == album_id))
+    db.session.execute(delete(Album).where(Album.id == album_id))
+
+def refresh_pending():
+    """
+    Re-evaluates the queued assets (album_pending) against every album. Run on the write
+    queue (or another job that commits). Returns: number of assets re-evaluated.
+    """
+    albums = Album.query.all()
+    done = 0
+    while True:
+        ids = [row[0] for row in db.session.execute(select(AlbumPending.asset_id).limit(REFRESH_CHUNK))]
+        if not ids:
+            break
+        if albums:
+            removed = dict(db.session.execute(
+                select(AlbumMember.album_id, func.count()).where(AlbumMember.asset_id.in_(ids)).group_by(AlbumMember.album_id)
+            ).all())
+            db.session.execute(delete(AlbumMember).where(AlbumMember.asset_id.in_(ids)))
+            for album in albums:
+                added = _insert_members(album, Asset.id.in_(ids))
+                if added or removed.get(album.id):
+                    album.asset_count = (album.asset_count or 0) + added - removed.get(album.id, 0)
+                    _update_cover(album)
+        db.session.execute(delete(AlbumPending).where(AlbumPending.asset_id.in_(ids)))
+        done += len(ids)
+    if done and albums:
+        log.info("Albums refreshed for %d changed assets.", done, extra={'data': {'assets': done, 'albums': len(albums)}})
+    return done
+
+def has_pending(session):
+    return session.query(AlbumPending.asset_id).first() is not None
+
+def schedule_refresh(app):
+    """
+    Queues refresh_pending() on the write queue without waiting for it (at most one
+    queued at a time). Returns immediately.
+    """
+    if _refresh_queued.is_set():
+        return
+    _refresh_queued.set()
+
+    def job():
+        _refresh_queued.clear() # Changes made while this runs get the next one
+        return refresh_pending()
+
+    get_write_queue(app).submit(job)
+
+def rebuild_albums():
+    """Evaluates every album from scratch and clears the queue. Returns: number of albums."""
+    albums = Album.query.all()
+    for album in albums:
+        build_album(album)
+    db.session.execute(delete(AlbumPending))
+    return len(albums)
+
+def install_albums():
+    """
+    Creates the queueing triggers if missing (run at startup after create_all). If they
+    were missing, existing albums may have missed changes, so they are rebuilt once.
+    """
+    with db.engine.begin() as conn:
+        for name in STALE_TRIGGERS:
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+    if ensure_triggers(TRIGGERS):
+        count = rebuild_albums()
+        db.session.commit()
+        if count:
+            log.info("Albums rebuilt: %d.", count)
+
+def album_page(session, album, per_page, after=None, pending=False):
+    """
+    One page of an album, newest first: a keyset scan of ix_album_members_album_sort.
+    after: (sort_key, asset_id) of the last tile of the previous page (see parse_cursor).
+    pending: assets are still queued for refresh_pending(). They are evaluated against the
+    album's rules here, read-only, in place of their stored membership, so the page is
+    current without waiting for the write queue (busy for the whole of a scan).
+    Returns: (rows of tile columns, cursor for the next page or None)
+    """
+    stored = select(AlbumMember.asset_id, AlbumMember.sort_key).where(AlbumMember.album_id == album.id)
+    if pending:
+        queued = select(AlbumPending.asset_id)
+        fresh = select(Asset.id, SORT_KEY).where(Asset.id.in_(queued), rule_condition(album.rules))
+        members = union_all(stored.where(AlbumMember.asset_id.not_in(queued)), fresh).subquery()
+    else:
+        members = stored.subquery()
+
+    query = session.query(*TILE_COLUMNS, members.c.sort_key).select_from(members).join(
+        Asset, Asset.id == members.c.asset_id)
+    if after:
+        query = query.filter(tuple_(members.c.sort_key, members.c.asset_id) < tuple_(*after))
+    rows = query.order_by(members.c.sort_key.desc(), members.c.asset_id.desc()).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = format_cursor(rows[-1][-1], rows[-1][0])
+    return to_tiles(row[:-1] for row in rows), next_cursor
+
+def format_cursor(sort_key, asset_id):
+    return f"{sort_key.isoformat()}_{asset_id}"
+
+def parse_cursor(value):
+    """'<iso datetime>_<asset id>' -> (datetime, id), or None if malformed."""
+    try:
+        stamp, asset_id = (value or '').rsplit('_', 1)
+        return datetime.fromisoformat(stamp), int(asset_id)
+    except ValueError:
+        return None
+
+def rules_from_form(form):
+    """Builds the rules document from the album form (empty fields are ignored)."""
+    rules = []
+    if form.get('date_from') or form.get('date_to'):
+        rules.append({'field': 'date', 'from': form.get('date_from') or None, 'to': form.get('date_to') or None})
+    if form.get('folder'):
+        rules.append({'field': 'folder', 'path': form['folder'].strip()})
+    for person_id in form.getlist('person_id'):
+        if person_id:
+            rules.append({'field': 'person', 'person_id': int(person_id)})
+    if form.get('camera'):
+        rules.append({'field': 'camera', 'contains': form['camera'].strip()})
+    if form.get('rating_min') or form.get('rating_max'):
+        rules.append({'field': 'rating', 'min': form.get('rating_min') or None, 'max': form.get('rating_max') or None})
+    for keyword in (form.get('keywords') or '').split(','):
+        if keyword.strip():
+            rules.append({'field': 'keyword', 'value': keyword.strip()})
+    return {'match': 'any' if form.get('match') == 'any' else 'all', 'rules': rules}
+
+def describe_rules(rules, people_names):
+    """Human-readable summary lines of an album's rules."""
+    lines = []
+    for rule in rules.get('rules', []):
+        field = rule.get('field')
+        if field == 'date':
+            lines.append(f"Taken {'from ' + str(rule['from']) if rule.get('from') else ''}"
+                         f"{' ' if rule.get('from') and rule.get('to') else ''}"
+                         f"{'to ' + str(rule['to']) if rule.get('to') else ''}")
+        elif field == 'folder':
+            lines.append(f"In {rule.get('path')}")
+        elif field == 'person':
+            lines.append(f"Shows {people_names.get(rule.get('person_id'), 'a deleted person')}")
+        elif field == 'camera':
+            lines.append(f"Camera contains '{rule.get('contains')}'")
+        elif field == 'rating':
+            bounds = [f">= {rule['min']}" if rule.get('min') not in (None, '') else '',
+                      f"<= {rule['max']}" if rule.get('max') not in (None, '') else '']
+            lines.append("Rating " + ' and '.join(b for b in bounds if b))
+        elif field == 'keyword':
+            lines.append(f"Keyword '{rule.get('value')}'")
+    return lines
@@ -0,0 +1,233 @@
+"""
+Append-only compressed segment store for metadata snapshots.
+
+Instead of one pretty-printed JSON file per file per write, snapshots are appended
+as independently compressed records to a few large segment files:
+
+    .metadata_history/segments/seg-000001.zst   (or .gz without the `zstandard` package)
+
+A record is addressed by a storage ref "seg-000001.zst:<offset>:<length>", kept in the
+metadata_backups catalog. Each record decompresses on its own, so reading one backup
+never touches the rest of the segment.
+
+Record payloads (JSON):
+    {"k": "f", "h": <content hash>, "p": <original path>, "d": {...snapshot...}}   full snapshot (keyframe)
+    {"k": "d", "h": ..., "p": ..., "b": <keyframe hash>, "s": {changed keys}, "x": [removed keys]}   delta
+
+Deduplication and delta selection need the catalog, so they live in metadata_backup;
+this module only knows how to append and read records.
+"""
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+import contextlib
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from app.services.logs import get_logger
+
+log = get_logger(__name__)
+
+SEGMENT_DIR_NAME = "segments"
+DEFAULT_SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+LOCK_FILE_NAME = ".lock"
+
+_SEGMENT_RE = re.compile(r'^seg-(\d{6})\.(zst|gz)$')
+
+# Guards appends and compaction within this process. Re-entrant so metadata_backup can
+# hold it across its dedup lookup + append (the refs it reuses must not be compacted in
+# between). SegmentStore.locked() adds a lock file for other processes (compaction runs
+# as a separate script).
+lock = threading.RLock()
+_file_locks = {} # segment dir -> [open lock file, depth]; only touched while holding `lock`
+
+def _lock_file(f):
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1) # Itself retries for ~10s
+            return
+        except OSError:
+            time.sleep(0.1)
+
+def _unlock_file(f):
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Exclusive lock on the file at path (created if missing) across threads and processes."""
+    with open(path, 'a+b') as f:
+        _lock_file(f)
+        try:
+            yield
+        finally:
+            _unlock_file(f)
+
+def _compress(ext, raw):
+    if ext == 'zst':
+        return zstandard.ZstdCompressor(level=9).compress(raw)
+    return gzip.compress(raw, compresslevel=6)
+
+def _decompress(ext, blob):
+    if ext == 'zst':
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("zstandard is required to read .zst backup segments")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return gzip.decompress(blob)
+
+def encode_delta(base: dict, entry: dict) -> dict:
+    """Returns {'s': changed/added keys, 'x': removed keys} turning base into entry."""
+    changed = {k: v for k, v in entry.items() if k not in base or base[k] != v}
+    removed = [k for k in base if k not in entry]
+    return {'s': changed, 'x': removed}
+
+def apply_delta(base: dict, payload: dict) -> dict:
+    """Rebuilds a snapshot from its keyframe and a delta payload."""
+    entry = dict(base)
+    for k in payload.get('x', []):
+        entry.pop(k, None)
+    entry.update(payload.get('s', {}))
+    return entry
+
+class SegmentStore:
+    """
+    Appends records to the newest segment (rolling over at max_bytes) and reads
+    them back by storage ref.
+    """
+    def __init__(self, root, max_bytes=DEFAULT_SEGMENT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ext = 'zst' if ZSTD_AVAILABLE else 'gz'
+
+    @contextlib.contextmanager
+    def locked(self):
+        """
+        Exclusive access to the store across threads and processes: the module RLock plus
+        an flock (msvcrt lock on Windows) on segments/.lock. Re-entrant within a thread.
+        """
+        with lock:
+            held = _file_locks.get(self.root)
+            if held is None:
+                os.makedirs(self.root, exist_ok=True)
+                f = open(os.path.join(self.root, LOCK_FILE_NAME), 'a+b')
+                try:
+                    _lock_file(f)
+                except BaseException:
+                    f.close()
+                    raise
+                held = _file_locks[self.root] = [f, 0]
+            held[1] += 1
+            try:
+                yield
+            finally:
+                held[1] -= 1
+                if held[1] == 0:
+                    del _file_locks[self.root]
+                    try:
+                        _unlock_file(held[0])
+                    finally:
+                        held[0].close()
+
+    # --- Segment bookkeeping ---
+
+    def segments(self):
+        """Returns [(number, filename)] of existing segments, oldest first."""
+        if not os.path.isdir(self.root):
+            return []
+        found = []
+        for name in os.listdir(self.root):
+            m = _SEGMENT_RE.match(name)
+            if m:
+                found.append((int(m.group(1)), name))
+        return sorted(found)
+
+    def _open_segment(self, next_size, start_new=False):
+        """Picks the segment to append to: the newest one, unless it's full or uses another codec."""
+        os.makedirs(self.root, exist_ok=True)
+        existing = self.segments()
+        number = existing[-1][0] if existing else 0
+        if existing and not start_new:
+            name = existing[-1][1]
+            path = os.path.join(self.root, name)
+            if name.endswith('.' + self.ext) and os.path.getsize(path) + next_size <= self.max_bytes:
+                return name
+        return f"seg-{number + 1:06d}.{self.ext}"
+
+    # --- Write / read ---
+
+    def append_many(self, payloads, start_new=False):
+        """
+        Compresses and appends each payload dict as its own record; fsyncs once at the end.
+        start_new forces a fresh segment (used by compaction).
+        Returns: list of storage refs, in input order.
+        """
+        if not payloads:
+            return []
+
+        refs = []
+        with self.locked():
+            blobs = [_compress(self.ext, json.dumps(p, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+                     for p in payloads]
+            name = self._open_segment(len(blobs[0]), start_new=start_new)
+            f = open(os.path.join(self.root, name), 'ab')
+            try:
+                offset = f.tell()
+                for blob in blobs:
+                    if offset and offset + len(blob) > self.max_bytes:
+                        # Roll over to the next segment
+                        f.flush()
+                        os.fsync(f.fileno())
+                        f.close()
+                        name = self._open_segment(len(blob), start_new=True)
+                        f = open(os.path.join(self.root, name), 'ab')
+                        offset = f.tell()
+                    f.write(blob)
+                    refs.append(f"{name}:{offset}:{len(blob)}")
+                    offset += len(blob)
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                f.close()
+        return refs
+
+    def read(self, ref):
+        """Returns the payload dict stored at ref. Raises ValueError / OSError if it can't be read."""
+        name, offset, length = ref.rsplit(':', 2)
+        m = _SEGMENT_RE.match(name)
+        if not m:
+            raise ValueError(f"Bad storage ref {ref}")
+        with open(os.path.join(self.root, name), 'rb') as f:
+            f.seek(int(offset))
+            blob = f.read(int(length))
+        return json.loads(_decompress(m.group(2), blob).decode('utf-8'))
+
+    def remove_segments(self, names):
+        """Deletes the given segment files (after compaction re-homed their live records)."""
+        with self.locked():
+            for name in names:
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except OSError as e:
+                    log.warning("Could not remove backup segment %s: %s", name, e)
+
+    def size_on_disk(self):
+        return sum(os.path.getsize(os.path.join(self.root, name)) for _, name in self.segments())
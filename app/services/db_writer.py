@@ -0,0 +1,96 @@
+import time
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app import db
+from app.models import Asset
+from app.services import metrics
+from app.services.logs import get_logger
+
+log = get_logger(__name__)
+
+class AssetWriter:
+    """
+    Batched DB writer for the scanner.
+
+    Accumulates plain row dicts and writes them with a single prepared
+    INSERT ... ON CONFLICT(file_path) DO UPDATE (executemany) per batch, bypassing
+    the ORM unit-of-work. Each flush also commits whatever else is pending in the
+    session (moved assets, scan manifest rows), so a batch is one transaction.
+    """
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.pending = []
+        self.rows_written = 0
+        self.write_seconds = 0.0
+        self.failures = 0
+        # Directories with work in the current transaction (see track_dir), and those whose
+        # work was lost to a failed commit: their scan manifest entry must not be recorded
+        self.uncommitted_dirs = set()
+        self.failed_dirs = set()
+
+        # Built once, re-used for every batch (SQLAlchemy caches the compiled form).
+        # On rescan conflicts the file is the source of truth for hash/metadata and the
+        # columns derived from them (GPS position, directory), but we keep the DB title
+        # (it may have been edited in the app).
+        stmt = sqlite_insert(Asset.__table__)
+        self.upsert = stmt.on_conflict_do_update(
+            index_elements=[Asset.__table__.c.file_path],
+            set_={
+                'file_hash': stmt.excluded.file_hash,
+                'media_type': stmt.excluded.media_type,
+                'captured_at': stmt.excluded.captured_at,
+                'meta_json': stmt.excluded.meta_json,
+                'latitude': stmt.excluded.latitude,
+                'longitude': stmt.excluded.longitude,
+                'dir_path': stmt.excluded.dir_path,
+            }
+        )
+
+    def add(self, row):
+        """Queues one row dict (see scanner.build_asset_row). Flushes when the batch is full."""
+        self.pending.append(row)
+        if len(self.pending) >= self.batch_size:
+            return self.flush()
+        return True
+
+    def flush(self):
+        """
+        Writes all queued rows and commits the session.
+        Returns False (after rolling back) on failure.
+        """
+        rows, self.pending = self.pending, []
+        start = time.perf_counter()
+
+        try:
+            with metrics.DB_COMMIT.time(kind='scan_batch'):
+                if rows:
+                    db.session.execute(self.upsert, rows)
+                db.session.commit()
+        except Exception as e:
+            self.rolled_back()
+            self.failures += 1
+            log.error("Bulk write error (%d rows discarded): %s", len(rows), e)
+            return False
+
+        self.uncommitted_dirs.clear()
+        self.write_seconds += time.perf_counter() - start
+        self.rows_written += len(rows)
+        if rows:
+            # Per batch; scan progress lines come from logs.Progress
+            log.debug("Committed %d assets...", self.rows_written)
+        return True
+
+    def track_dir(self, dir_path):
+        """Notes that the current transaction holds work (new or moved files) for dir_path."""
+        self.uncommitted_dirs.add(dir_path)
+
+    def rolled_back(self):
+        """Rolls the session back; the tracked directories lost their uncommitted work."""
+        db.session.rollback()
+        self.failed_dirs |= self.uncommitted_dirs
+        self.uncommitted_dirs.clear()
+
+    @property
+    def rows_per_second(self):
+        if not self.write_seconds:
+            return 0.0
+        return self.rows_written / self.write_seconds
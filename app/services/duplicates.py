@@ -0,0 +1,207 @@
+"""
+Duplicate finder.
+
+rebuild_duplicates() recomputes the duplicate_groups / duplicate_members tables
+(models.DuplicateGroup / DuplicateMember); the /duplicates pages only paginate them.
+- exact: assets sharing a file_hash, found with one GROUP BY over the file_hash index.
+- similar: assets whose dHashes (services/phash.py) differ in at most max_distance
+  bits. Candidate pairs come from multi-index hashing: the 64-bit hash is split into
+  four 16-bit chunks, and two hashes within distance r must have some chunk within
+  r // 4 bits of each other (pigeonhole). Each chunk is sorted once and probed with
+  NumPy (searchsorted) for all hashes at a time; candidates are verified with a
+  vectorized popcount. Matching pairs are joined into groups (connected components).
+"""
+import itertools
+from datetime import datetime
+import numpy as np
+from flask import current_app
+from sqlalchemy import delete, func, insert, select, text, update
+from app import db
+from app.models import Asset, DuplicateGroup, DuplicateMember
+from app.services.logs import get_logger
+from app.services.phash import HASH_BITS, hamming, to_unsigned
+
+log = get_logger(__name__)
+
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+# Hashes probed per NumPy step (bounds memory: block x probes x bucket size candidates)
+PROBE_BLOCK = 8192
+
+# Asset.media_type values Pillow can thumbnail
+IMAGE_TYPES = ('jpg', 'jpeg', 'png', 'gif', 'bmp', 'tiff', 'webp')
+
+_POPCOUNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+def _popcount(values):
+    """Set bits per element of a uint64 array."""
+    if hasattr(np, 'bitwise_count'): # NumPy >= 2.0
+        return np.bitwise_count(values)
+    return _POPCOUNT8[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+def _chunk_probes(radius):
+    """XOR masks of every chunk value within `radius` bits (0 = the value itself)."""
+    masks = [0]
+    for k in range(1, radius + 1):
+        masks.extend(sum(1 << b for b in bits) for bits in itertools.combinations(range(CHUNK_BITS), k))
+    return np.array(masks, dtype=np.uint64)
+
+def near_pairs(hashes, max_distance):
+    """
+    All pairs of distinct entries of `hashes` (unsigned 64-bit) within max_distance bits.
+    Returns: (i, j, distance) arrays with i < j.
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    n = len(hashes)
+    probes = _chunk_probes(max_distance // CHUNKS)
+    found = []
+
+    for c in range(CHUNKS):
+        keys = (hashes >> np.uint64(c * CHUNK_BITS)) & np.uint64((1 << CHUNK_BITS) - 1)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+
+        for start in range(0, n, PROBE_BLOCK):
+            queries = np.arange(start, min(n, start + PROBE_BLOCK))
+            probe_keys = (keys[queries][:, None] ^ probes[None, :]).ravel()
+            lo = np.searchsorted(sorted_keys, probe_keys, 'left')
+            hi = np.searchsorted(sorted_keys, probe_keys, 'right')
+            counts = hi - lo
+            total = int(counts.sum())
+            if not total:
+                continue
+
+            # Expand each probe's [lo, hi) range into (query, candidate) pairs
+            query_idx = np.repeat(np.repeat(queries, len(probes)), counts)
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            candidates = order[np.repeat(lo, counts) + offsets]
+
+            keep = candidates > query_idx
+            a, b = query_idx[keep], candidates[keep]
+            distances = _popcount(hashes[a] ^ hashes[b])
+            ok = distances <= max_distance
+            found.append((a[ok], b[ok], distances[ok]))
+
+    if not found:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, empty
+    a = np.concatenate([f[0] for f in found])
+    b = np.concatenate([f[1] for f in found])
+    d = np.concatenate([f[2] for f in found])
+    # A pair close in several chunks is found once per chunk
+    _, first = np.unique(a.astype(np.int64) * n + b, return_index=True)
+    return a[first], b[first], d[first].astype(np.int64)
+
+def _components(n, a, b):
+    """Union-find over pair lists. Returns: {root: [member indexes]} for components of 2+."""
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for x, y in zip(a.tolist(), b.tolist()):
+        rx, ry = find(x), find(y)
+        if rx != ry:
+            parent[max(rx, ry)] = min(rx, ry)
+
+    groups = {}
+    for x in set(a.tolist()) | set(b.tolist()):
+        groups.setdefault(find(x), []).append(x)
+    return groups
+
+def _rebuild_exact(built_at):
+    db.session.execute(text(
+        "INSERT INTO duplicate_groups (kind, hash_key, size, cover_asset_id, built_at) "
+        "SELECT 'exact', file_hash, count(*), min(id), :built_at FROM assets "
+        "WHERE file_hash IS NOT NULL GROUP BY file_hash HAVING count(*) > 1"
+    ), {'built_at': built_at})
+    db.session.execute(text(
+        "INSERT INTO duplicate_members (group_id, asset_id, distance) "
+        "SELECT g.id, a.id, 0 FROM duplicate_groups g JOIN assets a ON a.file_hash = g.hash_key "
+        "WHERE g.kind = 'exact'"
+    ))
+    return db.session.execute(select(func.count()).where(DuplicateGroup.kind == 'exact')).scalar()
+
+def _rebuild_similar(built_at, max_distance):
+    rows = db.session.execute(select(Asset.id, Asset.dhash, Asset.file_hash).where(Asset.dhash.isnot(None))).all()
+
+    # Search over distinct hashes; identical dHashes are grouped up front
+    assets_by_hash = {}
+    file_hashes = {}
+    for asset_id, value, file_hash in rows:
+        assets_by_hash.setdefault(to_unsigned(value), []).append(asset_id)
+        file_hashes[asset_id] = file_hash
+    distinct = list(assets_by_hash)
+    a, b, _ = near_pairs(distinct, max_distance)
+    components = _components(len(distinct), a, b)
+    # Identical dHash, different files (re-encodes): a group of one distinct hash
+    for index, value in enumerate(distinct):
+        if len(assets_by_hash[value]) > 1 and index not in components:
+            components[index] = [index]
+
+    groups = 0
+    for members in components.values():
+        asset_ids = [asset_id for index in members for asset_id in assets_by_hash[distinct[index]]]
+        # Byte-identical copies only: already an exact group
+        if len({file_hashes[i] for i in asset_ids}) < 2:
+            continue
+        # Representative: the hash shared by most assets (then the oldest asset)
+        rep = max(members, key=lambda index: (len(assets_by_hash[distinct[index]]), -min(assets_by_hash[distinct[index]])))
+        rep_hash = distinct[rep]
+        group_id = db.session.execute(insert(DuplicateGroup).values(
+            kind='similar', hash_key=f"{rep_hash:016x}", size=len(asset_ids),
+            cover_asset_id=min(assets_by_hash[rep_hash]), built_at=built_at,
+        )).inserted_primary_key[0]
+        db.session.execute(insert(DuplicateMember), [
+            {'group_id': group_id, 'asset_id': asset_id, 'distance': hamming(rep_hash, distinct[index])}
+            for index in members for asset_id in assets_by_hash[distinct[index]]
+        ])
+        groups += 1
+    return groups, len(rows)
+
+def rebuild_duplicates(max_distance=None):
+    """
+    Recomputes both kinds of duplicate groups (run on the write queue; the queue commits).
+    Returns: {'exact': groups, 'similar': groups, 'hashed': assets with a dHash}
+    """
+    if max_distance is None:
+        max_distance = current_app.config.get('DUPLICATE_MAX_DISTANCE', 6)
+    built_at = datetime.utcnow()
+
+    db.session.execute(delete(DuplicateMember))
+    db.session.execute(delete(DuplicateGroup))
+    exact = _rebuild_exact(built_at)
+    similar, hashed = _rebuild_similar(built_at, max_distance)
+    log.info("Duplicates rebuilt: %d exact groups, %d similar groups (%d hashed images, max distance %d).",
+             exact, similar, hashed, max_distance,
+             extra={'data': {'exact': exact, 'similar': similar, 'hashed': hashed}})
+    return {'exact': exact, 'similar': similar, 'hashed': hashed}
+
+def missing_hash_query():
+    """Images without perceptual hashes yet (thumbnail generated before they existed, or never)."""
+    return Asset.query.with_entities(Asset.id, Asset.file_path).filter(
+        Asset.phash.is_(None), Asset.media_type.in_(IMAGE_TYPES)).order_by(Asset.id)
+
+def store_hashes(values):
+    """values: {asset_id: {'dhash': ..., 'ahash': ..., 'phash': ...}} (signed). Run on the write queue."""
+    db.session.execute(update(Asset), [{'id': asset_id, **hashes} for asset_id, hashes in values.items()])
+
+def duplicate_page(session, kind, page, per_page):
+    """
+    One page of precomputed groups (largest first), with their members.
+    Returns: (pagination, {group_id: [member rows (id, file_path, media_type, captured_at, distance)]})
+    """
+    pagination = session.query(DuplicateGroup).filter(DuplicateGroup.kind == kind).order_by(
+        DuplicateGroup.size.desc(), DuplicateGroup.id).paginate(page=page, per_page=per_page, error_out=False)
+    group_ids = [g.id for g in pagination.items]
+    members = {}
+    if group_ids:
+        rows = session.query(DuplicateMember.group_id, Asset.id, Asset.file_path, Asset.media_type, Asset.captured_at,
+                             DuplicateMember.distance).join(Asset, Asset.id == DuplicateMember.asset_id).filter(
+            DuplicateMember.group_id.in_(group_ids)).order_by(DuplicateMember.group_id, DuplicateMember.distance, Asset.id)
+        for group_id, *member in rows:
+            members.setdefault(group_id, []).append(member)
+    return pagination, members
@@ -0,0 +1,185 @@
+"""
+Bulk export of confirmed faces to XMP-mwg-rs RegionInfo (the inverse of face_import_utils).
+
+Works in chunks of assets: one query for the chunk's faces + names, one batched backup,
+then one ExifTool process per chunk (per target kind) importing the regions from a JSON
+file (-json=). Files whose stored regions already match the DB are skipped, so re-running
+the job only touches what changed.
+"""
+import json
+import os
+import tempfile
+from sqlalchemy import select
+from sqlalchemy.orm import undefer
+from app import db
+from app.models import Asset, Face, Person
+from app.services import metadata_backup, metadata_writer, metrics
+from app.services.logs import get_logger, Progress
+from app.services.metadata import extract_face_regions, is_exiftool_available
+from app.services.face_import_utils import css_to_mwg, get_image_dimensions
+
+log = get_logger(__name__)
+
+# Normalized coordinate tolerance when comparing regions (rounding in other tools)
+AREA_TOLERANCE = 0.005
+
+def build_region_info(faces, width, height, keep_regions=None):
+    """
+    faces: [(name, [top, right, bottom, left])]
+    keep_regions: existing non-Face regions (pets, focus areas...) to carry over.
+    Returns the RegionInfo struct (ExifTool -struct / JSON form).
+    """
+    region_list = list(keep_regions or [])
+    for name, box in sorted(faces):
+        region_list.append({
+            'Area': css_to_mwg(box, width, height),
+            'Name': name,
+            'Type': 'Face'
+        })
+    return {
+        'AppliedToDimensions': {'W': width, 'H': height, 'Unit': 'pixel'},
+        'RegionList': region_list
+    }
+
+def _area_key(area):
+    return tuple(float(area.get(k, 0)) for k in ('X', 'Y', 'W', 'H'))
+
+def regions_match(existing, wanted):
+    """True if both region lists hold the same named faces at (nearly) the same places."""
+    if len(existing) != len(wanted):
+        return False
+    remaining = [(r['name'], _area_key(r['area'])) for r in existing]
+    for region in wanted:
+        key = _area_key(region['area'])
+        for i, (name, area) in enumerate(remaining):
+            if name == region['name'] and all(abs(a - b) <= AREA_TOLERANCE for a, b in zip(area, key)):
+                del remaining[i]
+                break
+        else:
+            return False
+    return True
+
+def _other_regions(meta):
+    """Non-face regions already in the file's RegionInfo (kept when rewriting)."""
+    region_info = (meta or {}).get('RegionInfo') or (meta or {}).get('XMP-mwg-rs:RegionInfo')
+    if not isinstance(region_info, dict):
+        return []
+    region_list = region_info.get('RegionList') or []
+    if isinstance(region_list, dict):
+        region_list = [region_list]
+    return [r for r in region_list if isinstance(r, dict) and r.get('Type') != 'Face']
+
+def _write_regions(entries, is_sidecar):
+    """
+    entries: [(target_file, region_info)]
+    One ExifTool process imports all regions from a temporary JSON file.
+    Returns: {target_file: success}
+    """
+    fd, json_path = tempfile.mkstemp(suffix='.json', prefix='regions_')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump([{'SourceFile': target, 'RegionInfo': info} for target, info in entries], f, ensure_ascii=False)
+        return metadata_writer.run_exiftool_write([f'-json={json_path}'], [t for t, _ in entries], is_sidecar)
+    finally:
+        os.remove(json_path)
+
+def export_chunk(assets, force=False):
+    """
+    Exports regions for a chunk of assets.
+    Returns: Dict of counts {'written', 'skipped', 'failed'}
+    """
+    counts = {'written': 0, 'skipped': 0, 'failed': 0}
+    ids = [a.id for a in assets]
+
+    faces = {}
+    rows = db.session.query(Face.asset_id, Person.name, Face.location).join(Person, Face.person_id == Person.id).filter(
+        Face.asset_id.in_(ids), Face.is_confirmed == True, Face.location.isnot(None)
+    )
+    for asset_id, name, location in rows:
+        faces.setdefault(asset_id, []).append((name, list(location)))
+
+    # 1. Decide what needs writing
+    todo = {} # asset -> region_info
+    for asset in assets:
+        meta = asset.meta_json or {}
+        dims = get_image_dimensions(meta, asset.file_path)
+        if not dims or not os.path.exists(asset.file_path):
+            counts['failed'] += 1
+            continue
+
+        region_info = build_region_info(faces.get(asset.id, []), dims[0], dims[1], _other_regions(meta))
+        wanted = [{'name': r['Name'], 'area': r['Area']} for r in region_info['RegionList'] if r.get('Type') == 'Face']
+        if not force and regions_match(extract_face_regions(meta), wanted):
+            counts['skipped'] += 1
+            continue
+        todo[asset] = region_info
+
+    if not todo:
+        return counts
+
+    # 2. Safety backup (one ExifTool run for the chunk)
+    backups = metadata_backup.create_backups([a.file_path for a in todo])
+
+    # 3. One ExifTool run per target kind
+    groups = {True: [], False: []}
+    for asset, region_info in todo.items():
+        if os.path.abspath(asset.file_path) not in backups:
+            log.warning("Aborting region write: Backup failed for %s", asset.file_path)
+            counts['failed'] += 1
+            continue
+        target = metadata_writer.get_target_file(asset.file_path)
+        groups[target != asset.file_path].append((asset, target, region_info))
+
+    for is_sidecar, members in groups.items():
+        if not members:
+            continue
+        results = _write_regions([(t, info) for _, t, info in members], is_sidecar)
+        for asset, target, region_info in members:
+            if results.get(target):
+                # Keep the DB copy in step so the next run can skip this file
+                meta = dict(asset.meta_json or {})
+                meta.pop('XMP-mwg-rs:RegionInfo', None)
+                meta['RegionInfo'] = region_info
+                asset.meta_json = meta
+                counts['written'] += 1
+            else:
+                counts['failed'] += 1
+
+    db.session.commit()
+    return counts
+
+@metrics.job('face_export')
+def export_face_regions(chunk_size=200, force=False, asset_ids=None):
+    """
+    Writes RegionInfo for every asset with confirmed, named faces
+    (assets without any are left untouched).
+    Progress is committed per chunk; because matching files are skipped, an interrupted
+    run can simply be started again.
+    Returns: Dict of counts {'written', 'skipped', 'failed'}
+    """
+    totals = {'written': 0, 'skipped': 0, 'failed': 0}
+    if not is_exiftool_available():
+        log.error("ExifTool not found in PATH")
+        return totals
+    progress = Progress(log, 'Face regions')
+
+    with_faces = select(Face.asset_id).where(Face.is_confirmed == True, Face.person_id.isnot(None))
+    if asset_ids is not None:
+        with_faces = with_faces.where(Face.asset_id.in_(asset_ids))
+
+    last_id = 0
+    while True:
+        # Keyset pagination by id: stable while we commit between chunks
+        assets = Asset.query.options(undefer(Asset.meta_json)).filter(Asset.id.in_(with_faces), Asset.id > last_id).order_by(Asset.id).limit(chunk_size).all()
+        if not assets:
+            break
+        last_id = assets[-1].id
+
+        counts = export_chunk(assets, force=force)
+        for k, v in counts.items():
+            totals[k] += v
+        progress.update(len(assets), **counts)
+        db.session.expunge_all()
+
+    progress.finish()
+    return totals
@@ -5,6 +5,9 @@ import numpy as np
 from app import db
 from app.models import Asset, Face, Person
 from app.services import metadata as metadata_service
+from app.services.logs import get_logger
+
+log = get_logger(__name__)
 
 def calculate_iou(box1, box2):
     """
@@ -67,6 +70,54 @@ def mwg_to_css(area, width, height):
     
     return [top, right, bottom, left]
 
+def css_to_mwg(box, width, height):
+    """
+    Inverse of mwg_to_css.
+    Converts CSS Box [top, right, bottom, left] (pixels) to MWG Area (Center X, Center Y, W, H normalized).
+    Values are rounded to 6 decimals so re-exports compare equal.
+    """
+    top, right, bottom, left = box
+    w = (right - left) / width
+    h = (bottom - top) / height
+    cx = (left + right) / 2 / width
+    cy = (top + bottom) / 2 / height
+    
+    return {
+        'X': round(cx, 6),
+        'Y': round(cy, 6),
+        'W': round(w, 6),
+        'H': round(h, 6),
+        'Unit': 'normalized'
+    }
+
+def get_image_dimensions(meta, file_path=None):
+    """
+    Returns (width, height) from ExifTool metadata, or None.
+    If file_path is given, falls back to reading the image header with Pillow (no full decode).
+    """
+    meta = meta or {}
+    try:
+        # meta usually has Composite:ImageSize = "1500x1125"
+        for key in ('Composite:ImageSize', 'ImageSize'):
+            if isinstance(meta.get(key), str) and 'x' in meta[key]:
+                w_str, h_str = meta[key].split('x')
+                return int(w_str), int(h_str)
+        if 'File:ImageWidth' in meta and 'File:ImageHeight' in meta:
+            return int(meta['File:ImageWidth']), int(meta['File:ImageHeight'])
+        if 'ImageWidth' in meta and 'ImageHeight' in meta:
+            return int(meta['ImageWidth']), int(meta['ImageHeight'])
+    except (TypeError, ValueError):
+        pass
+
+    if file_path:
+        try:
+            from PIL import Image
+            with Image.open(file_path) as img:
+                return img.size
+        except Exception:
+            pass
+    return None
+
 def import_faces_from_metadata(asset):
     """
     Imports faces from asset metadata and merges with existing DB faces.
@@ -83,22 +134,13 @@ def import_faces_from_metadata(asset):
     if not regions:
         return 0
         
-    # Get image dimensions (from DB or meta)
-    # meta usually has Composite:ImageSize = "1500x1125"
-    if 'Composite:ImageSize' in meta:
-        w_str, h_str = meta['Composite:ImageSize'].split('x')
-        width = int(w_str)
-        height = int(h_str)
-    elif 'File:ImageWidth' in meta and 'File:ImageHeight' in meta:
-        width = int(meta['File:ImageWidth'])
-        height = int(meta['File:ImageHeight'])
-    elif 'ImageWidth' in meta:
-        width = int(meta['ImageWidth'])
-        height = int(meta['ImageHeight'])
-    else:
+    # Get image dimensions (from meta)
+    dims = get_image_dimensions(meta)
+    if not dims:
         # Fallback to load image? Expensive.
-        print(f"Skipping import for {asset.id}: No dimensions found.")
+        log.debug("Skipping import for %s: No dimensions found.", asset.id)
         return 0
+    width, height = dims
         
     existing_faces = Face.query.filter_by(asset_id=asset.id).all()
     
@@ -145,12 +187,12 @@ def import_faces_from_metadata(asset):
                 
             matched_face.person_id = person.id
             matched_face.is_confirmed = True
-            print(f"Updated Face {matched_face.id} with name '{name}' (IoU: {best_iou:.2f})")
+            log.debug("Updated Face %s with name '%s' (IoU: %.2f)", matched_face.id, name, best_iou)
             imported_count += 1
             
         else:
             # CREATE new face
-            print(f"Creating NEW Face for '{name}' from metadata")
+            log.debug("Creating NEW Face for '%s' from metadata", name)
             
             person = Person.query.filter_by(name=name).first()
             if not person:
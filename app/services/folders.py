@@ -0,0 +1,213 @@
+"""
+Maintains the precomputed folder tree (models.Folder).
+
+- rebuild_folders(): full recompute for one or more library roots, from a single
+  GROUP BY over Asset.dir_path plus the scan manifest (so empty directories show too).
+  Run after scans.
+- update_folders(): incremental update for a handful of directories touched by the
+  watcher; count deltas are propagated up to the library root.
+"""
+import os
+from sqlalchemy import bindparam, case, func, insert
+from app import db
+from app.models import Asset, Folder, LibraryPath, ScanManifest, under_path
+from app.services.logs import get_logger
+
+log = get_logger(__name__)
+
+# Media types that have thumbnails (same list the grid templates use)
+THUMBNAIL_TYPES = ('jpg', 'jpeg', 'png', 'gif', 'webp')
+
+def _norm(path):
+    """Strips a trailing separator (except for a filesystem root) so paths compare with dirname() output."""
+    return path.rstrip(os.sep) or os.sep
+
+def _lineage(dir_path, root):
+    """dir_path, its parent, ... up to and including root."""
+    path = dir_path
+    while True:
+        yield path
+        if path == root:
+            return
+        parent = os.path.dirname(path)
+        if parent == path:
+            return
+        path = parent
+
+def _root_of(dir_path, roots):
+    """Longest library root containing dir_path, or None."""
+    best = None
+    for root in roots:
+        if dir_path == root or dir_path.startswith(root.rstrip(os.sep) + os.sep):
+            if best is None or len(root) > len(best):
+                best = root
+    return best
+
+def _direct_stats(condition):
+    """{dir_path: (count, newest added_at, newest thumbnailable asset id)} for directories matching condition."""
+    rows = db.session.query(
+        Asset.dir_path,
+        func.count(Asset.id),
+        func.max(Asset.added_at),
+        func.max(case((Asset.media_type.in_(THUMBNAIL_TYPES), Asset.id))),
+    ).filter(condition).group_by(Asset.dir_path)
+    return {d: (count, last, cover) for d, count, last, cover in rows}
+
+def backfill_dir_paths(batch_size=5000):
+    """Fills Asset.dir_path for rows indexed before the column existed. Returns rows updated."""
+    updated = 0
+    while True:
+        rows = db.session.query(Asset.id, Asset.file_path).filter(Asset.dir_path.is_(None)).limit(batch_size).all()
+        if not rows:
+            break
+        db.session.execute(
+            Asset.__table__.update().where(Asset.id == bindparam('asset_id')).values(dir_path=bindparam('dir')),
+            [{'asset_id': i, 'dir': os.path.dirname(p)} for i, p in rows]
+        )
+        db.session.commit()
+        updated += len(rows)
+    if updated:
+        log.info("Folder tree: filled dir_path for %d assets.", updated)
+    return updated
+
+def rebuild_folders(library_paths=None):
+    """
+    Recomputes the folder rows of the given library roots (default: all) and commits.
+    Returns the number of folder rows written.
+    """
+    backfill_dir_paths()
+    if library_paths is None:
+        library_paths = [lp.path for lp in LibraryPath.query.all()]
+
+    written = 0
+    for library_path in library_paths:
+        root = _norm(library_path)
+        prefix = root.rstrip(os.sep) + os.sep
+        stats = _direct_stats(under_path(Asset.dir_path, root, include_self=True))
+
+        tree = {}
+        def node(path):
+            if path not in tree:
+                tree[path] = {'asset_count': 0, 'recursive_count': 0, 'cover': None, 'sub_cover': None, 'last_change': None}
+            return tree[path]
+
+        # Directories seen by the scanner (includes folders with no media).
+        # Manifest rows of directories that have since been moved away are skipped.
+        for (dir_path,) in db.session.query(ScanManifest.path).filter(ScanManifest.library_path == library_path):
+            dir_path = _norm(dir_path)
+            if dir_path in stats or os.path.isdir(dir_path):
+                for path in _lineage(dir_path, root):
+                    node(path)
+
+        for dir_path, (count, last, cover) in stats.items():
+            direct = node(dir_path)
+            direct['asset_count'] = count
+            direct['cover'] = cover
+            for path in _lineage(dir_path, root):
+                n = node(path)
+                n['recursive_count'] += count
+                if last and (n['last_change'] is None or last > n['last_change']):
+                    n['last_change'] = last
+                if cover and (n['sub_cover'] is None or cover > n['sub_cover']):
+                    n['sub_cover'] = cover
+        node(root)
+
+        rows = []
+        for path, n in tree.items():
+            if path != root and not path.startswith(prefix):
+                continue
+            rows.append({
+                'path': path,
+                'parent_path': None if path == root else os.path.dirname(path),
+                'library_path': library_path,
+                'name': path if path == root else os.path.basename(path),
+                'asset_count': n['asset_count'],
+                'recursive_count': n['recursive_count'],
+                'cover_asset_id': n['cover'] or n['sub_cover'],
+                'last_change': n['last_change'],
+            })
+
+        Folder.query.filter(Folder.library_path == library_path).delete(synchronize_session=False)
+        # A folder may have been cataloged under another root (nested libraries): this root wins
+        for i in range(0, len(rows), 500):
+            Folder.query.filter(Folder.path.in_([r['path'] for r in rows[i:i + 500]])).delete(synchronize_session=False)
+        if rows:
+            db.session.execute(insert(Folder), rows)
+        db.session.commit()
+        written += len(rows)
+
+    log.info("Folder tree rebuilt: %d folders in %d root(s).", written, len(library_paths))
+    return written
+
+def remove_library_folders(library_path):
+    """Drops the folder rows of a removed library (no commit)."""
+    Folder.query.filter(Folder.library_path == library_path).delete(synchronize_session=False)
+
+def has_folder(path):
+    """True if path is a cataloged folder."""
+    return db.session.query(Folder.id).filter(Folder.path == _norm(path)).first() is not None
+
+def update_folders(dir_paths):
+    """
+    Incremental update for directories whose direct contents changed (no commit).
+    Recounts each directory, then applies the count delta to every ancestor up to its
+    library root, creating missing folder rows on the way.
+    """
+    roots = {_norm(lp.path): lp.path for lp in LibraryPath.query.all()}
+    dir_paths = {_norm(d) for d in dir_paths}
+    dir_paths = {d for d in dir_paths if _root_of(d, roots)}
+    if not dir_paths:
+        return 0
+
+    stats = {}
+    dirs = list(dir_paths)
+    for i in range(0, len(dirs), 500):
+        stats.update(_direct_stats(Asset.dir_path.in_(dirs[i:i + 500])))
+
+    cache = {}
+    def get_folder(path, root):
+        if path in cache:
+            return cache[path]
+        folder = Folder.query.filter_by(path=path).first()
+        if folder is None:
+            folder = Folder(path=path, parent_path=None if path == root else os.path.dirname(path),
+                            library_path=roots[root], name=path if path == root else os.path.basename(path),
+                            asset_count=0, recursive_count=0)
+            db.session.add(folder)
+        cache[path] = folder
+        return folder
+
+    touched = []
+    for dir_path in dirs:
+        root = _root_of(dir_path, roots)
+        count, last, cover = stats.get(dir_path, (0, None, None))
+        with db.session.no_autoflush:
+            folder = get_folder(dir_path, root)
+            delta = count - (folder.asset_count or 0)
+            folder.asset_count = count
+            if cover:
+                folder.cover_asset_id = cover
+
+            for path in _lineage(dir_path, root):
+                node = folder if path == dir_path else get_folder(path, root)
+                node.recursive_count = max(0, (node.recursive_count or 0) + delta)
+                if last and (node.last_change is None or last > node.last_change):
+                    node.last_change = last
+                if cover and not node.cover_asset_id:
+                    node.cover_asset_id = cover
+                if node not in touched:
+                    touched.append(node)
+
+    # Covers pointing at deleted assets (or moved out of the folder): pick the newest image
+    # of the folder or below it again
+    covers = {f.cover_asset_id for f in touched if f.cover_asset_id}
+    alive = dict(db.session.query(Asset.id, Asset.dir_path).filter(Asset.id.in_(list(covers)))) if covers else {}
+    for folder in touched:
+        cover_dir = alive.get(folder.cover_asset_id)
+        if folder.cover_asset_id and not (cover_dir and (cover_dir == folder.path or cover_dir.startswith(folder.path.rstrip(os.sep) + os.sep))):
+            folder.cover_asset_id = db.session.query(func.max(Asset.id)).filter(
+                Asset.media_type.in_(THUMBNAIL_TYPES),
+                under_path(Asset.dir_path, folder.path, include_self=True)
+            ).scalar()
+
+    return len(dirs)
@@ -0,0 +1,200 @@
+"""
+Spatial index for geotagged assets and map clustering.
+
+Asset.latitude / longitude are parsed at ingest (metadata.extract_coordinates).
+SQLite triggers on assets keep two structures current, whatever the write path:
+- asset_geo: an R*Tree of the points, for bounding-box lookups at close zoom.
+- geo_cells (models.GeoCell): per-zoom grid counts for zoom levels up to
+  CELL_MAX_ZOOM, so zoomed-out views read a few hundred pre-aggregated cells instead
+  of grouping every point in the viewport.
+cluster_bbox() returns one marker per occupied grid cell of a viewport.
+"""
+import math
+from sqlalchemy import text
+from app import db
+from app.database import ensure_triggers
+from app.models import GeoCell
+from app.services.metadata import extract_coordinates
+from app.services.logs import get_logger
+
+log = get_logger(__name__)
+
+# Grid cells per 256px map tile (4 -> one marker per 64px square at most)
+CELLS_PER_TILE = 4
+MAX_ZOOM = 22
+# Zoom levels served from geo_cells; closer views group R*Tree points on the fly
+CELL_MAX_ZOOM = 14
+
+def cell_size(zoom):
+    """Grid cell width in degrees (of latitude and longitude) for a web-map zoom level."""
+    zoom = max(0, min(MAX_ZOOM, int(zoom)))
+    return 360.0 / (2 ** zoom) / CELLS_PER_TILE
+
+def _cell_keys(row):
+    # (level, cx, cy) of the row's point at every aggregated level.
+    # Cells are anchored at -180 / -90 so a marker stays put while the map pans.
+    return ", ".join(
+        f"({level}, CAST(({row}.longitude + 180.0) / {cell_size(level)!r} AS INTEGER), "
+        f"CAST(({row}.latitude + 90.0) / {cell_size(level)!r} AS INTEGER))"
+        for level in range(CELL_MAX_ZOOM + 1)
+    )
+
+def _add(row):
+    return (
+        f"INSERT INTO asset_geo (id, min_lat, max_lat, min_lng, max_lng) "
+        f"SELECT {row}.id, {row}.latitude, {row}.latitude, {row}.longitude, {row}.longitude "
+        f"WHERE {row}.latitude IS NOT NULL AND {row}.longitude IS NOT NULL; "
+        f"INSERT INTO geo_cells (level, cx, cy, count, sum_lat, sum_lng, max_id) "
+        f"SELECT column1, column2, column3, 1, {row}.latitude, {row}.longitude, {row}.id "
+        f"FROM (VALUES {_cell_keys(row)}) "
+        f"WHERE {row}.latitude IS NOT NULL AND {row}.longitude IS NOT NULL "
+        f"ON CONFLICT(level, cx, cy) DO UPDATE SET count = count + 1, "
+        f"sum_lat = sum_lat + excluded.sum_lat, sum_lng = sum_lng + excluded.sum_lng, "
+        f"max_id = max(max_id, excluded.max_id);"
+    )
+
+def _remove(row):
+    # The point leaves the R*Tree first, so a cell whose marker asset goes can pick
+    # its newest remaining point as the new marker
+    return (
+        f"DELETE FROM asset_geo WHERE id = {row}.id; "
+        f"UPDATE geo_cells SET count = count - 1, "
+        f"sum_lat = sum_lat - {row}.latitude, sum_lng = sum_lng - {row}.longitude "
+        f"WHERE (level, cx, cy) IN (VALUES {_cell_keys(row)}); "
+        f"DELETE FROM geo_cells WHERE count <= 0 AND (level, cx, cy) IN (VALUES {_cell_keys(row)}); "
+        f"UPDATE geo_cells SET max_id = (SELECT max(id) FROM asset_geo "
+        f"  WHERE min_lng >= geo_cells.cx * (360.0 / (1 << geo_cells.level) / {CELLS_PER_TILE}) - 180.0 "
+        f"    AND min_lng < (geo_cells.cx + 1) * (360.0 / (1 << geo_cells.level) / {CELLS_PER_TILE}) - 180.0 "
+        f"    AND min_lat >= geo_cells.cy * (360.0 / (1 << geo_cells.level) / {CELLS_PER_TILE}) - 90.0 "
+        f"    AND min_lat < (geo_cells.cy + 1) * (360.0 / (1 << geo_cells.level) / {CELLS_PER_TILE}) - 90.0) "
+        f"WHERE max_id = {row}.id AND (level, cx, cy) IN (VALUES {_cell_keys(row)});"
+    )
+
+SCHEMA = {
+    # R*Tree of points (min = max); id is the asset id
+    'asset_geo': "CREATE VIRTUAL TABLE asset_geo USING rtree(id, min_lat, max_lat, min_lng, max_lng)",
+    'geo_asset_insert': f"""
+        CREATE TRIGGER geo_asset_insert AFTER INSERT ON assets
+        WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+        BEGIN {_add('NEW')} END""",
+    'geo_asset_delete': f"""
+        CREATE TRIGGER geo_asset_delete AFTER DELETE ON assets
+        WHEN OLD.latitude IS NOT NULL AND OLD.longitude IS NOT NULL
+        BEGIN {_remove('OLD')} END""",
+    'geo_asset_update': f"""
+        CREATE TRIGGER geo_asset_update AFTER UPDATE OF latitude, longitude ON assets
+        WHEN OLD.latitude IS NOT NEW.latitude OR OLD.longitude IS NOT NEW.longitude
+        BEGIN {_remove('OLD')} {_add('NEW')} END""",
+}
+
+def backfill_coordinates(batch_size=5000):
+    """
+    Parses coordinates for assets indexed before the latitude / longitude columns existed.
+    Only rows whose meta_json has a GPSLatitude are read. Returns rows with a position.
+    """
+    found = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(text(
+            "SELECT id, json_extract(meta_json, '$.GPSLatitude'), json_extract(meta_json, '$.GPSLatitudeRef'), "
+            "json_extract(meta_json, '$.GPSLongitude'), json_extract(meta_json, '$.GPSLongitudeRef') "
+            "FROM assets WHERE id > :last_id AND latitude IS NULL "
+            "AND json_extract(meta_json, '$.GPSLatitude') IS NOT NULL ORDER BY id LIMIT :limit"
+        ), {'last_id': last_id, 'limit': batch_size}).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        updates = []
+        for asset_id, lat, lat_ref, lng, lng_ref in rows:
+            lat, lng = extract_coordinates({'GPSLatitude': lat, 'GPSLatitudeRef': lat_ref,
+                                            'GPSLongitude': lng, 'GPSLongitudeRef': lng_ref})
+            if lat is not None:
+                updates.append({'asset_id': asset_id, 'lat': lat, 'lng': lng})
+        if updates:
+            db.session.execute(text("UPDATE assets SET latitude = :lat, longitude = :lng WHERE id = :asset_id"), updates)
+            db.session.commit()
+        found += len(updates)
+    if found:
+        log.info("GPS index: %d geotagged assets backfilled.", found)
+    return found
+
+def rebuild_geo_index():
+    """Recomputes the R*Tree and the grid cells from Asset.latitude / longitude. Returns the number of points."""
+    located = "FROM assets WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+    with db.engine.begin() as conn:
+        conn.execute(text("DELETE FROM asset_geo"))
+        conn.execute(text(f"INSERT INTO asset_geo (id, min_lat, max_lat, min_lng, max_lng) "
+                          f"SELECT id, latitude, latitude, longitude, longitude {located}"))
+        conn.execute(text("DELETE FROM geo_cells"))
+        for level in range(CELL_MAX_ZOOM + 1):
+            size = cell_size(level)
+            conn.execute(text(
+                f"INSERT INTO geo_cells (level, cx, cy, count, sum_lat, sum_lng, max_id) "
+                f"SELECT {level}, CAST((longitude + 180.0) / {size!r} AS INTEGER) AS x, "
+                f"CAST((latitude + 90.0) / {size!r} AS INTEGER) AS y, "
+                f"count(*), sum(latitude), sum(longitude), max(id) {located} GROUP BY x, y"
+            ))
+        points = conn.execute(text("SELECT count(*) FROM asset_geo")).scalar()
+    log.info("GPS index rebuilt: %d points.", points)
+    return points
+
+def install_geo():
+    """
+    Creates the R*Tree and its triggers if missing (run at startup after create_all).
+    The first time, coordinates of already indexed assets are parsed and indexed.
+    """
+    if ensure_triggers(SCHEMA):
+        backfill_coordinates()
+        rebuild_geo_index()
+
+def parse_bbox(value):
+    """
+    'west,south,east,north' -> tuple of floats (latitudes clamped), or None if malformed.
+    west > east means the box crosses the antimeridian.
+    """
+    try:
+        west, south, east, north = (float(v) for v in (value or '').split(','))
+    except ValueError:
+        return None
+    if not all(math.isfinite(v) for v in (west, south, east, north)) or south > north:
+        return None
+    return west, max(south, -90.0), east, min(north, 90.0)
+
+def _cluster_cells(session, west, south, east, north, zoom):
+    size = cell_size(zoom)
+    rows = session.query(GeoCell.count, GeoCell.sum_lat, GeoCell.sum_lng, GeoCell.max_id).filter(
+        GeoCell.level == zoom,
+        GeoCell.cx.between(int((west + 180.0) // size), int((east + 180.0) // size)),
+        GeoCell.cy.between(int((south + 90.0) // size), int((north + 90.0) // size)),
+    )
+    return [(count, sum_lat / count, sum_lng / count, max_id) for count, sum_lat, sum_lng, max_id in rows]
+
+def _cluster_points(session, west, south, east, north, zoom):
+    return session.execute(text(
+        "SELECT count(*), avg(min_lat), avg(min_lng), max(id) FROM asset_geo "
+        "WHERE max_lat >= :south AND min_lat <= :north AND max_lng >= :west AND min_lng <= :east "
+        "GROUP BY CAST((min_lng + 180.0) / :size AS INTEGER), CAST((min_lat + 90.0) / :size AS INTEGER)"
+    ), {'size': cell_size(zoom), 'south': south, 'north': north, 'west': west, 'east': east}).fetchall()
+
+def cluster_bbox(session, bbox, zoom):
+    """
+    Grid-bucketed markers for a map viewport.
+    bbox: (west, south, east, north) in degrees; zoom: web-map zoom level.
+    Returns: (clusters, total) where clusters is a list of dicts
+             {lat, lng, count, asset_id} (lat / lng = mean position of the cell's points,
+             asset_id = the cell's newest asset, e.g. for a thumbnail).
+    """
+    west, south, east, north = bbox
+    zoom = max(0, min(MAX_ZOOM, int(zoom)))
+    if west <= east:
+        boxes = [(west, south, east, north)]
+    else:
+        boxes = [(west, south, 180.0, north), (-180.0, south, east, north)]
+    lookup = _cluster_cells if zoom <= CELL_MAX_ZOOM else _cluster_points
+
+    clusters = []
+    for box in boxes:
+        for count, lat, lng, asset_id in lookup(session, *box, zoom):
+            clusters.append({'lat': round(lat, 6), 'lng': round(lng, 6), 'count': count, 'asset_id': asset_id})
+    return clusters, sum(c['count'] for c in clusters)
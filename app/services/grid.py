@@ -0,0 +1,70 @@
+"""
+Lightweight projections for grid / listing pages.
+
+Grid tiles only need a handful of columns, so listing routes select exactly those
+(plus a SQL-side "is AI generated" flag) instead of full Asset rows. No meta_json blob
+is fetched or deserialized per tile.
+"""
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import func
+from app.models import Asset
+
+class AssetTile:
+    """One grid tile. Attribute names match Asset so templates work with either."""
+    __slots__ = ('id', 'file_path', 'title', 'media_type', 'captured_at', 'added_at', 'is_ai')
+
+    def __init__(self, id, file_path, title, media_type, captured_at, added_at, is_ai):
+        self.id = id
+        self.file_path = file_path
+        self.title = title
+        self.media_type = media_type
+        self.captured_at = captured_at
+        self.added_at = added_at
+        self.is_ai = bool(is_ai)
+
+# Same order as AssetTile.__init__. The AI flag mirrors the old template check
+# (a truthy meta_json['AIGenerationInfo']) but is evaluated by SQLite's JSON functions.
+TILE_COLUMNS = (
+    Asset.id,
+    Asset.file_path,
+    Asset.title,
+    Asset.media_type,
+    Asset.captured_at,
+    Asset.added_at,
+    func.coalesce(func.json_type(Asset.meta_json, '$.AIGenerationInfo'), 'null').notin_(['null', 'false']).label('is_ai'),
+)
+
+def tile_query(session):
+    """Query of tile columns; filter / order it like an Asset query."""
+    return session.query(*TILE_COLUMNS)
+
+def to_tiles(rows):
+    return [AssetTile(*row) for row in rows]
+
+def paginate_tiles(query, page, per_page):
+    """Flask-SQLAlchemy pagination whose items are AssetTiles."""
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    pagination.items = to_tiles(pagination.items)
+    return pagination
+
+class RankedPagination(Pagination):
+    """Pagination over a ranked list of asset ids (best first), e.g. semantic search hits."""
+    def _query_items(self):
+        query, ids = self._query_args['query'], self._query_args['ids']
+        page_ids = ids[(self.page - 1) * self.per_page:self.page * self.per_page]
+        if not page_ids:
+            return []
+        tiles = {tile.id: tile for tile in to_tiles(query.filter(Asset.id.in_(page_ids)))}
+        return [tiles[i] for i in page_ids if i in tiles]
+
+    def _query_count(self):
+        return len(self._query_args['ids'])
+
+def paginate_ranked(query, ranked_ids, page, per_page):
+    """
+    Pages of a tile query in the order of ranked_ids. Ids the query filters out (other
+    folder, deleted asset) are dropped first, so page sizes and totals stay right.
+    """
+    kept = {row[0] for row in query.with_entities(Asset.id).filter(Asset.id.in_(ranked_ids))}
+    ids = [i for i in ranked_ids if i in kept]
+    return RankedPagination(page=page, per_page=per_page, max_per_page=None, error_out=False, query=query, ids=ids)
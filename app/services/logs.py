@@ -0,0 +1,153 @@
+"""
+Structured, rate-limited logging for the background jobs.
+
+Services log through get_logger(__name__) ("archivedb.*" loggers) instead of print().
+configure_logging() (called from create_app) sets them up from the config:
+- LOG_LEVEL: per-file detail ("Processing faces for ...") is DEBUG, job summaries INFO.
+- LOG_FORMAT: 'text' (human readable) or 'json' (one JSON object per line, with the
+  structured fields passed as extra={'data': {...}}).
+- LOG_RATE_LIMIT: at most this many lines per message template and logger per minute;
+  the rest are counted and the count is reported on the next line that gets through.
+  Messages must use %-style arguments (log.warning("Error on %s: %s", path, e)) so
+  repeats share a template. 0 disables the limit.
+Loops report through Progress, which aggregates per-item updates into one line every
+LOG_PROGRESS_SECONDS, so a 500k-file scan logs a few hundred lines, not 500k.
+"""
+import json
+import logging
+import sys
+import threading
+import time
+from datetime import datetime
+
+ROOT_LOGGER = 'archivedb'
+
+# Seconds between Progress lines (set from LOG_PROGRESS_SECONDS)
+progress_interval = 10.0
+
+_handler = None
+
+def get_logger(name):
+    """Logger below the app's namespace: get_logger('app.services.scanner') -> 'archivedb.scanner'."""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name.rsplit('.', 1)[-1]}")
+
+class RateLimitFilter(logging.Filter):
+    """Lets through `limit` records per (logger, message template) per `window` seconds."""
+    def __init__(self, limit, window=60.0):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.lock = threading.Lock()
+        self.seen = {} # (logger, template) -> [window start, passed, suppressed]
+
+    def filter(self, record):
+        if not self.limit or not getattr(record, 'rate_limit', True):
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            state = self.seen.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                state = self.seen[key] = [now, 0, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+            if state[1] >= self.limit:
+                state[2] += 1
+                return False
+            state[1] += 1
+            if state[1] == self.limit:
+                record.limit_reached = True
+        return True
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s', datefmt='%H:%M:%S')
+
+    def format(self, record):
+        line = super().format(record)
+        if getattr(record, 'suppressed', 0):
+            line += f" [{record.suppressed} similar messages suppressed]"
+        if getattr(record, 'limit_reached', False):
+            line += " [further similar messages suppressed for a while]"
+        return line
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        data = getattr(record, 'data', None)
+        if data:
+            entry.update(data)
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+def configure_logging(app):
+    """Installs one stdout handler on the 'archivedb' logger, per LOG_LEVEL / LOG_FORMAT / LOG_RATE_LIMIT."""
+    global _handler, progress_interval
+    logger = logging.getLogger(ROOT_LOGGER)
+    if _handler is not None:
+        logger.removeHandler(_handler)
+
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(JsonFormatter() if app.config.get('LOG_FORMAT') == 'json' else TextFormatter())
+    _handler.addFilter(RateLimitFilter(app.config.get('LOG_RATE_LIMIT', 20)))
+    logger.addHandler(_handler)
+    logger.setLevel(str(app.config.get('LOG_LEVEL', 'INFO')).upper())
+    logger.propagate = False
+    progress_interval = app.config.get('LOG_PROGRESS_SECONDS', progress_interval)
+
+class Progress:
+    """
+    Aggregated progress of a loop. update() is cheap and thread-safe; a line is logged
+    at most every progress_interval seconds, and once more by finish().
+
+        progress = Progress(log, 'Faces', total=len(assets))
+        for asset in assets:
+            ...
+            progress.update(faces=len(locations))
+        progress.finish()
+    """
+    def __init__(self, logger, label, total=None):
+        self.logger = logger
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.counts = {}
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.last_report = self.started
+
+    def update(self, n=1, **counts):
+        with self.lock:
+            self.done += n
+            for name, value in counts.items():
+                self.counts[name] = self.counts.get(name, 0) + value
+            now = time.monotonic()
+            if now - self.last_report < progress_interval:
+                return
+            self.last_report = now
+        self._report(logging.INFO, final=False)
+
+    def finish(self):
+        self._report(logging.INFO, final=True)
+
+    def _report(self, level, final):
+        with self.lock:
+            done, counts = self.done, dict(self.counts)
+        elapsed = time.monotonic() - self.started
+        rate = done / elapsed if elapsed else 0.0
+        position = f"{done}/{self.total}" if self.total is not None else f"{done}"
+        details = ''.join(f", {name}: {value}" for name, value in counts.items())
+        self.logger.log(level, "%s %s: %s items in %.1fs (%.0f/s)%s", self.label, 'done' if final else 'progress',
+                        position, elapsed, rate, details,
+                        extra={'rate_limit': False, 'data': {'progress': self.label, 'done': done, 'total': self.total,
+                                                             'seconds': round(elapsed, 1), 'rate': round(rate, 1),
+                                                             'final': final, **counts}})
@@ -1,10 +1,20 @@
 import subprocess
 import json
+import re
 import shutil
 from datetime import datetime
+from app.services import metrics
+from app.services.logs import get_logger
+
+log = get_logger(__name__)
 
 EXIFTOOL_PATH = 'exiftool' # Assumes it's in PATH
 
+# Print GPS coordinates as decimal degrees ("40.71280000 N") instead of
+# "40 deg 42' 46.00\" N", so they can be parsed at ingest without DMS guessing.
+# Only coordinates are affected (unlike -n, which would make every tag numeric).
+COORD_FORMAT_ARGS = ['-c', '%.8f']
+
 def is_exiftool_available():
     return shutil.which(EXIFTOOL_PATH) is not None
 
@@ -29,11 +39,12 @@ def get_metadata(file_path):
         # Let's try to just use default first but maybe the user's files have them in a way standard scan missed?
         # Or maybe I need to specifically ask for them? No, exiftool usually dumps all.
         # I'll update command to include -struct to get structural XMP if needed, and -a.
-        cmd = [EXIFTOOL_PATH, '-j', '-a', '-struct', file_path]
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        cmd = [EXIFTOOL_PATH, '-j', '-a', '-struct'] + COORD_FORMAT_ARGS + [file_path]
+        with metrics.EXIFTOOL.time(op='read'):
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
         
         if result.returncode != 0:
-            print(f"ExifTool Error: {result.stderr}")
+            log.warning("ExifTool error: %s", result.stderr)
             return {}
 
         data = json.loads(result.stdout)
@@ -42,7 +53,7 @@ def get_metadata(file_path):
         return {}
 
     except Exception as e:
-        print(f"Metadata Extraction Failed: {e}")
+        log.warning("Metadata extraction failed: %s", e)
         return {}
 
 def parse_date(date_str):
@@ -82,13 +93,14 @@ def write_metadata(file_path, tags):
     cmd.append(file_path)
 
     try:
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        with metrics.EXIFTOOL.time(op='write'):
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
         if result.returncode != 0:
-            print(f"ExifTool Write Error: {result.stderr}")
+            log.error("ExifTool write error: %s", result.stderr)
             return False
         return True
     except Exception as e:
-        print(f"ExifTool Write Failed: {e}")
+        log.error("ExifTool write failed: %s", e)
         return False
 
 def extract_ai_info(metadata):
@@ -159,103 +171,68 @@ def extract_camera_info(metadata):
     # Filter out empty values
     return {k: v for k, v in info.items() if v}
 
-def extract_gps_info(metadata):
+def parse_coordinate(value, ref=None):
     """
-    Extracts GPS coordinates and returns decimal latitude and longitude.
-    Returns dictionary {'lat': float, 'lng': float} or None.
+    One GPS coordinate to signed decimal degrees.
+    Accepts numbers, decimal strings ("40.7128 N", "-74.006") and DMS strings
+    ("40 deg 42' 46.00\" N"). ref is the matching GPS*Ref tag ("South" / "W"...),
+    used when the value itself carries no hemisphere.
+    Returns float or None.
     """
-    if not metadata:
+    if value is None or value == '':
         return None
+    if isinstance(value, (int, float)):
+        dd = float(value)
+        text = ''
+    else:
+        text = str(value).strip().upper()
+        parts = re.findall(r"[-+]?\d+(?:\.\d+)?", text)
+        if not parts:
+            return None
+        numbers = [float(p) for p in parts[:3]]
+        dd = abs(numbers[0])
+        if len(numbers) > 1:
+            dd += numbers[1] / 60
+        if len(numbers) > 2:
+            dd += numbers[2] / 3600
+        if numbers[0] < 0:
+            dd = -dd
 
-    # ExifTool often returns "deg min sec" string or sometimes decimal if -n is used.
-    # We used default call, so it's likely strings like "40 deg 42' 46.00\" N"
-    # Or sometimes separate Reference fields.
-    
-    lat = metadata.get('GPSLatitude')
-    lng = metadata.get('GPSLongitude')
-    
-    if not lat or not lng:
-        return None
-        
-    # Helper to parse DMS string to decimal
-    def parse_dms(dms_str):
-        # Check if already float/int
-        if isinstance(dms_str, (int, float)):
-            return float(dms_str)
-            
-        # Regex or simple string manipulation
-        # Format often: "40 deg 42' 46.00\" N"
-        try:
-            dms_str = str(dms_str).strip()
-            parts = dms_str.replace("deg", "").replace("'", "").replace('"', "").split()
-            
-            # parts should be [deg, min, sec, Ref] or [deg, min, sec]
-            # But ExifTool output varies wildly based on OS/Version/Options.
-            # However, if we look at ExifTool docs, it says it parses standard EXIF.
-            # A more robust way with ExifTool relies on the fact that if we used -n (numerical), 
-            # we would get decimals. But we didn't use -n in get_metadata.
-            # 
-            # WAIT: If we change get_metadata to use -c "%.6f" (coord format), we get decimals!
-            # BUT that changes global behavior. 
-            # Let's see if we can just parse the string "40.1234 N" vs "40 deg..."
-            
-            # Simple heuristic: look for N/S/E/W at end
-            ref_mult = 1
-            if dms_str.upper().endswith("S") or dms_str.upper().endswith("W"):
-                ref_mult = -1
-            
-            dms_str = dms_str.upper().rstrip("NSEW").strip()
-            
-            if "DEG" in dms_str:
-                 # Parse DMS
-                 # This is complex to robustly parse all variants.
-                 pass
-            else:
-                 # Maybe it's "40.7128" (if already decimal in string)
-                 return float(dms_str) * ref_mult
-                 
-        except:
-            pass
-            
-        return None
+    hemisphere = text.rstrip()[-1:] if text.rstrip()[-1:] in ('N', 'S', 'E', 'W') else None
+    if hemisphere is None and ref:
+        hemisphere = str(ref).strip().upper()[:1]
+    if hemisphere in ('S', 'W') and dd > 0:
+        dd = -dd
+    return dd
 
-    # Since parsing DMS is annoying and fragile without a library,
-    # let's assume ExifTool *usually* gives a nice Composite string 
-    # OR lets convert safely.
-    # Actually, the easier path: The caller (routes.py) could re-query with -n if needed?
-    # NO, that's slow.
-    
-    # Better approach: string parsing "40 deg 42' 46.00\" N"
-    # Let's try to extract numbers.
+def extract_coordinates(metadata):
+    """
+    Returns: (lat, lng) as signed decimal degrees, or (None, None) if the metadata has
+    no usable GPS position (missing, unparsable, out of range or the 0,0 placeholder).
+    """
+    if not metadata:
+        return None, None
     try:
-        def dms_to_dd(dms_str):
-            import re
-            # Match: 40 deg 42' 46.00" N
-            # regex to find float-like numbers
-            parts = re.findall(r"[\d\.]+", dms_str)
-            if len(parts) >= 3:
-                d = float(parts[0])
-                m = float(parts[1])
-                s = float(parts[2])
-                dd = d + m/60 + s/3600
-                if 'S' in dms_str.upper() or 'W' in dms_str.upper():
-                    dd = -dd
-                return dd
-            elif len(parts) == 1:
-                # Just a number?
-                return float(parts[0])
-            return None
+        lat = parse_coordinate(metadata.get('GPSLatitude'), metadata.get('GPSLatitudeRef'))
+        lng = parse_coordinate(metadata.get('GPSLongitude'), metadata.get('GPSLongitudeRef'))
+    except (TypeError, ValueError) as e:
+        log.warning("GPS parse error: %s", e)
+        return None, None
+    if lat is None or lng is None:
+        return None, None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180) or (lat == 0 and lng == 0):
+        return None, None
+    return lat, lng
 
-        lat_dd = dms_to_dd(str(lat))
-        lng_dd = dms_to_dd(str(lng))
-        
-        if lat_dd is not None and lng_dd is not None:
-             return {'lat': lat_dd, 'lng': lng_dd}
-             
-    except Exception as e:
-        print(f"GPS Parse Error: {e}")
-        
-    return None
+def extract_gps_info(metadata):
+    """
+    Extracts GPS coordinates and returns decimal latitude and longitude.
+    Returns dictionary {'lat': float, 'lng': float} or None.
+    """
+    lat, lng = extract_coordinates(metadata)
+    if lat is None:
+        return None
+    return {'lat': lat, 'lng': lng}
 
 def extract_face_regions(metadata):
     """
@@ -315,7 +292,7 @@ def extract_face_regions(metadata):
             })
             
         except Exception as e:
-            print(f"Error parsing region: {e}")
+            log.warning("Error parsing region: %s", e)
             continue
             
     return faces
@@ -1,13 +1,28 @@
 import os
 import json
+import hashlib
 import subprocess
 import shutil
 from datetime import datetime
+from datetime import timedelta
 from typing import List, Dict, Optional
+from flask import current_app, has_app_context
+from app import db
+from app.models import Asset, MetadataBackup
+from app.services import backup_store, metrics
+from app.services.logs import get_logger
+
+log = get_logger(__name__)
 
 # Constants
 BACKUP_ROOT_NAME = ".metadata_history"
 EXIFTOOL_PATH = 'exiftool'
+# Backup references of snapshots kept in the segment store (legacy backups are file paths)
+STORE_REF_PREFIX = "store:"
+# A delta is only stored if it's smaller than this fraction of the full snapshot
+DELTA_MAX_RATIO = 0.5
+# Records rewritten per append during compaction
+COMPACT_BATCH = 500
 
 def get_backup_root(project_root: str = None) -> str:
     """
@@ -36,20 +51,59 @@ def get_timestamped_backup_dir(project_root: str = None) -> str:
         
     return daily_path
 
+def get_store(project_root: str = None) -> backup_store.SegmentStore:
+    """Returns the segment store living under the backup root."""
+    max_mb = current_app.config.get('BACKUP_SEGMENT_MAX_MB', 64) if has_app_context() else 64
+    root = os.path.join(get_backup_root(project_root), backup_store.SEGMENT_DIR_NAME)
+    return backup_store.SegmentStore(root, max_bytes=max_mb * 1024 * 1024)
+
+def snapshot_hash(entry: Dict) -> str:
+    """SHA256 of the canonical (sorted keys) JSON form of a metadata snapshot."""
+    canonical = json.dumps(entry, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def record_backups(records: List[Dict]) -> int:
+    """
+    Adds catalog rows for freshly written backups and commits.
+    records: [{'original_path', 'backup_path', 'created_at', 'content_hash'(, 'storage_ref')}]
+    No-op outside an app context (e.g. when used as a plain library).
+    """
+    if not records or not has_app_context():
+        return 0
+
+    paths = list({r['original_path'] for r in records})
+    asset_ids = {}
+    for i in range(0, len(paths), 500):
+        chunk = paths[i:i + 500]
+        for asset_id, file_path in db.session.query(Asset.id, Asset.file_path).filter(Asset.file_path.in_(chunk)):
+            asset_ids[file_path] = asset_id
+
+    for r in records:
+        db.session.add(MetadataBackup(asset_id=asset_ids.get(r['original_path']), **r))
+
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        log.error("Failed to catalog backups: %s", e)
+        return 0
+    return len(records)
+
 def create_backups(file_paths: List[str]) -> Dict[str, str]:
     """
     Batched Backup Creation.
     1. Runs ExifTool once for all provided files.
-    2. Writes individual JSON dumps to the history folder.
+    2. Appends the snapshots to the compressed segment store (see store_snapshots).
+    3. Records each one in the backup catalog (metadata_backups table).
     
-    Returns: Dict mapping {original_path: backup_path}
+    Returns: Dict mapping {original_path: backup reference}
     """
     if not file_paths:
         return {}
         
     # Check if exiftool exists
     if shutil.which(EXIFTOOL_PATH) is None:
-        print("Error: ExifTool not found in PATH")
+        log.error("ExifTool not found in PATH")
         return {}
 
     # 1. Run ExifTool in Batch
@@ -57,80 +111,169 @@ def create_backups(file_paths: List[str]) -> Dict[str, str]:
     # -a = Allow duplicates (get all tags)
     # -G1 = Group names (specific location)
     # -struct = Preserve structure of XMP (important for Regions)
-    cmd = [EXIFTOOL_PATH, '-j', '-a', '-G1', '-struct'] + file_paths
+    # -@ - = read the file list from stdin (thousands of paths would overflow the command line)
+    cmd = [EXIFTOOL_PATH, '-j', '-a', '-G1', '-struct', '-@', '-']
     
     try:
         # Increase buffer size limit if needed, though subprocess handles streams well.
         # Run command
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8', errors='replace')
+        with metrics.EXIFTOOL.time(op='backup'):
+            result = subprocess.run(cmd, input='\n'.join(file_paths) + '\n', stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                    text=True, encoding='utf-8', errors='replace')
         
         if result.returncode != 0:
-            print(f"ExifTool Batch Backup Error: {result.stderr}")
+            log.warning("ExifTool batch backup error: %s", result.stderr)
             # If batch fails (e.g. one file missing), we might get partial output or error.
             # ExifTool usually continues for valid files.
             
     except Exception as e:
-        print(f"ExifTool Execution Failed: {e}")
+        log.error("ExifTool execution failed: %s", e)
         return {}
 
     try:
         metadata_list = json.loads(result.stdout)
     except json.JSONDecodeError:
-        print("Failed to decode ExifTool JSON output")
+        log.error("Failed to decode ExifTool JSON output")
         return {}
 
-    # 2. Map Results to Files and Write Backups
-    backup_map = {}
-    backup_dir = get_timestamped_backup_dir()
-    
-    # ExifTool JSON is a list of dicts. Each dict has 'SourceFile'.
-    # Note: SourceFile uses forward slashes usually.
-    
+    # 2. Store snapshots (deduplicated / delta-encoded) and catalog them
+    return store_snapshots(metadata_list)
+
+def _encode(entry: Dict, content_hash: str, original_path: str, base) -> Dict:
+    """
+    Builds a store payload: a delta against base (content_hash, snapshot) when that's
+    small enough, otherwise a full snapshot (which can serve as a base later).
+    """
+    payload = {'h': content_hash, 'p': original_path}
+    if base and base[0] != content_hash:
+        delta = backup_store.encode_delta(base[1], entry)
+        if len(json.dumps(delta, ensure_ascii=False)) < DELTA_MAX_RATIO * len(json.dumps(entry, ensure_ascii=False)):
+            payload.update(k='d', b=base[0], **delta)
+            return payload
+    payload.update(k='f', d=entry)
+    return payload
+
+def _refs_for_hashes(hashes) -> Dict[str, str]:
+    """Returns {content_hash: storage_ref} for hashes already in the store."""
+    hashes = list(hashes)
+    refs = {}
+    for i in range(0, len(hashes), 500):
+        chunk = hashes[i:i + 500]
+        rows = db.session.query(MetadataBackup.content_hash, MetadataBackup.storage_ref).filter(
+            MetadataBackup.content_hash.in_(chunk), MetadataBackup.storage_ref.isnot(None))
+        for content_hash, ref in rows:
+            refs[content_hash] = ref
+    return refs
+
+def _latest_refs(paths) -> Dict[str, str]:
+    """Returns {original_path: storage_ref of its newest stored snapshot}."""
+    paths = list(paths)
+    latest = {}
+    for i in range(0, len(paths), 500):
+        chunk = paths[i:i + 500]
+        rows = db.session.query(MetadataBackup.original_path, MetadataBackup.storage_ref).filter(
+            MetadataBackup.original_path.in_(chunk), MetadataBackup.storage_ref.isnot(None)
+        ).order_by(MetadataBackup.created_at)
+        for path, ref in rows:
+            latest[path] = ref # Ascending order: last one wins
+    return latest
+
+def _keyframe(store, ref):
+    """
+    Returns (content_hash, snapshot) of the full snapshot a new delta should be encoded
+    against: the record at ref itself, or its base if it's a delta (chains stay 1 deep).
+    """
+    try:
+        payload = store.read(ref)
+        if payload.get('k') == 'f':
+            return payload['h'], payload['d']
+        base_ref = _refs_for_hashes([payload['b']]).get(payload['b'])
+        if base_ref:
+            base = store.read(base_ref)
+            return base['h'], base['d']
+    except Exception as e:
+        log.warning("Backup store: could not read base snapshot %s: %s", ref, e)
+    return None
+
+def store_snapshots(metadata_list: List[Dict]) -> Dict[str, str]:
+    """
+    Writes ExifTool JSON snapshots to the segment store and records them in the catalog.
+    - A snapshot identical to one already stored reuses that record (content-hash dedup).
+    - Otherwise it's stored as a delta against the file's latest keyframe when that's smaller.
+    Without an app context (no catalog) every snapshot is stored in full.
+
+    Returns: Dict mapping {original_path: backup reference}
+    """
+    entries = []
     for entry in metadata_list:
         source_file = entry.get('SourceFile')
         if not source_file:
             continue
-            
-        # Normalize path to match input list style (OS dependent)
         # ExifTool returns absolute path if input was absolute, or relative if relative.
-        # Ideally we match loosely or by cleaning paths.
-        
-        # Construct backup filename: "original_basename.timestamp.json" 
-        # Or better: "original_basename.v<timestamp>.json"
-        
-        # We need to map this back to the absolute path used in DB usually.
-        # Let's verify file existence locally to handle the write.
-        
-        # Handle path normalization for matching
-        # (This is tricky if ExifTool mangles path chars, but usually fine)
-        
-        base_name = os.path.basename(source_file)
-        # Append microsecond timestamp to ensure uniqueness if multiple backups happen same run/second
-        timestamp_suffix = datetime.now().strftime('%H%M%S_%f')
-        backup_filename = f"{base_name}.v{timestamp_suffix}.json"
-        backup_path = os.path.join(backup_dir, backup_filename)
-        
+        entries.append((os.path.abspath(source_file), snapshot_hash(entry), entry))
+
+    if not entries:
+        return {}
+
+    store = get_store()
+    backup_map = {}
+    catalog_records = []
+
+    # Held across lookup + append so compaction (possibly in another process) can't
+    # move the records we dedup against
+    with store.locked():
+        known, latest = {}, {}
+        if has_app_context():
+            known = _refs_for_hashes({h for _, h, _ in entries})
+            latest = _latest_refs({p for p, _, _ in entries})
+
+        payloads = []
+        pending = {} # content_hash -> index into payloads (dedup within this batch)
+        for abs_source, content_hash, entry in entries:
+            if content_hash in known or content_hash in pending:
+                continue
+            base = _keyframe(store, latest[abs_source]) if abs_source in latest else None
+            pending[content_hash] = len(payloads)
+            payloads.append(_encode(entry, content_hash, abs_source, base))
+
         try:
-            with open(backup_path, 'w', encoding='utf-8') as f:
-                json.dump(entry, f, indent=2, ensure_ascii=False)
-            
-            # Record success
-            # We want to key this by the input path provided, or the absolute path.
-            # Let's try to rectify source_file to absolute path
-            abs_source = os.path.abspath(source_file)
-            backup_map[abs_source] = backup_path
-            
+            refs = store.append_many(payloads)
         except OSError as e:
-            print(f"Failed to write backup file for {base_name}: {e}")
+            log.error("Failed to write metadata backups: %s", e)
+            return {}
+
+        for content_hash, index in pending.items():
+            known[content_hash] = refs[index]
+
+        for abs_source, content_hash, entry in entries:
+            # Keep the familiar "<name>.v<HHMMSS_micro>" naming so the history list reads the same
+            created_at = datetime.now()
+            base_name = os.path.basename(abs_source)
+            backup_ref = (f"{STORE_REF_PREFIX}{created_at.strftime('%Y/%m/%d')}/"
+                          f"{base_name}.{content_hash[:8]}.v{created_at.strftime('%H%M%S_%f')}")
+            backup_map[abs_source] = backup_ref
+            catalog_records.append({
+                'original_path': abs_source,
+                'backup_path': backup_ref,
+                'created_at': created_at,
+                'content_hash': content_hash,
+                'storage_ref': known[content_hash]
+            })
+
+        record_backups(catalog_records)
 
+    saved = len(entries) - len(payloads)
+    deltas = sum(1 for p in payloads if p['k'] == 'd')
+    log.debug("Backed up %d snapshots (%d written, %d as deltas, %d deduplicated).", len(entries), len(payloads), deltas, saved,
+              extra={'data': {'snapshots': len(entries), 'written': len(payloads), 'deltas': deltas, 'deduplicated': saved}})
     return backup_map
 
 def list_backups(file_path: str, project_root: str = None) -> List[str]:
     """
-    Finds all backups for a specific file.
-    Note: This is expensive as it crawls the history tree. 
-    Optimization: In Phase 2, we might index backups in SQLite.
-    For now, we just scan.
+    Finds all backups for a specific file by crawling the history tree (basename prefix match).
+    Note: This is expensive and can return false matches for files sharing a basename.
+    Only used when no app context is available; the app uses the indexed catalog
+    (see get_backup_info and index_existing_backups).
     """
     root = get_backup_root(project_root)
     if not os.path.exists(root):
@@ -150,68 +293,150 @@ def list_backups(file_path: str, project_root: str = None) -> List[str]:
                  
     return sorted(found_backups)
 
-def get_backup_info(file_path: str, project_root: str = None) -> List[Dict]:
+def parse_backup_timestamp(b_path: str) -> datetime:
     """
-    Returns a list of backup info dicts:
+    Recovers the backup time from its location: .../YYYY/MM/DD/file.ext.vHHMMSS_ffffff.json
+    Raises ValueError for files that don't follow the naming scheme.
+    """
+    fname = os.path.basename(b_path)
+    # Filename is safer than file mtime if we move things.
+    parts = fname.split('.v')
+    if len(parts) < 2:
+        raise ValueError("Not a backup filename")
+
+    time_part = parts[-1].replace('.json', '')
+    # time_part like 203205_025579 (HHMMSS_microseconds)
+
+    # Get date from path components
+    # Assuming standard structure: ... date_root / YYYY / MM / DD / file
+    # Day = -2, Month = -3, Year = -4 (since file is -1)
+    path_parts = os.path.normpath(b_path).split(os.sep)
+    day = path_parts[-2]
+    month = path_parts[-3]
+    year = path_parts[-4]
+
+    return datetime.strptime(f"{year}-{month}-{day} {time_part}", "%Y-%m-%d %H%M%S_%f")
+
+def _info_dict(b_path: str, timestamp: datetime) -> Dict:
+    return {
+        'timestamp': timestamp,
+        'pretty_time': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+        'path': b_path,
+        'filename': os.path.basename(b_path)
+    }
+
+def get_backup_info(file_path: str, project_root: str = None, asset_id: int = None) -> List[Dict]:
+    """
+    Returns a list of backup info dicts (newest first):
     [{
         'timestamp': datetime object, 
         'pretty_time': str,
         'path': absolute path,
         'filename': filename
     }]
+    Uses the backup catalog (indexed by asset and original path). If asset_id is given,
+    backups taken before the file was moved/renamed are included too.
     """
-    backups = list_backups(file_path, project_root)
-    result = []
-    
-    for b_path in backups:
-        # Parse timestamp from filename: file.ext.vHHMMSS_ffffff.json
-        # Parent directory is DD, parent of that is MM, parent of that is YYYY
-        try:
-            fname = os.path.basename(b_path)
-            # We can try to extract time from filename, or rely on file mtime?
-            # Filename is safer if we move things.
-            # Format: .v<HHMMSS_ffffff>.json
-            
-            parts = fname.split('.v')
-            if len(parts) < 2: 
+    if not has_app_context():
+        # Legacy fallback: crawl the history tree
+        result = []
+        for b_path in list_backups(file_path, project_root):
+            try:
+                result.append(_info_dict(b_path, parse_backup_timestamp(b_path)))
+            except Exception as e:
+                # Fallback for old/weird files
+                log.warning("Error parsing backup %s: %s", b_path, e)
+        result.sort(key=lambda x: x['timestamp'], reverse=True)
+        return result
+
+    condition = MetadataBackup.original_path == os.path.abspath(file_path)
+    if asset_id is not None:
+        condition = condition | (MetadataBackup.asset_id == asset_id)
+
+    rows = MetadataBackup.query.filter(condition).order_by(MetadataBackup.created_at.desc()).all()
+    return [_info_dict(r.backup_path, r.created_at) for r in rows]
+
+def index_existing_backups(project_root: str = None) -> int:
+    """
+    One-time importer: catalogs backup files written before the catalog existed.
+    The original path comes from the snapshot's own 'SourceFile', so files that merely
+    share a basename are no longer confused. Safe to re-run (already cataloged files are skipped).
+    Returns the number of backups added to the catalog.
+    """
+    root = get_backup_root(project_root)
+    if not os.path.exists(root):
+        return 0
+
+    known = {p for (p,) in db.session.query(MetadataBackup.backup_path)}
+    records = []
+    added = 0
+
+    for dirpath, _, filenames in os.walk(root):
+        for fname in filenames:
+            if not fname.endswith('.json'):
                 continue
-                
-            time_part = parts[-1].replace('.json', '')
-            # time_part like 203205_025579 (HHMMSS_microseconds)
-            
-            # Get date from path components
-            # path: .../YYYY/MM/DD/filename...
-            path_parts = os.path.normpath(b_path).split(os.sep)
-            # Assuming standard structure: ... date_root / YYYY / MM / DD / file
-            # Day = -2, Month = -3, Year = -4 (since file is -1)
-            day = path_parts[-2]
-            month = path_parts[-3]
-            year = path_parts[-4]
-            
-            # Construct datetime
-            dt_str = f"{year}-{month}-{day} {time_part}"
-            # time_part might need formatting
-            # 203205_025579 -> %H%M%S_%f
-            
-            full_dt = datetime.strptime(dt_str, "%Y-%m-%d %H%M%S_%f")
-            
-            result.append({
-                'timestamp': full_dt,
-                'pretty_time': full_dt.strftime('%Y-%m-%d %H:%M:%S'),
-                'path': b_path,
-                'filename': fname
+            b_path = os.path.join(dirpath, fname)
+            if b_path in known:
+                continue
+
+            try:
+                created_at = parse_backup_timestamp(b_path)
+                with open(b_path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+                source_file = entry.get('SourceFile')
+                if not source_file:
+                    continue
+            except Exception as e:
+                log.warning("Skipping unreadable backup %s: %s", b_path, e)
+                continue
+
+            records.append({
+                'original_path': os.path.abspath(source_file),
+                'backup_path': b_path,
+                'created_at': created_at,
+                'content_hash': snapshot_hash(entry)
             })
-        except Exception as e:
-            # Fallback for old/weird files
-            print(f"Error parsing backup {b_path}: {e}")
-            continue
-            
-    # Sort by timestamp descending (newest first)
-    result.sort(key=lambda x: x['timestamp'], reverse=True)
-    return result
+
+            if len(records) >= 500:
+                added += record_backups(records)
+                records = []
+
+    added += record_backups(records)
+    return added
+
+def load_snapshot(storage_ref: str, store: backup_store.SegmentStore = None) -> Dict:
+    """Reads a snapshot from the segment store, resolving deltas against their keyframe."""
+    store = store or get_store()
+    payload = store.read(storage_ref)
+    if payload.get('k') == 'f':
+        return payload['d']
+
+    base_ref = _refs_for_hashes([payload['b']]).get(payload['b'])
+    if not base_ref:
+        raise ValueError(f"Keyframe {payload['b'][:12]} missing for delta {storage_ref}")
+    base = store.read(base_ref)
+    return backup_store.apply_delta(base['d'], payload)
+
+def backup_exists(backup_path: str) -> bool:
+    """True if backup_path is a cataloged backup reference or a legacy backup file."""
+    if has_app_context() and MetadataBackup.query.filter_by(backup_path=backup_path).first():
+        return True
+    return not backup_path.startswith(STORE_REF_PREFIX) and os.path.exists(backup_path)
 
 def read_backup(backup_path: str) -> Optional[Dict]:
-    """Reads the JSON content of a backup file."""
+    """
+    Returns the snapshot dict for a backup reference (as listed by get_backup_info):
+    a 'store:' reference, or the path of a legacy JSON backup file.
+    """
+    if has_app_context():
+        row = MetadataBackup.query.filter_by(backup_path=backup_path).first()
+        if row and row.storage_ref:
+            try:
+                return load_snapshot(row.storage_ref)
+            except Exception as e:
+                log.warning("Error reading backup %s: %s", backup_path, e)
+                return None
+
     if not os.path.exists(backup_path):
         return None
         
@@ -219,5 +444,154 @@ def read_backup(backup_path: str) -> Optional[Dict]:
         with open(backup_path, 'r', encoding='utf-8') as f:
             return json.load(f)
     except Exception as e:
-        print(f"Error reading backup {backup_path}: {e}")
+        log.warning("Error reading backup %s: %s", backup_path, e)
         return None
+
+def compact_backups(keep_last: int = None, retention_days: int = None, project_root: str = None) -> Dict:
+    """
+    Retention + compaction job.
+    1. Retention: per file (asset), keeps the newest keep_last snapshots plus any newer
+       than retention_days; drops the rest from the catalog (and deletes legacy JSON files).
+    2. Migration: live legacy JSON backups are moved into the store.
+    3. Compaction: live records are rewritten into fresh segments (deltas whose keyframe
+       was dropped become full snapshots), then the old segments are deleted.
+
+    Holds the store lock (cross-process) throughout, so the web app's safety backups wait
+    instead of landing in a segment that is about to be deleted. Payloads are re-read and
+    written out COMPACT_BATCH at a time rather than held in memory.
+
+    Returns: Dict of counts {'dropped', 'kept', 'migrated', 'bytes_before', 'bytes_after'}
+    """
+    if keep_last is None:
+        keep_last = current_app.config.get('BACKUP_KEEP_LAST', 10)
+    if retention_days is None:
+        retention_days = current_app.config.get('BACKUP_RETENTION_DAYS')
+    cutoff = datetime.now() - timedelta(days=retention_days) if retention_days else None
+
+    store = get_store(project_root)
+    stats = {'dropped': 0, 'kept': 0, 'migrated': 0, 'bytes_before': 0, 'bytes_after': 0}
+
+    with store.locked():
+        # Every append takes the same lock, so these are sealed until we are done
+        old_segments = [name for _, name in store.segments()]
+        stats['bytes_before'] = store.size_on_disk()
+
+        # 1. Retention
+        groups = {}
+        old_refs = {} # content_hash -> current storage_ref (keyframes of dropped rows stay readable)
+        for row in MetadataBackup.query.order_by(MetadataBackup.created_at.desc()):
+            groups.setdefault(row.asset_id or row.original_path, []).append(row)
+            if row.storage_ref:
+                old_refs[row.content_hash] = row.storage_ref
+
+        kept = []
+        legacy_groups = set() # Groups with JSON files to migrate (they need their keyframe)
+        for group, rows in groups.items():
+            for rank, row in enumerate(rows):
+                if rank < keep_last or (cutoff and row.created_at >= cutoff):
+                    kept.append(row)
+                    if not row.storage_ref:
+                        legacy_groups.add(group)
+                    continue
+                if not row.storage_ref and os.path.exists(row.backup_path):
+                    try:
+                        os.remove(row.backup_path)
+                    except OSError as e:
+                        log.warning("Could not remove legacy backup %s: %s", row.backup_path, e)
+                db.session.delete(row)
+                stats['dropped'] += 1
+        stats['kept'] = len(kept)
+
+        # 2 + 3. First pass: which kept records are full snapshots (kind only, no payloads)
+        kinds = {} # storage_ref -> record kind
+        for row in kept:
+            if row.storage_ref and row.storage_ref not in kinds:
+                kinds[row.storage_ref] = store.read(row.storage_ref).get('k')
+        live_full = {row.content_hash for row in kept if row.storage_ref and kinds[row.storage_ref] == 'f'}
+
+        # Second pass: rewrite everything still referenced, a batch at a time
+        new_refs = {} # content_hash -> storage_ref in the new segments
+        new_segments = set()
+        batch = [] # payloads not appended yet
+        keyframes = {} # group key -> (content_hash, snapshot) for delta-encoding migrated files
+
+        def write_batch():
+            refs = store.append_many(batch, start_new=not new_segments)
+            for payload, ref in zip(batch, refs):
+                new_refs[payload['h']] = ref
+                new_segments.add(ref.split(':', 1)[0])
+            batch.clear()
+
+        written = set()
+        for row in sorted(kept, key=lambda r: r.created_at):
+            group = row.asset_id or row.original_path
+            if row.storage_ref:
+                if row.content_hash in written:
+                    continue
+                payload = store.read(row.storage_ref)
+                if payload.get('k') == 'd' and payload['b'] not in live_full:
+                    # Keyframe no longer referenced: materialize the full snapshot
+                    base = store.read(old_refs[payload['b']])
+                    entry = backup_store.apply_delta(base['d'], payload)
+                    payload = _encode(entry, payload['h'], payload['p'], None)
+                if payload['k'] == 'f' and group in legacy_groups:
+                    keyframes[group] = (payload['h'], payload['d'])
+            else:
+                # Legacy JSON file
+                try:
+                    with open(row.backup_path, 'r', encoding='utf-8') as f:
+                        entry = json.load(f)
+                except Exception as e:
+                    log.warning("Skipping unreadable legacy backup %s: %s", row.backup_path, e)
+                    continue
+                row.content_hash = row.content_hash or snapshot_hash(entry)
+                if row.content_hash in written or row.content_hash in live_full:
+                    continue
+                payload = _encode(entry, row.content_hash, row.original_path, keyframes.get(group))
+                if payload['k'] == 'f':
+                    keyframes[group] = (payload['h'], payload['d'])
+                    live_full.add(payload['h'])
+                stats['migrated'] += 1
+            written.add(row.content_hash)
+            batch.append(payload)
+            if len(batch) >= COMPACT_BATCH:
+                write_batch()
+        if batch:
+            write_batch()
+        keyframes.clear()
+
+        migrated_files = []
+        for row in kept:
+            ref = new_refs.get(row.content_hash)
+            if ref is None:
+                continue # Unreadable legacy file: left as is
+            if not row.storage_ref:
+                migrated_files.append(row.backup_path)
+            row.storage_ref = ref
+
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            log.error("Backup compaction failed, old segments kept: %s", e)
+            store.remove_segments(new_segments)
+            raise
+
+        # Last check before deleting: nothing in the catalog may still point into them
+        doomed = [n for n in old_segments if n not in new_segments]
+        still_used = {
+            name for name in doomed
+            if db.session.query(MetadataBackup.id).filter(MetadataBackup.storage_ref.like(f"{name}:%")).first()
+        }
+        if still_used:
+            log.warning("Keeping %d backup segment(s) still referenced by the catalog: %s",
+                        len(still_used), ', '.join(sorted(still_used)))
+        store.remove_segments(n for n in doomed if n not in still_used)
+        for path in migrated_files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        stats['bytes_after'] = store.size_on_disk()
+
+    return stats
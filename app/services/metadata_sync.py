@@ -0,0 +1,151 @@
+"""
+DB -> file metadata sync (/sync).
+
+Only assets flagged metadata_dirty (see models._track_metadata_changes) are written.
+Chunks of assets are written in parallel, each with one batched backup and grouped
+ExifTool runs (metadata_writer.write_metadata_batch). The dirty flags of a chunk are
+cleared as soon as it is written, so an interrupted sync simply resumes with whatever
+is still dirty.
+"""
+import concurrent.futures
+import os
+from flask import current_app
+from sqlalchemy import bindparam, func
+from sqlalchemy.orm import undefer
+from app import db
+from app.models import Asset, Face, Person
+from app.services import metadata_writer, metrics
+from app.services.logs import get_logger, Progress
+
+log = get_logger(__name__)
+
+def mark_all_dirty():
+    """Flags every asset for a full resync. Returns the number of assets."""
+    count = db.session.execute(
+        Asset.__table__.update().values(metadata_dirty=True,
+                                        metadata_version=func.coalesce(Asset.metadata_version, 0) + 1)
+    ).rowcount
+    db.session.commit()
+    return count
+
+def clear_dirty(session, versions, people_written=True):
+    """
+    Clears the dirty flags of assets whose file was just written, for
+    versions = [(asset_id, metadata_version read before the write)]. Assets edited since
+    (version moved on) stay dirty. Writes without the people list (people_written=False,
+    e.g. the asset page's save) leave assets whose people changed dirty. Caller commits.
+    Returns the number of assets cleared.
+    """
+    if not versions:
+        return 0
+    stmt = Asset.__table__.update().where(
+        Asset.id == bindparam('asset_id'),
+        func.coalesce(Asset.metadata_version, 0) == func.coalesce(bindparam('version'), 0)
+    )
+    if not people_written:
+        stmt = stmt.where(Asset.people_dirty.isnot(True))
+    return session.execute(stmt.values(metadata_dirty=False, people_dirty=False),
+                           [{'asset_id': asset_id, 'version': version} for asset_id, version in versions]).rowcount
+
+# Where a rating can be in meta_json: the clean key set by edits, then ExifTool's
+# (update_metadata replaces meta_json with the file's read-back)
+RATING_KEYS = ('rating', 'XMP:Rating', 'Rating')
+
+def build_changes(assets):
+    """
+    Returns {asset_id: changes dict for write_metadata_batch} for a chunk of assets.
+    Confirmed people are loaded for the whole chunk in one query (no per-asset face lookups).
+    The people list is only sent for assets with confirmed faces, or whose people changed
+    (people_dirty): an empty list clears the file's PersonInImage, which other tools may
+    have filled.
+    """
+    ids = [a.id for a in assets]
+    people = {}
+    rows = db.session.query(Face.asset_id, Person.name).join(Person, Face.person_id == Person.id).filter(
+        Face.asset_id.in_(ids), Face.is_confirmed == True
+    ).order_by(Person.name)
+    for asset_id, name in rows:
+        names = people.setdefault(asset_id, [])
+        if name not in names:
+            names.append(name)
+
+    changes = {}
+    for asset in assets:
+        tags = {}
+        if asset.id in people or asset.people_dirty:
+            tags['people'] = people.get(asset.id, [])
+        if asset.title:
+            tags['title'] = asset.title
+        meta = asset.meta_json or {}
+        rating = next((meta[key] for key in RATING_KEYS if meta.get(key) is not None), None)
+        if rating is not None:
+            tags['rating'] = rating
+        changes[asset.id] = tags
+    return changes
+
+def _write_chunk(app, changes):
+    """Worker: runs one batched write inside its own app context (own DB session for the backup catalog)."""
+    with app.app_context():
+        return metadata_writer.write_metadata_batch(changes)
+
+@metrics.job('sync')
+def sync_dirty_metadata(chunk_size=None, workers=None):
+    """
+    Writes every dirty asset's title / rating / people to its file.
+    Returns: (synced, failed)
+    """
+    app = current_app._get_current_object()
+    chunk_size = chunk_size or app.config.get('SYNC_CHUNK_SIZE', 100)
+    workers = workers or app.config.get('SYNC_WORKERS', os.cpu_count() or 4)
+
+    dirty_ids = [i for (i,) in db.session.query(Asset.id).filter(Asset.metadata_dirty == True).order_by(Asset.id)]
+    if not dirty_ids:
+        return 0, 0
+    log.info("Sync: %d assets with unsynced metadata (%d workers).", len(dirty_ids), workers)
+    progress = Progress(log, 'Sync', total=len(dirty_ids))
+
+    synced = 0
+    failed = 0
+    chunks = iter([dirty_ids[i:i + chunk_size] for i in range(0, len(dirty_ids), chunk_size)])
+    pending = {}
+
+    def submit_next(pool):
+        ids = next(chunks, None)
+        if ids is None:
+            return False
+        assets = Asset.query.options(undefer(Asset.meta_json)).filter(Asset.id.in_(ids)).all()
+        changes = build_changes(assets)
+        # Version seen now: the flag is only cleared if no edit happened during the write
+        versions = {a.file_path: (a.id, a.metadata_version) for a in assets}
+        paths = {a.file_path: changes[a.id] for a in assets}
+        pending[pool.submit(_write_chunk, app, paths)] = versions
+        return True
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='metadata-sync') as pool:
+        # Keep a bounded number of chunks in flight
+        for _ in range(workers * 2):
+            if not submit_next(pool):
+                break
+
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                versions = pending.pop(future)
+                try:
+                    results = future.result()
+                except Exception as e:
+                    log.error("Sync chunk failed: %s", e)
+                    results = {}
+
+                # Checkpoint: clear flags of this chunk's written files
+                cleared = [versions[p] for p, ok in results.items() if ok and p in versions]
+                if cleared:
+                    clear_dirty(db.session, cleared)
+                    db.session.commit()
+                synced += len(cleared)
+                failed += len(versions) - len(cleared)
+                progress.update(len(versions), written=len(cleared), failed=len(versions) - len(cleared))
+                submit_next(pool)
+
+    progress.finish()
+    return synced, failed
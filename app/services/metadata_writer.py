@@ -1,10 +1,15 @@
 
 import os
+import re
 import shutil
 import subprocess
 import json
-from typing import Dict, List, Optional, Union
-from app.services import metadata_backup
+from typing import Dict, List, Optional, Tuple, Union
+from app.services import metadata_backup, metrics
+from app.services.metadata import COORD_FORMAT_ARGS
+from app.services.logs import get_logger
+
+log = get_logger(__name__)
 
 # Constants
 EXIFTOOL_PATH = 'exiftool'
@@ -38,9 +43,9 @@ def get_target_file(file_path: str) -> str:
 def format_exiftool_args(metadata: Dict) -> List[str]:
     """
     Maps simple generic keys to ExifTool tag arguments.
-    Supported keys: 'rating', 'description', 'title', 'keywords', 'orientation'
+    Supported keys: 'rating', 'description', 'title', 'keywords', 'people'
     
-    TODO: Add complex Face Region support.
+    Face regions (XMP-mwg-rs RegionInfo) are exported by services/face_export.py.
     """
     args = []
     
@@ -82,9 +87,131 @@ def format_exiftool_args(metadata: Dict) -> List[str]:
         for tag in tags:
             args.append(f"-xmp-dc:Subject={tag}")
             args.append(f"-iptc:Keywords={tag}")
+
+    # 5. People (names of confirmed faces) -> IPTC Extension "Person Shown"
+    # Kept separate from keywords so syncing people never clobbers the user's tags.
+    if 'people' in metadata:
+        args.append("-xmp-iptcExt:PersonInImage=") # Clear existing
+        for name in metadata['people']:
+            args.append(f"-xmp-iptcExt:PersonInImage={name}")
             
     return args
 
+# Files per ExifTool invocation when writing a group with identical tag changes
+WRITE_CHUNK_SIZE = 500
+
+def _failed_targets(stderr: str, targets: List[str]) -> set:
+    """
+    Picks the files ExifTool reported errors for.
+    Error lines look like: "Error: <message> - <file>"
+    """
+    wanted = set(targets)
+    failed = set()
+    for line in stderr.splitlines():
+        if not line.startswith('Error') or ' - ' not in line:
+            continue
+        path = line.rsplit(' - ', 1)[1].strip()
+        if path in wanted:
+            failed.add(path)
+    return failed
+
+# ExifTool's closing summary, e.g. "    1 image files updated" / "0 image files unchanged"
+WRITE_SUMMARY_RE = re.compile(r'^\s*(\d+) (?:image )?files? (created|updated|unchanged)\b', re.MULTILINE)
+
+def _files_written(stdout: str) -> int:
+    """Number of files ExifTool reports as created, updated or unchanged (0 means nothing was written)."""
+    return sum(int(count) for count, _ in WRITE_SUMMARY_RE.findall(stdout))
+
+def run_exiftool_write(tag_args: List[str], targets: List[str], is_sidecar: bool) -> Dict[str, bool]:
+    """
+    One ExifTool process writing the same tag arguments to many targets.
+    (Targets must already be backed up.)
+    Returns: {target: success}
+    """
+    # -overwrite_original_in_place is best for embedded to preserve system creation attributes
+    # For sidecars (which we might be creating new), -overwrite_original is fine.
+    cmd = [EXIFTOOL_PATH, "-overwrite_original" if is_sidecar else "-overwrite_original_in_place"]
+    cmd.extend(tag_args)
+    cmd.extend(['-@', '-']) # Target list via stdin
+
+    try:
+        with metrics.EXIFTOOL.time(op='write'):
+            result = subprocess.run(cmd, input='\n'.join(targets) + '\n', stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                    text=True, encoding='utf-8', errors='replace')
+    except Exception as e:
+        log.error("Metadata write exception: %s", e)
+        return {t: False for t in targets}
+
+    if result.returncode == 0:
+        return {t: True for t in targets}
+
+    log.error("ExifTool write error: %s", result.stderr)
+    failed = _failed_targets(result.stderr, targets)
+    if not failed:
+        # Couldn't attribute the error to specific files: treat the whole run as failed
+        return {t: False for t in targets}
+    return {t: t not in failed for t in targets}
+
+def write_metadata_batch(changes: Dict[str, Dict]) -> Dict[str, bool]:
+    """
+    Writes metadata to many files (or their sidecars) safely.
+    changes: {file_path: metadata dict (same keys as write_metadata)}
+    
+    Steps:
+    1. One batched Safety Backup for all files (files without a backup are not written)
+    2. Group files by identical ExifTool tag arguments + target kind (embed vs sidecar)
+    3. One ExifTool invocation per group (chunked by WRITE_CHUNK_SIZE)
+    
+    Returns: Dict mapping {file_path: success}
+    """
+    results = {}
+    existing = []
+    for file_path in changes:
+        if os.path.exists(file_path):
+            existing.append(file_path)
+        else:
+            log.warning("File not found: %s", file_path)
+            results[file_path] = False
+
+    if not existing:
+        return results
+
+    # 1. Safety Backup
+    # We abort if backup fails to ensure we never write without safety net.
+    backups = metadata_backup.create_backups(existing)
+
+    # 2. Group by identical changes
+    groups = {}
+    for file_path in existing:
+        if os.path.abspath(file_path) not in backups:
+            log.warning("Aborting write: Backup failed for %s", file_path)
+            results[file_path] = False
+            continue
+
+        tag_args = format_exiftool_args(changes[file_path])
+        if not tag_args:
+            log.debug("No valid metadata keys provided for %s.", file_path)
+            results[file_path] = False
+            continue
+
+        target_file = get_target_file(file_path)
+        key = (tuple(tag_args), target_file != file_path)
+        groups.setdefault(key, []).append((file_path, target_file))
+
+    # 3. Execute
+    for (tag_args, is_sidecar), members in groups.items():
+        for i in range(0, len(members), WRITE_CHUNK_SIZE):
+            chunk = members[i:i + WRITE_CHUNK_SIZE]
+            written = run_exiftool_write(list(tag_args), [t for _, t in chunk], is_sidecar)
+            for file_path, target_file in chunk:
+                results[file_path] = written.get(target_file, False)
+
+    if len(changes) > 1:
+        ok = sum(1 for v in results.values() if v)
+        log.debug("Batch write: %d/%d files written in %d ExifTool run(s).", ok, len(changes),
+                  sum((len(m) + WRITE_CHUNK_SIZE - 1) // WRITE_CHUNK_SIZE for m in groups.values()))
+    return results
+
 def write_metadata(file_path: str, metadata: Dict) -> bool:
     """
     Writes metadata to the file (or its sidecar) safely.
@@ -93,58 +220,63 @@ def write_metadata(file_path: str, metadata: Dict) -> bool:
     1. Safety Backup (Time Machine)
     2. Determine Target (Embed vs Sidecar)
     3. Execute ExifTool
+    
+    Single-file form of write_metadata_batch.
+    """
+    return write_metadata_batch({file_path: metadata}).get(file_path, False)
+
+# Printed by ExifTool between the write and the read-back of write_metadata_and_read
+READ_BACK_MARKER = '=====ARCHIVEDB-READ-BACK====='
+
+def write_metadata_and_read(file_path: str, metadata: Dict) -> Tuple[bool, Dict]:
+    """
+    write_metadata + get_metadata in a single ExifTool process.
+    The write and the read-back run as two -execute commands of one invocation, so a save
+    from the asset page costs one launch for the (separate, must-succeed-first) backup and
+    one for write + re-read, instead of a third full launch to refresh meta_json.
+    
+    Returns: (success, metadata read back after the write, same shape as get_metadata;
+              {} if it couldn't be read)
     """
     if not os.path.exists(file_path):
-        print(f"Error: File not found {file_path}")
-        return False
-        
-    # 1. Safety Backup
-    # We abort if backup fails to ensure we never write without safety net.
-    # Note: create_backups returns a map. If empty, it might mean failure or no file.
+        log.warning("File not found: %s", file_path)
+        return False, {}
+
+    # 1. Safety Backup (still its own run: it must be stored before anything is written)
     backups = metadata_backup.create_backups([file_path])
-    if not backups:
-        print(f"Aborting write: Backup failed for {file_path}")
-        return False
-        
-    # 2. Determine Target
-    target_file = get_target_file(file_path)
-    is_sidecar = target_file != file_path
-    
-    # 3. Construct Command
-    cmd = [EXIFTOOL_PATH]
-    
-    # Flags
-    # -overwrite_original_in_place is best for embedded to preserve system creation attributes
-    # For sidecars, -overwrite_original is fine or default.
-    if not is_sidecar:
-        cmd.append("-overwrite_original_in_place")
-    else:
-        # If writing sidecar, we might be creating it new.
-        cmd.append("-overwrite_original")
-
-    # Add Tags
+    if os.path.abspath(file_path) not in backups:
+        log.warning("Aborting write: Backup failed for %s", file_path)
+        return False, {}
+
     tag_args = format_exiftool_args(metadata)
     if not tag_args:
-        print("No valid metadata keys provided.")
-        return False
-        
+        log.warning("No valid metadata keys provided.")
+        return False, {}
+
+    # 2. Write, then read back (same flags as metadata.get_metadata)
+    target_file = get_target_file(file_path)
+    is_sidecar = target_file != file_path
+    cmd = [EXIFTOOL_PATH, "-overwrite_original" if is_sidecar else "-overwrite_original_in_place"]
     cmd.extend(tag_args)
     cmd.append(target_file)
-    
-    # 4. Execute
+    cmd.extend(['-execute', '-echo', READ_BACK_MARKER, '-j', '-a', '-struct'] + COORD_FORMAT_ARGS + [file_path])
+
     try:
-        # Use simple run. 
-        # Note: subprocess arguments with special chars need care, but list arg is safe from shell injection usually.
-        # However, ExifTool parsing might need quote handling if not via shell.
-        # subprocess in list mode passes args directly to exec.
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8')
-        
-        if result.returncode != 0:
-            print(f"ExifTool Write Error: {result.stderr}")
-            return False
-            
-        return True
-        
+        with metrics.EXIFTOOL.time(op='write_read'):
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8', errors='replace')
     except Exception as e:
-        print(f"Metadata Write Exception: {e}")
-        return False
+        log.error("Metadata write exception: %s", e)
+        return False, {}
+
+    write_out, _, read_out = result.stdout.partition(READ_BACK_MARKER)
+    if _failed_targets(result.stderr, [target_file]) or _files_written(write_out) < 1:
+        log.error("ExifTool write error: %s", result.stderr)
+        return False, {}
+
+    try:
+        data = json.loads(read_out)
+        return True, (data[0] if data else {})
+    except (json.JSONDecodeError, IndexError):
+        log.warning("Failed to read metadata back after writing %s", file_path)
+        return True, {}
+
@@ -0,0 +1,209 @@
+"""
+Lightweight hot-path instrumentation.
+
+Histograms / counters for the expensive steps (hashing, ExifTool runs, DB commits,
+thumbnail encoding, face detection / encoding, face distances), rendered in the
+Prometheus text format at /metrics. Long-running jobs (scans, face processing,
+/sync, region export) record a per-job breakdown: how much time went into each step
+while the job ran (see job() and recent_jobs()).
+
+Off unless METRICS_ENABLED is set. When off, Histogram.time() returns a shared no-op
+context manager after a single flag check, so instrumented code pays next to nothing.
+"""
+import bisect
+import collections
+import contextlib
+import threading
+import time
+from datetime import datetime
+from app.services.logs import get_logger
+
+log = get_logger(__name__)
+
+enabled = False
+
+# Seconds; covers a 1ms hash up to a multi-minute ExifTool batch
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+_registry = []
+_recent_jobs = collections.deque(maxlen=20)
+
+def configure(app):
+    """Turns instrumentation on / off from app.config['METRICS_ENABLED']."""
+    global enabled
+    enabled = bool(app.config.get('METRICS_ENABLED'))
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = [(n, v) for n, v in zip(labelnames, key)]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{n}="{v}"' for (n, _), v in zip(pairs, escaped)) + '}'
+
+class Histogram:
+    """Distribution of durations (seconds), optionally split by labels."""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.series = {} # label key -> [per-bucket counts (+Inf last), sum, count]
+        _registry.append(self)
+
+    def time(self, **labels):
+        """Context manager observing the duration of its block (no-op while disabled)."""
+        if not enabled:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def observe(self, value, **labels):
+        if not enabled:
+            return
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def totals(self):
+        """{label key: (count, sum)}"""
+        with self.lock:
+            return {key: (s[2], s[1]) for key, s in self.series.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = {key: (list(s[0]), s[1], s[2]) for key, s in self.series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class Counter:
+    """Monotonic count, optionally split by labels."""
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        if not enabled or not amount:
+            return
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            values = dict(self.values)
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+# --- The instrumented hot paths ---
+
+HASH = Histogram('archivedb_hash_seconds', 'SHA-256 of one file.')
+EXIFTOOL = Histogram('archivedb_exiftool_seconds', 'One ExifTool process run (read, write, write_read, backup).', ('op',))
+DB_COMMIT = Histogram('archivedb_db_commit_seconds', 'Write transactions: scan bulk batches and write-queue commits.', ('kind',))
+THUMBNAIL = Histogram('archivedb_thumbnail_seconds', 'Thumbnail decode, resize and JPEG encode.')
+FACE = Histogram('archivedb_face_seconds', 'Face detection / encoding of one image.', ('stage',))
+FACE_DISTANCE = Histogram('archivedb_face_distance_seconds', 'Distances of one face against the known faces.')
+SCAN_FILES = Counter('archivedb_scan_files_total', 'Files handled by scans.', ('status',))
+JOBS = Histogram('archivedb_job_seconds', 'Wall time of long-running jobs.', ('job',))
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+def _histogram_totals():
+    return {(h.name, key): totals for h in _registry if h.kind == 'histogram' and h is not JOBS
+            for key, totals in h.totals().items()}
+
+@contextlib.contextmanager
+def job(name):
+    """
+    Records a per-job breakdown: the time each instrumented step took while the block
+    ran (steps of concurrent work are included too). Usable as decorator.
+    """
+    if not enabled:
+        yield
+        return
+    before = _histogram_totals()
+    started_at = datetime.now()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        JOBS.observe(elapsed, job=name)
+        steps = []
+        for (metric, key), (count, total) in _histogram_totals().items():
+            prev_count, prev_total = before.get((metric, key), (0, 0.0))
+            if count > prev_count:
+                labels = ', '.join(v for v in key if v)
+                steps.append({
+                    'step': metric.replace('archivedb_', '').replace('_seconds', '') + (f" ({labels})" if labels else ''),
+                    'count': count - prev_count,
+                    'seconds': round(total - prev_total, 3),
+                    'mean_ms': round((total - prev_total) / (count - prev_count) * 1000, 2),
+                })
+        steps.sort(key=lambda s: s['seconds'], reverse=True)
+        _recent_jobs.appendleft({'job': name, 'started_at': started_at, 'seconds': round(elapsed, 2), 'steps': steps})
+
+        log.info("Job '%s' took %.1fs:%s", name, elapsed,
+                 ''.join(f"\n    {s['step']}: {s['count']} x {s['mean_ms']} ms = {s['seconds']}s" for s in steps),
+                 extra={'data': {'job': name, 'seconds': round(elapsed, 2), 'steps': steps}})
+
+def recent_jobs():
+    """Newest first: [{'job', 'started_at', 'seconds', 'steps': [{'step', 'count', 'seconds', 'mean_ms'}]}]"""
+    return list(_recent_jobs)
@@ -0,0 +1,110 @@
+"""
+People-in-photo index (models.AssetPerson).
+
+asset_people holds one row per (asset, person) that has a face assigned, flagged
+confirmed if any of those faces is. SQLite triggers on faces recompute the affected
+(asset, person) pairs on every insert, delete and reassignment, so face runs, manual
+assignments, merges and bulk confirms all keep it current. Queries:
+- people_condition(): "photos with A and B" as indexed lookups, for grid filters
+- cooccurrence(): who appears in photos together with a person, and how often
+- person_gallery(): a person's photos, paged like any grid
+"""
+from sqlalchemy import and_, func, select, text
+from sqlalchemy.orm import aliased
+from app import db
+from app.database import ensure_triggers
+from app.models import Asset, AssetPerson, Person
+from app.services.grid import tile_query, paginate_tiles
+from app.services.logs import get_logger
+
+log = get_logger(__name__)
+
+def _refresh(row):
+    """Re-derive the asset_people row of {row}.asset_id / {row}.person_id (NULLs match nothing)."""
+    return (f"DELETE FROM asset_people WHERE asset_id = {row}.asset_id AND person_id = {row}.person_id; "
+            f"INSERT INTO asset_people (asset_id, person_id, confirmed) "
+            f"SELECT {row}.asset_id, {row}.person_id, max(coalesce(is_confirmed, 0)) FROM faces "
+            f"WHERE asset_id = {row}.asset_id AND person_id = {row}.person_id HAVING count(*) > 0;")
+
+TRIGGERS = {
+    'people_face_insert': f"""
+        CREATE TRIGGER people_face_insert AFTER INSERT ON faces
+        WHEN NEW.person_id IS NOT NULL
+        BEGIN {_refresh('NEW')} END""",
+    'people_face_delete': f"""
+        CREATE TRIGGER people_face_delete AFTER DELETE ON faces
+        WHEN OLD.person_id IS NOT NULL
+        BEGIN {_refresh('OLD')} END""",
+    'people_face_update': f"""
+        CREATE TRIGGER people_face_update AFTER UPDATE OF asset_id, person_id, is_confirmed ON faces
+        WHEN OLD.asset_id IS NOT NEW.asset_id OR OLD.person_id IS NOT NEW.person_id
+            OR OLD.is_confirmed IS NOT NEW.is_confirmed
+        BEGIN {_refresh('OLD')} {_refresh('NEW')} END""",
+    # Faces normally lose their asset_id first (ORM delete); this covers raw deletes
+    'people_asset_delete': """
+        CREATE TRIGGER people_asset_delete AFTER DELETE ON assets
+        BEGIN DELETE FROM asset_people WHERE asset_id = OLD.id; END""",
+    'people_person_delete': """
+        CREATE TRIGGER people_person_delete AFTER DELETE ON people
+        BEGIN DELETE FROM asset_people WHERE person_id = OLD.id; END""",
+}
+
+def rebuild_asset_people():
+    """Recomputes asset_people from the faces table. Returns the number of rows."""
+    with db.engine.begin() as conn:
+        conn.execute(text("DELETE FROM asset_people"))
+        conn.execute(text(
+            "INSERT INTO asset_people (asset_id, person_id, confirmed) "
+            "SELECT asset_id, person_id, max(coalesce(is_confirmed, 0)) FROM faces "
+            "WHERE asset_id IS NOT NULL AND person_id IS NOT NULL GROUP BY asset_id, person_id"
+        ))
+        rows = conn.execute(text("SELECT count(*) FROM asset_people")).scalar()
+    log.info("People index rebuilt: %d asset/person pairs.", rows)
+    return rows
+
+def install_people():
+    """
+    Creates the maintenance triggers if missing (run at startup after create_all).
+    A database that didn't have them yet gets the table backfilled once.
+    """
+    if ensure_triggers(TRIGGERS):
+        rebuild_asset_people()
+
+def people_condition(person_ids, confirmed_only=True):
+    """
+    Condition on Asset: the photo shows every one of person_ids. One index range of
+    ix_asset_people_person per person.
+    """
+    conditions = []
+    for person_id in person_ids:
+        subquery = select(AssetPerson.asset_id).where(AssetPerson.person_id == person_id)
+        if confirmed_only:
+            subquery = subquery.where(AssetPerson.confirmed.is_(True))
+        conditions.append(Asset.id.in_(subquery))
+    return and_(*conditions)
+
+def cooccurrence(session, person_id, limit=None):
+    """
+    People who appear in confirmed photos together with person_id.
+    Returns: List of (person_id, name, shared photo count), most shared first.
+    """
+    other = aliased(AssetPerson)
+    query = (
+        session.query(other.person_id, Person.name, func.count().label('shared'))
+        .select_from(AssetPerson)
+        .join(other, and_(other.asset_id == AssetPerson.asset_id, other.person_id != AssetPerson.person_id))
+        .join(Person, Person.id == other.person_id)
+        .filter(AssetPerson.person_id == person_id, AssetPerson.confirmed.is_(True), other.confirmed.is_(True))
+        .group_by(other.person_id, Person.name)
+        .order_by(func.count().desc(), Person.name)
+    )
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+def person_gallery(session, person_id, page, per_page):
+    """A person's confirmed photos, newest first. Returns: Pagination of AssetTiles."""
+    query = tile_query(session).join(AssetPerson, AssetPerson.asset_id == Asset.id).filter(
+        AssetPerson.person_id == person_id, AssetPerson.confirmed.is_(True)
+    ).order_by(Asset.captured_at.desc(), Asset.id.desc())
+    return paginate_tiles(query, page, per_page)
@@ -0,0 +1,114 @@
+"""
+Perceptual hashes of images, for near-duplicate search and burst grouping.
+
+Three 64-bit hashes, all computed from small grayscale grids of the image:
+- dHash: 9x8 grid; bit = "pixel brighter than its right neighbour" (gradients).
+- aHash: 8x8 grid; bit = "cell brighter than the image mean" (coarse layout).
+- pHash: 32x32 grid -> 2D DCT; bit = "low-frequency coefficient above their median".
+  The most robust of the three to re-encodes, resizes and brightness changes.
+Re-encodes, resizes and small edits keep most bits, so similar images are a small
+Hamming distance apart.
+
+The hashes are computed from the downscaled image during thumbnail generation
+(utils.generate_thumbnail), so they cost no extra decode. The backfill
+(run_duplicate_scan.py) reads the cached thumbnails with JPEG draft decoding and hashes
+them in batches: the grids are stacked into arrays and each hash is a few NumPy
+operations over the whole stack (the DCT is two matrix products on an (n, 32, 32) stack).
+
+Hashes are 64-bit. SQLite integers are signed, so they are stored as signed int64
+(to_signed) and converted back with to_unsigned before comparing.
+"""
+import numpy as np
+from PIL import Image
+
+HASH_BITS = 64
+HASH_NAMES = ('dhash', 'ahash', 'phash')
+_MASK = (1 << HASH_BITS) - 1
+
+# pHash: DCT of a DCT_SIZE grid, top-left LOW_FREQ x LOW_FREQ coefficients kept
+DCT_SIZE = 32
+LOW_FREQ = 8
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II matrix: coefficients = M @ x (and M @ X @ M.T in 2D)."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return m.astype(np.float32)
+
+# Only the low-frequency rows are needed: (8 x 32) @ (32 x 32) @ (32 x 8)
+_DCT_LOW = _dct_matrix(DCT_SIZE)[:LOW_FREQ]
+
+def to_signed(value):
+    """Unsigned 64-bit hash -> the signed int64 stored in SQLite."""
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+def to_unsigned(value):
+    """Stored signed int64 -> unsigned 64-bit hash."""
+    return value & _MASK
+
+def hamming(a, b):
+    """Number of differing bits between two hashes (signed or unsigned)."""
+    return ((a ^ b) & _MASK).bit_count()
+
+def grids(img):
+    """
+    The grayscale grids the hashes are computed from, for a PIL image (any mode / size).
+    Returns: (dhash grid 8x9, ahash grid 8x8, phash grid 32x32) uint8 arrays
+    """
+    gray = img.convert('L')
+    return (
+        np.asarray(gray.resize((9, 8), Image.Resampling.BILINEAR)),
+        np.asarray(gray.resize((8, 8), Image.Resampling.BOX)),
+        np.asarray(gray.resize((DCT_SIZE, DCT_SIZE), Image.Resampling.BILINEAR)),
+    )
+
+def grids_from_file(path):
+    """
+    grids() of an image file. JPEGs (the thumbnail cache) are decoded at reduced scale
+    (draft mode), which is several times faster than a full decode and plenty for 32x32.
+    """
+    with Image.open(path) as img:
+        img.draft('L', (DCT_SIZE * 2, DCT_SIZE * 2))
+        return grids(img)
+
+def _pack(bits):
+    """(n, 64) booleans -> (n,) signed int64 hashes, first bit = most significant."""
+    return np.packbits(bits, axis=1).view('>i8').ravel().astype(np.int64)
+
+def dhash_batch(stack):
+    """(n, 8, 9) grids -> (n,) dHashes."""
+    stack = np.asarray(stack, dtype=np.int16)
+    return _pack((stack[:, :, :-1] > stack[:, :, 1:]).reshape(len(stack), -1))
+
+def ahash_batch(stack):
+    """(n, 8, 8) grids -> (n,) aHashes."""
+    stack = np.asarray(stack, dtype=np.float32)
+    return _pack((stack > stack.mean(axis=(1, 2), keepdims=True)).reshape(len(stack), -1))
+
+def phash_batch(stack):
+    """(n, 32, 32) grids -> (n,) pHashes."""
+    stack = np.asarray(stack, dtype=np.float32)
+    low = (_DCT_LOW @ stack @ _DCT_LOW.T).reshape(len(stack), -1)
+    return _pack(low > np.median(low, axis=1, keepdims=True))
+
+def hash_batch(grid_list):
+    """
+    Hashes for many images at once.
+    grid_list: [grids(img), ...]
+    Returns: {'dhash': int64 array, 'ahash': ..., 'phash': ...} (same order as grid_list)
+    """
+    if not grid_list:
+        empty = np.array([], dtype=np.int64)
+        return {name: empty for name in HASH_NAMES}
+    d, a, p = zip(*grid_list)
+    return {'dhash': dhash_batch(np.stack(d)), 'ahash': ahash_batch(np.stack(a)), 'phash': phash_batch(np.stack(p))}
+
+def image_hashes(img):
+    """
+    All three hashes of one PIL image.
+    Returns: {'dhash': int, 'ahash': int, 'phash': int} (signed, ready to store on Asset)
+    """
+    hashes = hash_batch([grids(img)])
+    return {name: int(values[0]) for name, values in hashes.items()}
@@ -0,0 +1,227 @@
+"""
+Opt-in request profiling (PROFILE_REQUESTS=1).
+
+For every request: wall time, number of SQL statements and time spent in them
+(SQLAlchemy cursor events on all engines, so the read-only browsing session counts
+too). Statements are grouped by their SQL text, which makes N+1 patterns obvious:
+the same SELECT run once per face / asset shows up as one line with a big count.
+
+- Every response gets a Server-Timing header (visible in the browser dev tools).
+- Requests slower than PROFILE_SLOW_MS are logged with their most repeated
+  statements (the slow-request log) and kept for /api/profiling.
+- Per-route totals (requests, mean / max time, queries per request) at /api/profiling.
+- With PROFILER='cprofile' (or 'pyinstrument', if installed), slow requests and
+  requests with ?profile=1 also leave a profile in instance/profiles/
+  (.prof: open with `python -m pstats` or snakeviz; .html: pyinstrument report).
+
+DB work done on other threads (the write queue, scan workers) is not attributed to
+the request that queued it.
+"""
+import collections
+import cProfile
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.services.logs import get_logger
+
+try:
+    import pyinstrument
+    PYINSTRUMENT_AVAILABLE = True
+except ImportError:
+    PYINSTRUMENT_AVAILABLE = False
+
+log = get_logger(__name__)
+
+enabled = False
+
+# Statements listed per slow request
+TOP_STATEMENTS = 5
+
+_local = threading.local()
+_lock = threading.Lock()
+_routes = {} # endpoint -> RouteStats
+_slow_requests = collections.deque(maxlen=50)
+
+class RequestProfile:
+    """SQL activity of the request running on this thread."""
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.statements = collections.Counter() # normalized SQL -> executions
+        self.statement_seconds = collections.Counter()
+
+class RouteStats:
+    def __init__(self):
+        self.requests = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.queries = 0
+        self.max_queries = 0
+        self.sql_seconds = 0.0
+
+    def as_dict(self):
+        n = self.requests or 1
+        return {
+            'requests': self.requests,
+            'mean_ms': round(self.seconds / n * 1000, 2),
+            'max_ms': round(self.max_seconds * 1000, 2),
+            'queries_per_request': round(self.queries / n, 1),
+            'max_queries': self.max_queries,
+            'sql_ms_per_request': round(self.sql_seconds / n * 1000, 2),
+        }
+
+def _normalize(statement):
+    # Collapse whitespace and expanded IN (...) lists so repeats group together
+    statement = re.sub(r'\s+', ' ', statement).strip()
+    return re.sub(r'\((?:\?, )+\?\)', '(?, ...)', statement)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_local, 'profile', None) is not None:
+        conn.info.setdefault('profile_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = getattr(_local, 'profile', None)
+    started = conn.info.get('profile_started')
+    if profile is None or not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    key = _normalize(statement)
+    profile.queries += 1
+    profile.sql_seconds += elapsed
+    profile.statements[key] += 1
+    profile.statement_seconds[key] += elapsed
+
+def _start_profiler(kind):
+    """Returns a running profiler, or None (unknown kind, or another profiler is active)."""
+    try:
+        if kind == 'pyinstrument' and PYINSTRUMENT_AVAILABLE:
+            profiler = pyinstrument.Profiler()
+            profiler.start()
+        elif kind == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            return None
+        return profiler
+    except (ValueError, RuntimeError):
+        # Python 3.12+ allows one cProfile per process: concurrent requests go without
+        return None
+
+def _dump_profile(app, profiler, endpoint):
+    profile_dir = os.path.join(app.instance_path, 'profiles')
+    os.makedirs(profile_dir, exist_ok=True)
+    name = re.sub(r'[^\w.-]', '_', endpoint)
+    base = os.path.join(profile_dir, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{name}")
+    if isinstance(profiler, cProfile.Profile):
+        path = base + '.prof'
+        profiler.dump_stats(path)
+    else:
+        path = base + '.html'
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(profiler.output_html())
+    return path
+
+def _stop_profiler(profiler):
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+    else:
+        profiler.stop()
+
+def init_profiling(app):
+    """Installs the request hooks and SQL event listeners if PROFILE_REQUESTS is set."""
+    global enabled
+    enabled = bool(app.config.get('PROFILE_REQUESTS'))
+    if not enabled:
+        return
+
+    slow_seconds = app.config.get('PROFILE_SLOW_MS', 500) / 1000.0
+    profiler_kind = app.config.get('PROFILER')
+    if profiler_kind == 'pyinstrument' and not PYINSTRUMENT_AVAILABLE:
+        log.warning("PROFILER=pyinstrument but 'pyinstrument' is not installed. Request profiles disabled.")
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_request_profile():
+        _local.profile = RequestProfile()
+        g.profile_started = time.perf_counter()
+        g.profiler = _start_profiler(profiler_kind)
+
+    @app.after_request
+    def finish_request_profile(response):
+        profile = getattr(_local, 'profile', None)
+        if profile is None or 'profile_started' not in g:
+            return response
+        elapsed = time.perf_counter() - g.profile_started
+        endpoint = request.endpoint or request.path
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            _stop_profiler(profiler)
+
+        response.headers['Server-Timing'] = (
+            f'db;dur={profile.sql_seconds * 1000:.1f};desc="{profile.queries} queries", '
+            f'total;dur={elapsed * 1000:.1f}'
+        )
+
+        with _lock:
+            stats = _routes.setdefault(endpoint, RouteStats())
+            stats.requests += 1
+            stats.seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+            stats.queries += profile.queries
+            stats.max_queries = max(stats.max_queries, profile.queries)
+            stats.sql_seconds += profile.sql_seconds
+
+        forced = request.args.get('profile') == '1'
+        if elapsed >= slow_seconds or forced:
+            top = [{'count': n, 'ms': round(profile.statement_seconds[sql] * 1000, 2), 'sql': sql[:300]}
+                   for sql, n in profile.statements.most_common(TOP_STATEMENTS)]
+            entry = {
+                'time': datetime.now().isoformat(timespec='seconds'),
+                'method': request.method,
+                'path': request.full_path.rstrip('?'),
+                'endpoint': endpoint,
+                'status': response.status_code,
+                'ms': round(elapsed * 1000, 1),
+                'queries': profile.queries,
+                'sql_ms': round(profile.sql_seconds * 1000, 1),
+                'top_statements': top,
+                'profile': _dump_profile(app, profiler, endpoint) if profiler is not None else None,
+            }
+            with _lock:
+                _slow_requests.appendleft(entry)
+
+            lines = ''.join(f"\n    {s['count']}x {s['ms']} ms: {s['sql'][:160]}" for s in top)
+            if entry['profile']:
+                lines += f"\n    Profile: {entry['profile']}"
+            log.warning("Slow request: %s %s -> %s in %s ms, %s queries (%s ms SQL)%s", entry['method'], entry['path'],
+                        entry['status'], entry['ms'], entry['queries'], entry['sql_ms'], lines,
+                        extra={'rate_limit': False, 'data': {'slow_request': entry}})
+        return response
+
+    @app.teardown_request
+    def clear_request_profile(exc):
+        _local.profile = None
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            # after_request didn't run (unhandled exception)
+            _stop_profiler(profiler)
+
+    log.info("Request profiling enabled (slow requests >= %.0f ms%s).", slow_seconds * 1000,
+             f", profiler: {profiler_kind}" if profiler_kind else '')
+
+def report():
+    """Returns: {'routes': {endpoint: stats}, 'slow_requests': [...] (newest first)}"""
+    with _lock:
+        routes = {endpoint: stats.as_dict() for endpoint, stats in _routes.items()}
+        slow = list(_slow_requests)
+    routes = dict(sorted(routes.items(), key=lambda item: item[1]['mean_ms'] * item[1]['requests'], reverse=True))
+    return {'routes': routes, 'slow_requests': slow}
@@ -1,16 +1,28 @@
 import os
+import time
+import queue
 import hashlib
+import threading
+import concurrent.futures
+from flask import current_app
 from app import db
-from app.models import Asset
-from app.services.metadata import get_metadata, parse_date
-from datetime import datetime
+from app.models import Asset, ScanManifest, under_path
+from app.services.db_writer import AssetWriter
+from app.services.folders import rebuild_folders
+from app.database import get_write_queue
+from app.services import albums, metrics, semantic
+from app.services.logs import get_logger, Progress
+from app.services.metadata import get_metadata, parse_date, extract_coordinates
+from datetime import datetime, timedelta
+
+log = get_logger(__name__)
 
 ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp', '.pdf', '.txt', '.mp4', '.mov'}
 
 def get_file_hash(filepath):
     """Calculates SHA256 hash of a file."""
     sha256_hash = hashlib.sha256()
-    with open(filepath, "rb") as f:
+    with metrics.HASH.time(), open(filepath, "rb") as f:
         # Read and update hash string value in blocks of 4K
         for byte_block in iter(lambda: f.read(4096), b""):
             sha256_hash.update(byte_block)
@@ -20,118 +32,577 @@ def is_allowed_file(filename):
     ext = os.path.splitext(filename)[1].lower()
     return ext in ALLOWED_EXTENSIONS
 
-def scan_directory(library_path):
+def build_asset_row(full_path, f_hash, meta):
+    """Returns the column values for a new Asset as a plain dict (for bulk inserts)."""
+    file = os.path.basename(full_path)
+
+    # Try to find date
+    captured_date = None
+    if meta:
+        date_str = meta.get('DateTimeOriginal') or meta.get('CreateDate') or meta.get('MediaCreateDate')
+        captured_date = parse_date(date_str)
+    lat, lng = extract_coordinates(meta)
+
+    return {
+        'file_path': full_path,
+        'dir_path': os.path.dirname(full_path),
+        'file_hash': f_hash,
+        'media_type': os.path.splitext(file)[1].lower()[1:], # 'jpg', 'png'
+        'title': meta.get('Title') or file, # Use Title tag if available
+        'added_at': datetime.utcnow(),
+        'captured_at': captured_date,
+        'latitude': lat,
+        'longitude': lng,
+        'meta_json': meta
+    }
+
+def ingest_file(full_path, writer=None, known_paths=None):
     """
-    Walks the library_path, finds new files, initializes Assets.
-    Returns tuple: (added_count, skipped_count, error_count)
+    Ingests a single file into the session (no commit).
+    Handles the three cases the scanner cares about:
+    - Path already known -> 'skipped'
+    - Hash known under another path -> record is re-pointed (Self-Healing) -> 'moved'
+    - Otherwise a new Asset is added (to the bulk writer if given) -> 'added'
+    Used by the filesystem watcher; full scans go through scan_libraries().
+    known_paths: optional pre-fetched set of indexed paths, saves one SELECT per file.
+    Raises on I/O or metadata errors so callers can count them.
+    """
+    if known_paths is not None:
+        if full_path in known_paths:
+            return 'skipped'
+    else:
+        # Check if exists by path
+        # Use no_autoflush to prevent SQLAlchemy from trying to flush pending inserts 
+        # (from previous loop iterations) just to run this SELECT.
+        with db.session.no_autoflush:
+            existing_asset = Asset.query.filter_by(file_path=full_path).first()
+
+        if existing_asset:
+            return 'skipped'
+
+    # Calculate Hash to check for MOVED files (Self-Healing)
+    f_hash = get_file_hash(full_path)
+    meta = get_metadata(full_path)
+    return store_new_file(full_path, f_hash, meta, writer=writer)
+
+def store_new_file(full_path, f_hash, meta, writer=None):
+    """
+    Second half of ingest for a path that isn't indexed yet (hash and metadata already read).
+    Returns 'moved' if the hash matched an existing record (which is re-pointed), else 'added'.
     """
-    added = 0
-    skipped = 0
-    errors = 0
+    # Check if this hash exists under a different path
+    with db.session.no_autoflush:
+        moved_asset = Asset.query.filter_by(file_hash=f_hash).first()
+
+    if moved_asset:
+        # SELF-HEALING: Update the path of the existing record
+        log.debug("Move detected: %s -> %s", moved_asset.file_path, full_path)
+        moved_asset.file_path = full_path
+        # Let's assume the file on disk is the source of truth for metadata, 
+        # but the DB is source of truth for People/Faces.
+        # We keep the old ID, so People/Faces are preserved!
+        # Refresh metadata in case it changed during the move.
+        if meta:
+            moved_asset.meta_json = meta
+        return 'moved'
+
+    # If we get here, it's truly a NEW file
+    row = build_asset_row(full_path, f_hash, meta)
+    if writer is not None:
+        writer.add(row)
+    else:
+        db.session.add(Asset(**row))
+    return 'added'
+
+def refresh_file(full_path):
+    """
+    Re-reads hash and metadata for an already indexed file that changed on disk.
+    Falls back to ingest_file() if the path is unknown.
+    """
+    with db.session.no_autoflush:
+        asset = Asset.query.filter_by(file_path=full_path).first()
+
+    if not asset:
+        return ingest_file(full_path)
+
+    asset.file_hash = get_file_hash(full_path)
+    meta = get_metadata(full_path)
+    if meta:
+        asset.meta_json = meta
+        date_str = meta.get('DateTimeOriginal') or meta.get('CreateDate') or meta.get('MediaCreateDate')
+        asset.captured_at = parse_date(date_str) or asset.captured_at
+    return 'updated'
+
+def move_path(src_path, dest_path):
+    """
+    Applies a rename reported by the OS directly to the DB, without hashing.
+    Works for single files and for whole directories (every Asset under src_path is re-pointed).
+    Returns the number of Assets updated.
+    """
+    asset = Asset.query.filter_by(file_path=src_path).first()
+    if asset:
+        asset.file_path = dest_path
+        return 1
+
+    # Directory rename: re-point everything underneath it
+    src_prefix = src_path if src_path.endswith(os.path.sep) else src_path + os.path.sep
+    dest_prefix = dest_path if dest_path.endswith(os.path.sep) else dest_path + os.path.sep
+
+    moved = 0
+    for child in Asset.query.filter(under_path(Asset.file_path, src_path)).all():
+        child.file_path = dest_prefix + child.file_path[len(src_prefix):]
+        moved += 1
+    return moved
+
+def remove_path(path):
+    """
+    Removes Assets for a file (or every file under a directory) that no longer exists on disk.
+    Mirrors the 'Clean Missing Files' behaviour. Returns the number of Assets removed.
+    """
+    if os.path.exists(path):
+        return 0
+
+    doomed = Asset.query.filter(
+        (Asset.file_path == path) | under_path(Asset.file_path, path)
+    ).all()
 
-    print(f"Scanning {library_path}...")
+    for asset in doomed:
+        db.session.delete(asset)
+    return len(doomed)
+
+def _known_paths(paths):
+    """Returns the subset of paths already indexed, in chunks (SQLite variable limit)."""
+    known = set()
+    paths = list(paths)
+    for i in range(0, len(paths), 500):
+        chunk = paths[i:i + 500]
+        with db.session.no_autoflush:
+            rows = db.session.query(Asset.file_path).filter(Asset.file_path.in_(chunk)).all()
+        known.update(r[0] for r in rows)
+    return known
+
+def prepare_file(full_path):
+    """
+    The expensive, DB-free part of ingest: hash + ExifTool.
+    Safe to run on worker threads. Returns (full_path, f_hash, meta).
+    """
+    return full_path, get_file_hash(full_path), get_metadata(full_path)
+
+class ScanStats:
+    """Per-root counters, updated from walker, worker and writer threads."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.added = 0
+        self.skipped = 0
+        self.errors = 0
+        self.dirs_listed = 0
+        self.dirs_skipped = 0
+
+    def bump(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def as_tuple(self):
+        return self.added, self.skipped, self.errors
+
+class _DirJob:
+    """Tracks outstanding files of one listed directory; records the manifest row once all are done."""
+    def __init__(self, root, dir_path, mtime_ns, entry_count, subdirs, remaining, trustworthy, ops):
+        self.lock = threading.Lock()
+        self.root = root
+        self.dir_path = dir_path
+        self.mtime_ns = mtime_ns
+        self.entry_count = entry_count
+        self.subdirs = subdirs
+        self.remaining = remaining
+        self.failed = not trustworthy
+        self.ops = ops
+
+    def file_done(self, ok):
+        with self.lock:
+            self.remaining -= 1
+            if not ok:
+                self.failed = True
+            finished = self.remaining == 0
+        if finished:
+            self.finish()
+
+    def finish(self):
+        if self.failed:
+            self.ops.send(('forget', self.root, self.dir_path))
+        else:
+            self.ops.send(('manifest', self.root, self.dir_path, self.mtime_ns, self.entry_count, self.subdirs))
+
+def _device_of(path):
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return None
+
+class _OpQueue(queue.Queue):
+    """
+    Bounded walker / worker -> writer queue. send() waits for room only while the writer
+    job is alive: once it has ended (normally only after the final None), ops are dropped
+    instead of blocking the walkers forever, and scan_libraries raises the writer's error.
+    """
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        self.writer_job = None
+
+    def writer_gone(self):
+        return self.writer_job is not None and self.writer_job.done()
+
+    def send(self, op):
+        while not self.writer_gone():
+            try:
+                self.put(op, timeout=1.0)
+                return
+            except queue.Full:
+                pass
+
+class _ScanWriter:
+    """
+    The single DB writer shared by all roots; everything that writes to SQLite happens here.
+    It consumes ops until it receives None, on the app's WriteQueue, one commit window per
+    job: a window ends after max_txn_seconds or as soon as the ops queue runs dry (workers
+    busy hashing), commits, and queues the next one. Request-side writes never wait long
+    for the write lock, and other write-queue jobs (watcher batches, album refreshes,
+    thumbnail hashes) run between windows instead of after the whole scan.
+    """
+    def __init__(self, app, ops, stats, batch_size, max_txn_seconds=0.5):
+        self.write_queue = get_write_queue(app)
+        self.ops = ops
+        self.stats = stats
+        self.max_txn_seconds = max_txn_seconds
+        self.writer = AssetWriter(batch_size=batch_size)
+        self.progress = Progress(log, 'Scan')
+        self.manifest_ops = 0
+        self.job = concurrent.futures.Future() # Resolves to the AssetWriter once all ops are written
+
+    def start(self):
+        self._schedule()
+        return self.job
+
+    def _schedule(self):
+        self.write_queue.submit(self._window).add_done_callback(self._window_done)
+
+    def _window_done(self, future):
+        try:
+            if future.result():
+                self.job.set_result(self.writer)
+            else:
+                self._schedule()
+        except Exception as e:
+            self.job.set_exception(e)
+
+    def _window(self):
+        """One commit window. Returns True once the final None was consumed."""
+        writer = self.writer
+        started = None
+        while started is None or time.monotonic() - started <= self.max_txn_seconds:
+            try:
+                op = self.ops.get(timeout=0.1)
+            except queue.Empty:
+                # Workers are busy hashing: don't sit on the write lock (or the queue) meanwhile
+                break
 
-    if not os.path.exists(library_path):
-        print(f"Error: Path {library_path} does not exist.")
-        return 0, 0, 1
+            if op is None:
+                if not writer.flush():
+                    log.error("Final commit error.")
+                if self.progress.done:
+                    self.progress.finish()
+                return True
 
-    for root, dirs, files in os.walk(library_path):
-        # Skip hidden directories
-        dirs[:] = [d for d in dirs if not d.startswith('.')]
-        
-        for file in files:
-            if file.startswith('.'):
+            started = started or time.monotonic()
+            self._apply(op)
+
+        writer.flush()
+        return False
+
+    def _apply(self, op):
+        writer = self.writer
+        kind, root = op[0], op[1]
+        failures_before = writer.failures
+        try:
+            if kind == 'file':
+                full_path, f_hash, meta = op[2]
+                writer.track_dir(os.path.dirname(full_path))
+                status = store_new_file(full_path, f_hash, meta, writer=writer)
+                if status == 'added':
+                    self.stats[root].bump(added=1)
+                else:
+                    # Moves count as skipped to avoid confusion
+                    self.stats[root].bump(skipped=1)
+                self.progress.update(**{status: 1})
+
+            elif kind == 'manifest' and op[2] in writer.failed_dirs:
+                # Some of the directory's files were lost to a failed commit: don't trust
+                # it on the next scan
+                ScanManifest.query.filter_by(path=op[2]).delete()
+
+            elif kind == 'manifest':
+                _, _, dir_path, mtime_ns, entry_count, subdirs = op
+                record = ScanManifest.query.filter_by(path=dir_path).first()
+                if not record:
+                    record = ScanManifest(path=dir_path, library_path=root)
+                    db.session.add(record)
+                record.mtime_ns = mtime_ns
+                record.entry_count = entry_count
+                record.subdirs = subdirs
+                record.last_scanned = datetime.utcnow()
+                self.manifest_ops += 1
+                # Commit periodically on trees with many small directories
+                if self.manifest_ops % 50 == 0:
+                    writer.flush()
+
+            elif kind == 'forget':
+                ScanManifest.query.filter_by(path=op[2]).delete()
+
+            elif kind == 'finish':
+                _, _, visited, verified = op
+                # Make sure this root's rows are committed before judging it
+                writer.flush()
+                for record in ScanManifest.query.filter_by(library_path=root).all():
+                    if record.path not in visited:
+                        # Forget directories that no longer exist
+                        db.session.delete(record)
+                    elif verified and record.path == root and self.stats[root].errors == 0:
+                        record.last_verified = datetime.utcnow()
+                writer.flush()
+
+        except Exception as e:
+            writer.rolled_back()
+            log.error("Writer error on %s op: %s", kind, e)
+            self.stats[root].bump(errors=1)
+
+        if writer.failures != failures_before:
+            self.stats[root].bump(errors=1)
+
+def _walk_root(app, root, full, pool, slots, ops, stats):
+    """
+    Walker thread for one library root.
+    Lists changed directories (skipping unchanged ones per the scan manifest), filters out
+    already indexed paths with one query per directory, and hands new files to the
+    device's worker pool. Results flow to the writer through `ops`.
+    """
+    root_stats = stats[root]
+
+    with app.app_context():
+        manifest = {
+            m.path: (m.mtime_ns, m.subdirs, m.last_verified)
+            for m in ScanManifest.query.filter_by(library_path=root).all()
+        }
+
+        if full is None:
+            verify_days = app.config.get('SCAN_FULL_VERIFY_DAYS', 7)
+            last_verified = manifest.get(root, (None, None, None))[2]
+            full = last_verified is None or datetime.utcnow() - last_verified > timedelta(days=verify_days)
+
+        if full:
+            log.info("Full verification walk of %s (ignoring scan manifest).", root)
+
+        visited = set()
+        stack = [root]
+        walk_started = time.time()
+        # Files in flight plus one for the walk itself. Only a counter: holding the futures
+        # (with their hash and metadata) would grow with the size of the root. Whoever
+        # drops it to zero queues the root's 'finish' op, after every file / manifest op.
+        outstanding = [1]
+        outstanding_lock = threading.Lock()
+
+        def release():
+            with outstanding_lock:
+                outstanding[0] -= 1
+                last = outstanding[0] == 0
+            if last:
+                ops.send(('finish', root, visited, full))
+
+        def on_done(future, job):
+            slots.release()
+            try:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    log.warning("Error processing %s: %s", future.path, e)
+                    root_stats.bump(errors=1)
+                    job.file_done(False)
+                    return
+                # Queue the result before marking the file done, so the manifest op lands after it
+                ops.send(('file', root, result))
+                job.file_done(True)
+            finally:
+                release()
+
+        while stack:
+            if ops.writer_gone():
+                log.error("Scan of %s aborted: the DB writer stopped.", root)
+                break
+            dir_path = stack.pop()
+            visited.add(dir_path)
+            record = manifest.get(dir_path)
+
+            try:
+                dir_mtime_ns = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                # Directory vanished since last scan
                 continue
-                
-            if not is_allowed_file(file):
+
+            if not full and record and record[0] == dir_mtime_ns:
+                # Unchanged: no new/removed/renamed entries here. Descend via the remembered subdirectories.
+                root_stats.bump(dirs_skipped=1)
+                stack.extend(os.path.join(dir_path, d) for d in (record[1] or []))
                 continue
 
-            full_path = os.path.join(root, file)
-            
-            # Check if exists by path
-            # Use no_autoflush to prevent SQLAlchemy from trying to flush pending inserts 
-            # (from previous loop iterations) just to run this SELECT.
-            with db.session.no_autoflush:
-                existing_asset = Asset.query.filter_by(file_path=full_path).first()
-            
-            if existing_asset:
-                skipped += 1
+            try:
+                subdirs = []
+                files = []
+                with os.scandir(dir_path) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            # Skip hidden directories
+                            if not entry.name.startswith('.'):
+                                subdirs.append(entry.name)
+                        else:
+                            files.append(entry.name)
+            except OSError as e:
+                log.warning("Error listing %s: %s", dir_path, e)
+                root_stats.bump(errors=1)
                 continue
 
-            if existing_asset:
-                skipped += 1
+            root_stats.bump(dirs_listed=1)
+            stack.extend(os.path.join(dir_path, d) for d in subdirs)
+
+            candidates = [
+                os.path.join(dir_path, f) for f in files
+                if not f.startswith('.') and is_allowed_file(f)
+            ]
+            # One query per directory instead of one per file
+            known = _known_paths(candidates) if candidates else set()
+            new_files = [p for p in candidates if p not in known]
+            root_stats.bump(skipped=len(known))
+
+            # Only trust the directory once it scanned cleanly, and not if it was modified so recently
+            # that a coarse-mtime filesystem (FAT, SMB) could hide a change within the same tick.
+            trustworthy = walk_started - dir_mtime_ns / 1e9 > 2
+            job = _DirJob(root, dir_path, dir_mtime_ns, len(files) + len(subdirs), sorted(subdirs),
+                          len(new_files), trustworthy, ops)
+
+            if not new_files:
+                job.finish()
                 continue
 
-            # Calculate Hash to check for MOVED files (Self-Healing)
-            try:
-                f_hash = get_file_hash(full_path)
-                
-                # Check if this hash exists under a different path
-                with db.session.no_autoflush:
-                    moved_asset = Asset.query.filter_by(file_hash=f_hash).first()
-
-                if moved_asset:
-                    # SELF-HEALING: Update the path of the existing record
-                    print(f"Move Detected: {moved_asset.file_path} -> {full_path}")
-                    moved_asset.file_path = full_path
-                    # Optionally update metadata?
-                    # Let's assume the file on disk is the source of truth for metadata, 
-                    # but the DB is source of truth for People/Faces.
-                    # We keep the old ID, so People/Faces are preserved!
-                    # We might want to re-read metadata in case it changed during move?
-                    # Let's do a light metadata refresh.
-                    meta = get_metadata(full_path) 
-                    if meta:
-                        moved_asset.meta_json = meta
-                        
-                    skipped += 1 # Count as skipped (or maybe a new 'updated' category?)
-                    # Let's count as skipped for now to avoid confusion, or print it.
-                    continue
-
-                # If we get here, it's truly a NEW file
-                
-                # Metadata Extraction
-                meta = get_metadata(full_path)
-                
-                # Try to find date
-                captured_date = None
-                if meta:
-                    date_str = meta.get('DateTimeOriginal') or meta.get('CreateDate') or meta.get('MediaCreateDate')
-                    captured_date = parse_date(date_str)
-
-                new_asset = Asset(
-                    file_path=full_path,
-                    file_hash=f_hash,
-                    media_type=os.path.splitext(file)[1].lower()[1:], # 'jpg', 'png'
-                    title=meta.get('Title') or file, # Use Title tag if available
-                    added_at=datetime.utcnow(),
-                    captured_at=captured_date,
-                    meta_json=meta
-                )
-                db.session.add(new_asset)
-                added += 1
-                
-                # Commit every 100 items to avoid huge transactions
-                if added % 100 == 0:
-                    try:
-                        db.session.commit()
-                        print(f"Committed {added} assets...")
-                    except Exception as e:
-                        db.session.rollback()
-                        print(f"Commit error: {e}")
-                        errors += 1
-
-            except Exception as e:
-                print(f"Error processing {full_path}: {e}")
-                # Don't increment errors for just processing errors if we want to continue?
-                # But here we do.
-                errors += 1
+            for full_path in new_files:
+                slots.acquire() # Back-pressure: bounded in-flight work per device
+                with outstanding_lock:
+                    outstanding[0] += 1
+                future = pool.submit(prepare_file, full_path)
+                future.path = full_path
+                future.add_done_callback(lambda f, job=job: on_done(f, job))
 
-    try:
-        db.session.commit()
-    except Exception as e:
-        db.session.rollback()
-        print(f"Final commit error: {e}")
+        # Walk done; the writer finalizes the manifest once the last file is in
+        release()
+
+@metrics.job('scan')
+def scan_libraries(library_paths, full=None):
+    """
+    Scans several library roots concurrently.
+
+    - One walker thread per root.
+    - One hashing/ExifTool worker pool per physical device (grouped by st_dev), limited to
+      SCAN_WORKERS_PER_DEVICE so two roots on the same spinning disk don't thrash it.
+    - One shared DB writer (SQLite allows a single writer anyway), run in short commit
+      windows on the app's write queue so other write jobs are not held up by the scan.
+    Total wall time approaches that of the slowest device rather than the sum of all.
+
+    Returns dict: {library_path: (added_count, skipped_count, error_count)}
+    """
+    app = current_app._get_current_object()
+    stats = {root: ScanStats() for root in library_paths}
+    results = {}
+
+    roots = []
+    for root in library_paths:
+        log.info("Scanning %s...", root)
+        if not os.path.exists(root):
+            log.error("Path %s does not exist.", root)
+            stats[root].bump(errors=1)
+        else:
+            roots.append(root)
+
+    if not roots:
+        return {root: s.as_tuple() for root, s in stats.items()}
+
+    workers = app.config.get('SCAN_WORKERS_PER_DEVICE', 4)
+    ops = _OpQueue(maxsize=10000)
+    started = time.time()
+
+    # Group roots by device: each device gets one pool and one in-flight budget
+    devices = {}
+    for root in roots:
+        devices.setdefault(_device_of(root), []).append(root)
+
+    # The DB writer runs on the app-wide write queue, one commit window per job
+    writer_job = ops.writer_job = _ScanWriter(app, ops, stats, app.config.get('SCAN_WRITE_BATCH', 1000)).start()
+
+    pools = []
+    walkers = []
+    for dev, dev_roots in devices.items():
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"scan-dev{dev}")
+        slots = threading.Semaphore(workers * 8)
+        pools.append(pool)
+        for root in dev_roots:
+            t = threading.Thread(target=_walk_root, args=(app, root, full, pool, slots, ops, stats),
+                                 name=f"scan-walk-{os.path.basename(root) or root}", daemon=True)
+            t.start()
+            walkers.append(t)
 
-    print(f"Scan complete. Added: {added}, Skipped: {skipped}, Errors: {errors}")
-    return added, skipped, errors
+    for t in walkers:
+        t.join()
+    for pool in pools:
+        pool.shutdown(wait=True)
+
+    ops.send(None)
+    writer = writer_job.result() # Raises if the writer died
+
+    # Refresh the precomputed folder tree of the scanned roots (also a write-queue job)
+    get_write_queue(app).run(rebuild_folders, roots)
+    # Smart albums: re-evaluate only the assets this scan inserted or changed
+    get_write_queue(app).run(albums.refresh_pending)
+
+    # The writer used its own session; make sure ours sees the new rows
+    db.session.expire_all()
+
+    elapsed = time.time() - started
+    for root in library_paths:
+        st = stats[root]
+        log.info("Scan complete for %s. Added: %d, Skipped: %d, Errors: %d (Directories listed: %d, unchanged: %d)",
+                 root, st.added, st.skipped, st.errors, st.dirs_listed, st.dirs_skipped,
+                 extra={'data': {'root': root, 'added': st.added, 'skipped': st.skipped, 'errors': st.errors,
+                                 'dirs_listed': st.dirs_listed, 'dirs_unchanged': st.dirs_skipped}})
+        results[root] = st.as_tuple()
+        metrics.SCAN_FILES.inc(st.added, status='added')
+        metrics.SCAN_FILES.inc(st.skipped, status='skipped')
+        metrics.SCAN_FILES.inc(st.errors, status='error')
+
+    log.info("Scanned %d root(s) on %d device(s) in %.1fs; DB writes: %d rows at %.0f rows/sec",
+             len(roots), len(devices), elapsed, writer.rows_written, writer.rows_per_second)
+
+    # Embed the new images for semantic search in the background (no-op unless configured)
+    if any(stats[root].added for root in roots):
+        semantic.schedule_indexing(app)
+    return results
+
+def scan_directory(library_path, full=None):
+    """
+    Walks the library_path, finds new files, initializes Assets.
+
+    Incremental: a directory whose mtime is unchanged since the last successful scan
+    (per ScanManifest) is not listed again; we only stat its known subdirectories.
+    Adding, removing or renaming an entry always bumps the parent directory's mtime,
+    so new files are never missed. Pass full=True to force a complete walk; by default
+    one happens every SCAN_FULL_VERIFY_DAYS.
+
+    Returns tuple: (added_count, skipped_count, error_count)
+    """
+    return scan_libraries([library_path], full=full)[library_path]
@@ -0,0 +1,428 @@
+"""
+Semantic image search ("The Discovery Layer" in ROADMAP.md).
+
+Natural-language queries ("dad fixing the car") are matched against CLIP image
+embeddings instead of metadata text.
+
+- Embedding stage: index_missing() embeds images that have no embedding for the current
+  model yet, SEMANTIC_BATCH_SIZE at a time, on the CPU, from the cached 300px thumbnails
+  (missing thumbnails are generated). It runs in the background after a scan or a
+  watcher batch that added files, or as a batch job (run_semantic_index.py).
+- Storage: embeddings are L2-normalized and kept as float16 in one append-only matrix
+  file per model (instance/semantic/<model>.f16, rows x dim). The semantic_index table
+  (models.SemanticIndex) maps asset -> row; appends and their rows are recorded under a
+  file lock (<model>.f16.lock), so the app and run_semantic_index.py can embed at the
+  same time. A trigger drops the rows of deleted assets. The matrix is memory-mapped for queries,
+  so the OS page cache holds it and it is shared by every process; 500k x 512 float16 is
+  about 500 MB.
+- Query: the text embedding is scored against the matrix block by block (float32 matmul
+  on BLOCK_ROWS rows at a time, so memory stays bounded; blocks run on a thread pool),
+  each block keeps its top k with argpartition, and the survivors are merged. Cosine similarity = dot product, as both
+  sides are normalized.
+
+Models (SEMANTIC_MODEL, all optional dependencies):
+- 'onnx': ONNX Runtime with an exported CLIP image / text model pair and its tokenizer
+  (SEMANTIC_ONNX_DIR with image.onnx, text.onnx and tokenizer.json; needs
+  `onnxruntime` and `tokenizers`).
+- 'open_clip': PyTorch on the CPU via `open_clip` (SEMANTIC_CLIP_MODEL /
+  SEMANTIC_CLIP_PRETRAINED; weights are downloaded on first use).
+- 'stand-in': a tiny deterministic model without dependencies (a random projection of
+  colour layout / hashed words). It finds nothing meaningful; it exists so the pipeline
+  can be tested and benchmarked without downloading a model.
+"""
+import concurrent.futures
+import os
+import re
+import threading
+import zlib
+from datetime import datetime
+import numpy as np
+from PIL import Image
+from sqlalchemy import func, or_, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app import db
+from app.database import ensure_triggers, get_write_queue, read_session
+from app.models import Asset, SemanticIndex
+from app.services.backup_store import file_lock
+from app.services.duplicates import IMAGE_TYPES
+from app.services.logs import get_logger, Progress
+from app.utils import generate_thumbnail, get_thumbnail_path
+
+try:
+    import onnxruntime
+    from tokenizers import Tokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+try:
+    import torch
+    import open_clip
+    OPEN_CLIP_AVAILABLE = True
+except ImportError:
+    OPEN_CLIP_AVAILABLE = False
+
+log = get_logger(__name__)
+
+# Matrix rows scored per step. The float16 -> float32 conversion dominates the query
+# time; blocks that fit in the CPU cache (2048 x 512 x 4 bytes = 4 MB) convert fastest.
+BLOCK_ROWS = 2048
+
+# CLIP image normalization (OpenAI / LAION models)
+CLIP_MEAN = np.array([0.48145466, 0.4578275, 0.40821073], dtype=np.float32)
+CLIP_STD = np.array([0.26862954, 0.26130258, 0.27577711], dtype=np.float32)
+CONTEXT_LENGTH = 77
+
+_model = None
+_model_lock = threading.Lock()
+_index = None
+_index_lock = threading.Lock()
+_indexing = threading.Lock() # One background embedding run per process
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def preprocess(images, size=224):
+    """
+    CLIP preprocessing for a batch of PIL images: shortest side -> size (bicubic),
+    centre crop, scale to [0, 1] and normalize.
+    Returns: (n, 3, size, size) float32
+    """
+    batch = np.empty((len(images), 3, size, size), dtype=np.float32)
+    for i, img in enumerate(images):
+        img = img.convert('RGB')
+        scale = size / min(img.size)
+        w, h = max(size, round(img.width * scale)), max(size, round(img.height * scale))
+        img = img.resize((w, h), Image.Resampling.BICUBIC)
+        left, top = (w - size) // 2, (h - size) // 2
+        img = img.crop((left, top, left + size, top + size))
+        batch[i] = np.asarray(img, dtype=np.float32).transpose(2, 0, 1) / 255.0
+    return (batch - CLIP_MEAN[None, :, None, None]) / CLIP_STD[None, :, None, None]
+
+class OnnxClipModel:
+    """CLIP image / text encoders exported to ONNX, run with ONNX Runtime on the CPU."""
+    def __init__(self, model_dir, threads=None):
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        providers = ['CPUExecutionProvider']
+        self.image_session = onnxruntime.InferenceSession(os.path.join(model_dir, 'image.onnx'), options, providers=providers)
+        self.text_session = onnxruntime.InferenceSession(os.path.join(model_dir, 'text.onnx'), options, providers=providers)
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(CONTEXT_LENGTH)
+        self.tokenizer.enable_padding(length=CONTEXT_LENGTH)
+        image_input = self.image_session.get_inputs()[0]
+        self.image_size = image_input.shape[-1] if isinstance(image_input.shape[-1], int) else 224
+        self.dim = self.image_session.get_outputs()[0].shape[-1]
+        self.key = f"onnx-{os.path.basename(os.path.normpath(model_dir))}"
+
+    def embed_images(self, images):
+        pixels = preprocess(images, self.image_size)
+        name = self.image_session.get_inputs()[0].name
+        return _normalize(self.image_session.run(None, {name: pixels})[0])
+
+    def embed_text(self, texts):
+        encodings = self.tokenizer.encode_batch(list(texts))
+        ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {i.name: (mask if 'mask' in i.name else ids) for i in self.text_session.get_inputs()}
+        return _normalize(self.text_session.run(None, feed)[0])
+
+class OpenClipModel:
+    """CLIP via open_clip (PyTorch, CPU)."""
+    def __init__(self, name, pretrained, threads=None):
+        if threads:
+            torch.set_num_threads(threads)
+        self.model, _, _ = open_clip.create_model_and_transforms(name, pretrained=pretrained, device='cpu')
+        self.model.eval()
+        self.tokenizer = open_clip.get_tokenizer(name)
+        size = self.model.visual.image_size
+        self.image_size = size[0] if isinstance(size, (tuple, list)) else size
+        with torch.no_grad():
+            self.dim = int(self.model.encode_text(self.tokenizer(['a photo'])).shape[-1])
+        self.key = f"open_clip-{name}-{pretrained}"
+
+    def embed_images(self, images):
+        with torch.no_grad():
+            features = self.model.encode_image(torch.from_numpy(preprocess(images, self.image_size)))
+        return _normalize(features.numpy())
+
+    def embed_text(self, texts):
+        with torch.no_grad():
+            features = self.model.encode_text(self.tokenizer(list(texts)))
+        return _normalize(features.numpy())
+
+class StandInModel:
+    """
+    Dependency-free stand-in with the same interface: images -> fixed random projection
+    of an 8x8 colour thumbnail, text -> sum of per-word random vectors. For tests and
+    benchmarks only.
+    """
+    def __init__(self, dim=64):
+        self.dim = dim
+        self.key = f"stand-in-{dim}"
+        self.projection = np.random.default_rng(0).standard_normal((8 * 8 * 3, dim)).astype(np.float32)
+
+    def embed_images(self, images):
+        pixels = np.stack([np.asarray(img.convert('RGB').resize((8, 8), Image.Resampling.BOX), dtype=np.float32).ravel()
+                           for img in images]) / 255.0
+        return _normalize((pixels - 0.5) @ self.projection)
+
+    def embed_text(self, texts):
+        vectors = []
+        for text in texts:
+            v = np.zeros(self.dim, dtype=np.float32)
+            for word in re.findall(r'\w+', text.lower()):
+                v += np.random.default_rng(zlib.crc32(word.encode())).standard_normal(self.dim).astype(np.float32)
+            vectors.append(v)
+        return _normalize(np.stack(vectors))
+
+def _load_model(config):
+    kind = config.get('SEMANTIC_MODEL')
+    threads = config.get('SEMANTIC_THREADS')
+    if kind == 'onnx':
+        if not ONNX_AVAILABLE:
+            log.warning("SEMANTIC_MODEL=onnx but 'onnxruntime' / 'tokenizers' are not installed. Semantic search disabled.")
+            return None
+        return OnnxClipModel(config.get('SEMANTIC_ONNX_DIR'), threads)
+    if kind == 'open_clip':
+        if not OPEN_CLIP_AVAILABLE:
+            log.warning("SEMANTIC_MODEL=open_clip but 'open_clip' / 'torch' are not installed. Semantic search disabled.")
+            return None
+        return OpenClipModel(config.get('SEMANTIC_CLIP_MODEL', 'ViT-B-32'),
+                             config.get('SEMANTIC_CLIP_PRETRAINED', 'laion2b_s34b_b79k'), threads)
+    if kind == 'stand-in':
+        return StandInModel()
+    log.warning("Unknown SEMANTIC_MODEL %r. Semantic search disabled.", kind)
+    return None
+
+def get_model(app):
+    """The configured embedding model (loaded once per process), or None if disabled / unavailable."""
+    global _model
+    if not app.config.get('SEMANTIC_MODEL'):
+        return None
+    with _model_lock:
+        if _model is None:
+            try:
+                _model = _load_model(app.config) or False
+                if _model:
+                    log.info("Semantic model loaded: %s (%d dimensions).", _model.key, _model.dim)
+            except Exception as e:
+                log.error("Could not load semantic model %s: %s", app.config.get('SEMANTIC_MODEL'), e)
+                _model = False
+        return _model or None
+
+def _matrix_path(app, model):
+    directory = app.config.get('SEMANTIC_INDEX_DIR') or os.path.join(app.instance_path, 'semantic')
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, re.sub(r'[^\w.-]', '_', model.key) + '.f16')
+
+def append_vectors(path, vectors):
+    """
+    Appends float16 rows to a matrix file. The caller holds file_lock(path + '.lock')
+    until the rows are recorded, as the row numbers come from the file size.
+    Returns: index of the first appended row
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float16)
+    row_bytes = vectors.shape[1] * 2
+    with open(path, 'ab') as f:
+        # An interrupted earlier append may have left a partial row: drop it
+        size = f.seek(0, os.SEEK_END)
+        if size % row_bytes:
+            f.truncate(size - size % row_bytes)
+        start = f.seek(0, os.SEEK_END) // row_bytes
+        f.write(vectors.tobytes())
+    return start
+
+class VectorIndex:
+    """Memory-mapped embedding matrix of one model plus its row -> asset_id map."""
+    def __init__(self, path, dim, rows):
+        """rows: [(row, asset_id)] from semantic_index."""
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        count = size // (dim * 2)
+        self.matrix = np.memmap(path, dtype=np.float16, mode='r', shape=(count, dim)) if count else np.zeros((0, dim), np.float16)
+        # -1 = no asset (re-embedded elsewhere, or written but not committed yet)
+        self.asset_ids = np.full(count, -1, dtype=np.int64)
+        for row, asset_id in rows:
+            if row < count:
+                self.asset_ids[row] = asset_id
+        self.size = int((self.asset_ids >= 0).sum())
+
+    def _score_block(self, query, start, k):
+        """Top k (scores, rows) of one block of rows."""
+        block = np.asarray(self.matrix[start:start + BLOCK_ROWS], dtype=np.float32)
+        scores = block @ query
+        scores[self.asset_ids[start:start + len(block)] < 0] = -np.inf
+        best = np.argpartition(scores, -k)[-k:] if len(scores) > k else np.arange(len(scores))
+        return scores[best], best + start
+
+    def top_k(self, query, k, workers=1):
+        """
+        Returns: [(asset_id, score)] for the k rows closest to the normalized query vector, best first.
+        With workers > 1, blocks are scored on a thread pool (NumPy releases the GIL).
+        """
+        query = np.asarray(query, dtype=np.float32)
+        starts = range(0, len(self.matrix), BLOCK_ROWS)
+        if not starts:
+            return []
+        if workers > 1 and len(starts) > 1:
+            parts = list(_search_pool(workers).map(lambda start: self._score_block(query, start, k), starts))
+        else:
+            parts = [self._score_block(query, start, k) for start in starts]
+
+        scores = np.concatenate([p[0] for p in parts])
+        rows = np.concatenate([p[1] for p in parts])
+        if len(scores) > k:
+            best = np.argpartition(scores, -k)[-k:]
+            scores, rows = scores[best], rows[best]
+        order = np.argsort(-scores, kind='stable')
+        return [(int(self.asset_ids[r]), float(s)) for r, s in zip(rows[order], scores[order]) if s != -np.inf]
+
+_pool = None
+
+def _search_pool(workers):
+    global _pool
+    if _pool is None:
+        _pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='semantic-search')
+    return _pool
+
+def _get_index(app, model):
+    """The VectorIndex of the model, reloaded when new rows were committed."""
+    global _index
+    version = read_session.query(func.max(SemanticIndex.row)).filter(SemanticIndex.model == model.key).scalar()
+    if version is None:
+        return None
+    with _index_lock:
+        if _index is None or _index[0] != (model.key, version):
+            rows = read_session.query(SemanticIndex.row, SemanticIndex.asset_id).filter(SemanticIndex.model == model.key).all()
+            _index = ((model.key, version), VectorIndex(_matrix_path(app, model), model.dim, rows))
+        return _index[1]
+
+def search(app, text, k=None):
+    """
+    Semantic search over the image embeddings.
+    Returns: [(asset_id, score)] best first (score = cosine similarity), or None if
+    semantic search is not available (disabled, model missing or nothing indexed yet).
+    """
+    model = get_model(app)
+    if model is None:
+        return None
+    index = _get_index(app, model)
+    if index is None or not index.size:
+        return None
+    query = model.embed_text([text])[0]
+    workers = app.config.get('SEMANTIC_THREADS') or os.cpu_count() or 1
+    return index.top_k(query, k or app.config.get('SEMANTIC_TOP_K', 200), workers)
+
+def is_natural_language(text, min_words=3):
+    """Heuristic for /search: several plain words, no filename / field syntax (IMG_1234, *.cr2, a:b)."""
+    if re.search(r'[:*"/\\_]|\.\w{2,4}\b', text):
+        return False
+    return len(re.findall(r'[^\W\d_]{2,}', text)) >= min_words
+
+def missing_query(model):
+    """Images without an embedding from this model."""
+    return Asset.query.with_entities(Asset.id, Asset.file_path).outerjoin(
+        SemanticIndex, SemanticIndex.asset_id == Asset.id).filter(
+        Asset.media_type.in_(IMAGE_TYPES),
+        or_(SemanticIndex.asset_id.is_(None), SemanticIndex.model != model.key)).order_by(Asset.id)
+
+TRIGGERS = {
+    # Rows of deleted assets would otherwise stay in the catalog (their matrix rows are
+    # simply no longer mapped; rows are never reused)
+    'semantic_asset_delete': """
+        CREATE TRIGGER semantic_asset_delete AFTER DELETE ON assets
+        BEGIN DELETE FROM semantic_index WHERE asset_id = OLD.id; END""",
+}
+
+def install_semantic():
+    """
+    Creates the cleanup trigger if missing (run at startup after create_all). A database
+    that didn't have it yet gets the rows of already deleted assets removed once.
+    """
+    if ensure_triggers(TRIGGERS):
+        with db.engine.begin() as conn:
+            removed = conn.execute(text(
+                "DELETE FROM semantic_index WHERE asset_id NOT IN (SELECT id FROM assets)")).rowcount
+        if removed:
+            log.info("Semantic index: removed %d rows of deleted assets.", removed)
+
+def store_rows(model_key, start, asset_ids):
+    """Records asset_ids[i] -> row start + i. Run on the write queue."""
+    now = datetime.utcnow()
+    stmt = sqlite_insert(SemanticIndex)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['asset_id'],
+        set_={'model': stmt.excluded.model, 'row': stmt.excluded.row, 'embedded_at': stmt.excluded.embedded_at})
+    db.session.execute(stmt, [{'asset_id': asset_id, 'model': model_key, 'row': start + i, 'embedded_at': now}
+                              for i, asset_id in enumerate(asset_ids)])
+
+def _load_thumbnail(app, asset_id, file_path):
+    with app.app_context():
+        thumb_path = get_thumbnail_path(asset_id)
+        if not os.path.exists(thumb_path):
+            thumb_path = generate_thumbnail(file_path, asset_id)
+        if thumb_path is None:
+            return None
+        try:
+            with Image.open(thumb_path) as img:
+                img.load()
+                return img
+        except Exception as e:
+            log.warning("Could not read thumbnail %s: %s", thumb_path, e)
+            return None
+
+def index_missing(app, batch_size=None, limit=None):
+    """
+    Embedding stage: embeds images that have no embedding for the current model.
+    Needs an app context. Returns: number of images embedded (None if semantic search is off)
+    """
+    model = get_model(app)
+    if model is None:
+        return None
+    batch_size = batch_size or app.config.get('SEMANTIC_BATCH_SIZE', 32)
+    rows = missing_query(model).limit(limit).all() if limit else missing_query(model).all()
+    if not rows:
+        return 0
+    path = _matrix_path(app, model)
+    queue = get_write_queue(app)
+
+    embedded = 0
+    progress = Progress(log, 'Embeddings', total=len(rows))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix='semantic-load') as pool:
+        for start in range(0, len(rows), batch_size):
+            chunk = rows[start:start + batch_size]
+            images = list(pool.map(lambda row: _load_thumbnail(app, *row), chunk))
+            ids = [asset_id for (asset_id, _), img in zip(chunk, images) if img is not None]
+            images = [img for img in images if img is not None]
+            if images:
+                vectors = model.embed_images(images)
+                # Another process may be appending to the same matrix
+                with file_lock(path + '.lock'):
+                    first_row = append_vectors(path, vectors)
+                    queue.run(store_rows, model.key, first_row, ids)
+                embedded += len(ids)
+            progress.update(len(chunk), embedded=len(ids), errors=len(chunk) - len(ids))
+    progress.finish()
+    return embedded
+
+def schedule_indexing(app):
+    """Runs index_missing() on a background thread, unless one is already running or semantic search is off."""
+    if not app.config.get('SEMANTIC_MODEL') or not app.config.get('SEMANTIC_INDEX_AFTER_SCAN', True):
+        return False
+    if not _indexing.acquire(blocking=False):
+        return False
+
+    def run():
+        try:
+            with app.app_context():
+                index_missing(app)
+        except Exception as e:
+            log.error("Background semantic indexing failed: %s", e)
+        finally:
+            _indexing.release()
+
+    threading.Thread(target=run, name='semantic-index', daemon=True).start()
+    return True
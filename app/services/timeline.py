@@ -0,0 +1,105 @@
+"""
+Date-bucketed timeline (models.TimelineDay).
+
+One row per calendar day with the number of assets captured that day. The table is
+maintained by SQLite triggers on assets, so every write path (the scanner's bulk
+inserts, ORM deletes, captured_at updates from metadata refreshes) keeps it current
+without a GROUP BY over the assets table. Year / month views aggregate the day rows,
+which is at most a few tens of thousands of rows however large the library is.
+"""
+from datetime import datetime
+from sqlalchemy import func, text
+from app import db
+from app.database import ensure_triggers
+from app.models import Asset, TimelineDay
+from app.services.logs import get_logger
+
+log = get_logger(__name__)
+
+# date() of the stored 'YYYY-MM-DD HH:MM:SS[.ffffff]' value
+_DAY = "date({row}.captured_at)"
+
+def _increment(row):
+    return (f"INSERT INTO timeline_days (day, count) SELECT {_DAY.format(row=row)}, 1 "
+            f"WHERE {_DAY.format(row=row)} IS NOT NULL "
+            f"ON CONFLICT(day) DO UPDATE SET count = count + 1;")
+
+def _decrement(row):
+    return (f"UPDATE timeline_days SET count = count - 1 WHERE day = {_DAY.format(row=row)}; "
+            f"DELETE FROM timeline_days WHERE day = {_DAY.format(row=row)} AND count <= 0;")
+
+TRIGGERS = {
+    'timeline_asset_insert': f"""
+        CREATE TRIGGER timeline_asset_insert AFTER INSERT ON assets
+        BEGIN {_increment('NEW')} END""",
+    'timeline_asset_delete': f"""
+        CREATE TRIGGER timeline_asset_delete AFTER DELETE ON assets
+        BEGIN {_decrement('OLD')} END""",
+    'timeline_asset_update': f"""
+        CREATE TRIGGER timeline_asset_update AFTER UPDATE OF captured_at ON assets
+        WHEN OLD.captured_at IS NOT NEW.captured_at
+        BEGIN {_decrement('OLD')} {_increment('NEW')} END""",
+}
+
+def rebuild_timeline():
+    """Recomputes every day bucket from the assets table. Returns the number of days."""
+    with db.engine.begin() as conn:
+        conn.execute(text("DELETE FROM timeline_days"))
+        conn.execute(text(
+            "INSERT INTO timeline_days (day, count) "
+            "SELECT date(captured_at) AS d, count(*) FROM assets "
+            "WHERE captured_at IS NOT NULL AND date(captured_at) IS NOT NULL GROUP BY d"
+        ))
+        days = conn.execute(text("SELECT count(*) FROM timeline_days")).scalar()
+    log.info("Timeline rebuilt: %d days.", days)
+    return days
+
+def install_timeline():
+    """
+    Creates the maintenance triggers if missing (run at startup after create_all).
+    A database that didn't have them yet gets its buckets backfilled once.
+    """
+    if ensure_triggers(TRIGGERS):
+        rebuild_timeline()
+
+def timeline_counts(session, level='year', year=None, month=None):
+    """
+    Asset counts per period.
+    level: 'year', 'month' (optionally within year) or 'day' (optionally within year / month).
+    Returns: List of (period, count), oldest first; period is 'YYYY', 'YYYY-MM' or 'YYYY-MM-DD'.
+    """
+    width = {'year': 4, 'month': 7, 'day': 10}[level]
+    period = func.substr(TimelineDay.day, 1, width).label('period')
+    query = session.query(period, func.sum(TimelineDay.count))
+
+    scope = f"{int(year):04d}" if year else None
+    if scope and month:
+        scope += f"-{int(month):02d}"
+    if scope:
+        # Range on the primary key: 'YYYY-MM' <= day < 'YYYY-MM~'
+        query = query.filter(TimelineDay.day >= scope, TimelineDay.day < scope + '~')
+
+    return [(p, int(c)) for p, c in query.group_by(period).order_by(period)]
+
+def undated_count(session):
+    """Assets without a capture date (not part of any bucket)."""
+    return session.query(func.count(Asset.id)).filter(Asset.captured_at.is_(None)).scalar()
+
+def parse_period(value):
+    """
+    'YYYY', 'YYYY-MM' or 'YYYY-MM-DD' -> (start, end) datetimes, end exclusive.
+    Returns None for anything else.
+    """
+    for fmt, unit in (('%Y-%m-%d', 'day'), ('%Y-%m', 'month'), ('%Y', 'year')):
+        try:
+            start = datetime.strptime(value or '', fmt)
+        except ValueError:
+            continue
+        if unit == 'day':
+            end = datetime.fromordinal(start.toordinal() + 1)
+        elif unit == 'month':
+            end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+        else:
+            end = start.replace(year=start.year + 1)
+        return start, end
+    return None
@@ -1,15 +1,21 @@
+from app.services.logs import get_logger, Progress
+
+log = get_logger(__name__)
+
 try:
     import face_recognition
     FACE_REC_AVAILABLE = True
 except ImportError:
     FACE_REC_AVAILABLE = False
-    print("Warning: 'face_recognition' library not found. Face detection disabled.")
+    log.warning("'face_recognition' library not found. Face detection disabled.")
 
 import pickle
 import numpy as np
 from app import db
 from app.models import Asset, Face, Person
+from app.services import metrics
 
+@metrics.job('faces')
 def process_all_faces():
     """
     Iterates through all assets without face data and processes them.
@@ -24,7 +30,7 @@ def process_all_faces():
     # We'll just run on all images for this prototype demo command.
     
     if not FACE_REC_AVAILABLE:
-        print("Skipping face detection: Library not installed.")
+        log.warning("Skipping face detection: Library not installed.")
         return 0
 
     assets = Asset.query.filter(Asset.media_type.in_(['jpg', 'jpeg', 'png'])).all()
@@ -43,22 +49,27 @@ def process_all_faces():
         except:
             pass
 
+    progress = Progress(log, 'Faces', total=len(assets))
     for asset in assets:
         # Skip if already has faces? (Simple optimization)
         if asset.faces.count() > 0:
+            progress.update(skipped=1)
             continue
             
         try:
-            print(f"Processing faces for {asset.file_path}...")
+            log.debug("Processing faces for %s...", asset.file_path)
             image = face_recognition.load_image_file(asset.file_path)
             
             # Detect
-            locations = face_recognition.face_locations(image)
+            with metrics.FACE.time(stage='detect'):
+                locations = face_recognition.face_locations(image)
             if not locations:
                 # Mark as processed? 
+                progress.update(no_faces=1)
                 continue
                 
-            encodings = face_recognition.face_encodings(image, locations)
+            with metrics.FACE.time(stage='encode'):
+                encodings = face_recognition.face_encodings(image, locations)
             
             for location, encoding in zip(locations, encodings):
                 # suggested_person_id = None
@@ -68,7 +79,8 @@ def process_all_faces():
                 matches = []
                 if known_encodings:
                     # distance is euclidean distance
-                    distances = face_recognition.face_distance(known_encodings, encoding)
+                    with metrics.FACE_DISTANCE.time():
+                        distances = face_recognition.face_distance(known_encodings, encoding)
                     # Find min distance
                     min_dist_idx = np.argmin(distances)
                     if distances[min_dist_idx] < 0.6: # Threshold
@@ -93,13 +105,16 @@ def process_all_faces():
                 from app.services import face_import_utils
                 face_import_utils.import_faces_from_metadata(asset)
             except Exception as e:
-                print(f"Metadata import warning for {asset.id}: {e}")
+                log.warning("Metadata import warning for %s: %s", asset.id, e)
 
             count += 1
+            progress.update(processed=1, faces=len(locations))
             
         except Exception as e:
-            print(f"Face processing error on {asset.id}: {e}")
+            log.warning("Face processing error on %s: %s", asset.id, e)
+            progress.update(errors=1)
 
+    progress.finish()
     return count
 
 def scan_unknowns_for_match(person_id, tolerance=0.6, include_rejected=False):
@@ -152,7 +167,8 @@ def scan_unknowns_for_match(person_id, tolerance=0.6, include_rejected=False):
             encoding = pickle.loads(face.encoding)
             
             # Compare
-            distances = face_recognition.face_distance(known_encodings, encoding)
+            with metrics.FACE_DISTANCE.time():
+                distances = face_recognition.face_distance(known_encodings, encoding)
             # Check if ANY match fits the threshold? Or Average?
             # Typically min distance is best
             min_dist = np.min(distances)
@@ -164,7 +180,7 @@ def scan_unknowns_for_match(person_id, tolerance=0.6, include_rejected=False):
                 face.confidence = 1.0 - min_dist
                 match_count += 1
         except Exception as e:
-            print(f"Error matching face {face.id}: {e}")
+            log.warning("Error matching face %s: %s", face.id, e)
             continue
             
     if match_count > 0:
@@ -193,13 +209,14 @@ def encode_face_region(file_path, top, right, bottom, left):
         locations = [(top, right, bottom, left)]
         
         # 'num_jitters' can be increased for better accuracy on re-sampling
-        encodings = face_recognition.face_encodings(image, locations, num_jitters=1)
+        with metrics.FACE.time(stage='encode'):
+            encodings = face_recognition.face_encodings(image, locations, num_jitters=1)
         
         if encodings:
             return pickle.dumps(encodings[0])
             
     except Exception as e:
-        print(f"Error encoding manual region for {file_path}: {e}")
+        log.warning("Error encoding manual region for %s: %s", file_path, e)
         
     return None
 
@@ -240,13 +257,11 @@ def find_best_matches_for_face(face_id):
         return []
         
     # Calculate Distances
-    # face_recognition.face_distance returns euclidean distance for each face
+    # Euclidean distance for each face, exactly what face_recognition.face_distance
+    # computes, done with numpy directly so matching works without dlib installed.
     # Lower is better.
-    if FACE_REC_AVAILABLE:
-        distances = face_recognition.face_distance(known_encodings, target_encoding)
-    else:
-        # Fallback if library missing (shouldn't happen if we have encodings)
-        return []
+    with metrics.FACE_DISTANCE.time():
+        distances = np.linalg.norm(np.asarray(known_encodings) - target_encoding, axis=1)
         
     # Group by Person and find min distance
     person_scores = {} # person_id -> min_distance
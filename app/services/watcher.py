@@ -0,0 +1,403 @@
+"""
+Filesystem watcher for continuous incremental indexing.
+
+Instead of re-walking every LibraryPath on "Scan", the watcher listens for
+create / modify / move / delete events, debounces them into batches and feeds
+only the affected paths into the scanner's ingest functions.
+
+- Uses `watchdog` (inotify on Linux, FSEvents on macOS, ReadDirectoryChangesW on Windows) when installed.
+- Falls back to periodic polling snapshots otherwise (or for roots the OS observer can't watch, e.g. some NAS shares).
+"""
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    WATCHDOG_AVAILABLE = False
+    FileSystemEventHandler = object
+
+import os
+import queue
+import threading
+import time
+from flask import current_app
+from app.models import LibraryPath
+from app.database import get_write_queue
+from app.services import scanner, folders, semantic, albums
+from app.services.logs import get_logger
+
+log = get_logger(__name__)
+
+# Module-level singleton (one watcher per process)
+_watcher = None
+_watcher_lock = threading.Lock()
+
+def _is_hidden(path, roots):
+    """
+    True if a component of the path below its watched root starts with '.' (mirrors
+    scan_directory, which skips hidden entries under a root; the root itself may well
+    live in a dot-directory such as ~/.local/share).
+    """
+    root = max((r for r in roots if path == r or path.startswith(r.rstrip(os.sep) + os.sep)), key=len, default=None)
+    relative = os.path.relpath(path, root) if root else os.path.basename(path)
+    return any(part.startswith('.') for part in relative.split(os.sep) if part and part != '.')
+
+class ChangeBatch:
+    """
+    Coalesces raw events until the debounce window closes.
+    A file created and then renamed inside the window is ingested once under its final name;
+    a file created and deleted inside the window never reaches the DB.
+    """
+    def __init__(self):
+        self.changed = set()      # files to ingest / refresh
+        self.changed_dirs = set() # directories that appeared (walk them)
+        self.deleted = set()      # files or directories that disappeared
+        self.moves = []           # ordered (src, dest) renames of already-indexed paths
+
+    def __bool__(self):
+        return bool(self.changed or self.changed_dirs or self.deleted or self.moves)
+
+    def add(self, kind, src, dest=None, is_dir=False):
+        if kind in ('created', 'modified'):
+            if is_dir:
+                # Directory mtime changes on every child event; only new directories matter.
+                if kind == 'created':
+                    self.changed_dirs.add(src)
+                    self.deleted.discard(src)
+                return
+            self.changed.add(src)
+            self.deleted.discard(src)
+
+        elif kind == 'deleted':
+            self.changed.discard(src)
+            self.changed_dirs.discard(src)
+            self.deleted.add(src)
+
+        elif kind == 'moved':
+            if src in self.changed:
+                # Not ingested yet: just ingest under the new name
+                self.changed.discard(src)
+                self.changed.add(dest)
+            elif src in self.changed_dirs:
+                self.changed_dirs.discard(src)
+                self.changed_dirs.add(dest)
+            else:
+                self.moves.append((src, dest))
+            self.deleted.discard(dest)
+
+class _EventHandler(FileSystemEventHandler):
+    """Translates watchdog events into LibraryWatcher.on_event calls."""
+    def __init__(self, watcher):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_created(self, event):
+        self.watcher.on_event('created', event.src_path, is_dir=event.is_directory)
+
+    def on_modified(self, event):
+        self.watcher.on_event('modified', event.src_path, is_dir=event.is_directory)
+
+    def on_deleted(self, event):
+        self.watcher.on_event('deleted', event.src_path, is_dir=event.is_directory)
+
+    def on_moved(self, event):
+        self.watcher.on_event('moved', event.src_path, dest=event.dest_path, is_dir=event.is_directory)
+
+class PollingSnapshot:
+    """
+    Polling fallback for a single root.
+    Keeps {path: (inode, size, mtime_ns)} and diffs it on every poll.
+    A disappeared path and a new path sharing inode+size are reported as a move.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.entries = self._take()
+
+    def _take(self):
+        entries = {}
+        for dirpath, dirs, files in os.walk(self.root):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for name in files:
+                if name.startswith('.') or not scanner.is_allowed_file(name):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries[path] = (st.st_ino, st.st_size, st.st_mtime_ns)
+        return entries
+
+    def poll(self):
+        """Returns a list of (kind, src, dest) events since the previous poll."""
+        current = self._take()
+        old = self.entries
+        self.entries = current
+
+        removed = {p: sig for p, sig in old.items() if p not in current}
+        added = {p: sig for p, sig in current.items() if p not in old}
+        events = []
+
+        # Pair removed/added by inode+size -> rename
+        by_sig = {(sig[0], sig[1]): p for p, sig in removed.items()}
+        for path, sig in added.items():
+            src = by_sig.pop((sig[0], sig[1]), None)
+            if src:
+                removed.pop(src, None)
+                events.append(('moved', src, path))
+            else:
+                events.append(('created', path, None))
+
+        for path in removed:
+            events.append(('deleted', path, None))
+
+        for path, sig in current.items():
+            if path in old and old[path] != sig:
+                events.append(('modified', path, None))
+
+        return events
+
+class LibraryWatcher:
+    """
+    Watches every LibraryPath and applies debounced batches through the scanner.
+    Events are collected on the watcher's own thread; DB work runs on the write queue.
+    """
+    def __init__(self, app, debounce=2.0, max_delay=30.0, poll_interval=60.0):
+        self.app = app
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+
+        self.events = queue.Queue()
+        self.roots = []
+        self.observer = None
+        self.snapshots = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- Lifecycle ---
+
+    def start(self):
+        self.refresh_roots()
+        self._thread = threading.Thread(target=self._run, name='library-watcher', daemon=True)
+        self._thread.start()
+        mode = 'inotify/native' if self.observer else 'polling'
+        log.info("Library watcher started (%s) on %d folder(s).", mode, len(self.roots))
+
+    def stop(self):
+        self._stop.set()
+        if self.observer:
+            self.observer.stop()
+            self.observer.join()
+        if self._thread:
+            self._thread.join()
+
+    def refresh_roots(self):
+        """Re-reads LibraryPath rows and (re)schedules OS watches. Call after adding/removing a library."""
+        with self.app.app_context():
+            roots = [lp.path for lp in LibraryPath.query.all() if os.path.isdir(lp.path)]
+
+        self.roots = roots
+
+        if WATCHDOG_AVAILABLE:
+            if self.observer is None:
+                self.observer = Observer()
+                self.observer.start()
+            self.observer.unschedule_all()
+            handler = _EventHandler(self)
+            for root in roots:
+                try:
+                    self.observer.schedule(handler, root, recursive=True)
+                except OSError as e:
+                    # e.g. inotify watch limit reached or unsupported network FS
+                    log.warning("Native watch failed for %s (%s), polling instead.", root, e)
+                    self.snapshots.setdefault(root, PollingSnapshot(root))
+        else:
+            for root in roots:
+                if root not in self.snapshots:
+                    self.snapshots[root] = PollingSnapshot(root)
+
+        # Drop snapshots of roots that are no longer tracked
+        for root in list(self.snapshots):
+            if root not in roots:
+                del self.snapshots[root]
+
+    # --- Event intake ---
+
+    def on_event(self, kind, src, dest=None, is_dir=False):
+        """Thread-safe: called from observer threads. Filters noise before queueing."""
+        roots = self.roots
+        if kind == 'moved':
+            src_hidden, dest_hidden = _is_hidden(src, roots), _is_hidden(dest, roots)
+            if src_hidden and dest_hidden:
+                return
+            if dest_hidden:
+                # Moved out of sight (e.g. into .trash): gone as far as the library is concerned
+                kind, dest = 'deleted', None
+            elif src_hidden:
+                # Moved out of a hidden folder: new to the library
+                kind, src, dest = 'created', dest, None
+        elif _is_hidden(src, roots):
+            return
+        if not is_dir:
+            names = [os.path.basename(p) for p in (src, dest) if p]
+            if not any(scanner.is_allowed_file(n) for n in names):
+                return
+        self.events.put((kind, src, dest, is_dir))
+
+    # --- Worker loop ---
+
+    def _run(self):
+        batch = ChangeBatch()
+        first_event = None
+        last_event = None
+        next_poll = time.monotonic() + self.poll_interval
+
+        while not self._stop.is_set():
+            try:
+                kind, src, dest, is_dir = self.events.get(timeout=0.5)
+                batch.add(kind, src, dest, is_dir)
+                now = time.monotonic()
+                last_event = now
+                first_event = first_event or now
+            except queue.Empty:
+                pass
+
+            now = time.monotonic()
+
+            if self.snapshots and now >= next_poll:
+                next_poll = now + self.poll_interval
+                for snapshot in list(self.snapshots.values()):
+                    for kind, src, dest in snapshot.poll():
+                        batch.add(kind, src, dest)
+                        last_event = now
+                        first_event = first_event or now
+
+            if batch and (now - last_event >= self.debounce or now - first_event >= self.max_delay):
+                self.apply(batch)
+                batch = ChangeBatch()
+                first_event = None
+                last_event = None
+
+    def apply(self, batch):
+        """Feeds one coalesced batch into the scanner via the app's single write queue."""
+        try:
+            counts = get_write_queue(self.app).run(self._apply_batch, batch, retry=True)
+        except Exception as e:
+            log.error("Watcher batch failed: %s", e)
+            return None
+        log.info("Watcher batch applied. %s", ", ".join(f"{k.capitalize()}: {v}" for k, v in counts.items()),
+                 extra={'data': counts})
+        if counts.get('added'):
+            semantic.schedule_indexing(self.app)
+        return counts
+
+    def _apply_batch(self, batch):
+        """Runs on the write queue thread (app context provided, committed by the queue)."""
+        counts = {'added': 0, 'moved': 0, 'updated': 0, 'removed': 0, 'errors': 0}
+        # Folder tree upkeep: single files -> incremental update of their directories;
+        # whole directories appearing/moving/vanishing -> rebuild of the affected roots
+        touched_dirs = set()
+        restructured = set(batch.changed_dirs)
+
+        # 1. Renames: direct path rewrite, no hashing
+        for src, dest in batch.moves:
+            try:
+                moved = scanner.move_path(src, dest)
+                touched_dirs.update((os.path.dirname(src), os.path.dirname(dest)))
+                if os.path.isdir(dest):
+                    restructured.update((src, dest))
+                if moved:
+                    counts['moved'] += moved
+                elif os.path.isdir(dest):
+                    batch.changed_dirs.add(dest)
+                else:
+                    # Source was never indexed (e.g. renamed from a non-media extension)
+                    batch.changed.add(dest)
+            except Exception as e:
+                log.warning("Move %s -> %s failed: %s", src, dest, e)
+                counts['errors'] += 1
+
+        # 2. New directories (moved in from outside the watched tree, or copied in bulk)
+        for dir_path in batch.changed_dirs:
+            for dirpath, dirs, files in os.walk(dir_path):
+                dirs[:] = [d for d in dirs if not d.startswith('.')]
+                for name in files:
+                    if not name.startswith('.') and scanner.is_allowed_file(name):
+                        batch.changed.add(os.path.join(dirpath, name))
+
+        # 3. Created / modified files
+        for path in sorted(batch.changed):
+            if not os.path.isfile(path):
+                continue
+            try:
+                status = scanner.refresh_file(path)
+                counts[status] = counts.get(status, 0) + 1
+                touched_dirs.add(os.path.dirname(path))
+            except Exception as e:
+                log.warning("Error processing %s: %s", path, e)
+                counts['errors'] += 1
+
+        # 4. Deletions last, so a delete+create pair inside one batch is healed as a move first
+        for path in batch.deleted:
+            try:
+                removed = scanner.remove_path(path)
+                counts['removed'] += removed
+                touched_dirs.add(os.path.dirname(path))
+                if removed > 1 or folders.has_folder(path):
+                    restructured.add(path) # A directory went away
+            except Exception as e:
+                log.warning("Error removing %s: %s", path, e)
+                counts['errors'] += 1
+
+        # 5. Folder tree
+        try:
+            if restructured:
+                roots = {r for r in self.roots for p in restructured
+                         if p == r or p.startswith(r.rstrip(os.sep) + os.sep)}
+                folders.rebuild_folders(sorted(roots))
+            else:
+                folders.update_folders(touched_dirs)
+        except Exception as e:
+            log.error("Folder tree update failed: %s", e)
+
+        # 6. Smart albums (the triggers queued every asset touched above)
+        try:
+            albums.refresh_pending()
+        except Exception as e:
+            log.error("Album refresh failed: %s", e)
+
+        return counts
+
+def start_watcher(app):
+    """Starts the process-wide watcher (idempotent). Returns the LibraryWatcher."""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = LibraryWatcher(
+                app,
+                debounce=app.config.get('WATCH_DEBOUNCE_SECONDS', 2.0),
+                max_delay=app.config.get('WATCH_MAX_DELAY_SECONDS', 30.0),
+                poll_interval=app.config.get('WATCH_POLL_INTERVAL', 60.0),
+            )
+            _watcher.start()
+    return _watcher
+
+def init_watcher(app):
+    """
+    Starts the watcher with the first request if WATCH_LIBRARIES is set, in whatever
+    process serves it (dev server with or without reloader, flask run, WSGI servers).
+    The reloader's parent process never serves a request, so it never watches.
+    """
+    if not app.config.get('WATCH_LIBRARIES'):
+        return
+
+    @app.before_request
+    def ensure_watcher():
+        if _watcher is None:
+            start_watcher(current_app._get_current_object())
+
+def refresh_watched_roots():
+    """Notifies the running watcher (if any) that LibraryPaths changed."""
+    if _watcher is not None:
+        _watcher.refresh_roots()
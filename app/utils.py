@@ -1,6 +1,13 @@
 import os
 from PIL import Image
 from flask import current_app
+from app.database import get_write_queue
+from app.services import metrics
+from app.services.duplicates import store_hashes
+from app.services.phash import image_hashes
+from app.services.logs import get_logger
+
+log = get_logger(__name__)
 
 def get_thumbnail_path(asset_id):
     """Returns the absolute path to the thumbnail for the given asset ID."""
@@ -12,6 +19,7 @@ def get_thumbnail_path(asset_id):
 def generate_thumbnail(original_path, asset_id):
     """
     Generates a thumbnail for the image at original_path.
+    Also records the image's perceptual hashes (services/phash.py) from the downscaled copy.
     Returns the path to the generated thumbnail.
     """
     thumb_path = get_thumbnail_path(asset_id)
@@ -21,7 +29,7 @@ def generate_thumbnail(original_path, asset_id):
         return thumb_path
 
     try:
-        with Image.open(original_path) as img:
+        with metrics.THUMBNAIL.time(), Image.open(original_path) as img:
             # Convert to RGB if necessary (e.g. for PNGs with transparency if saving as JPG)
             if img.mode in ('RGBA', 'P'):
                 img = img.convert('RGB')
@@ -31,8 +39,12 @@ def generate_thumbnail(original_path, asset_id):
             
             # Save
             img.save(thumb_path, "JPEG", quality=85)
-            
+
+            hashes = image_hashes(img)
+
+        # Stored in the background (one tiny write per new thumbnail)
+        get_write_queue(current_app._get_current_object()).submit(store_hashes, {asset_id: hashes})
         return thumb_path
     except Exception as e:
-        print(f"Error generating thumbnail for {original_path}: {e}")
+        log.warning("Error generating thumbnail for %s: %s", original_path, e)
         return None
@@ -0,0 +1,334 @@
+"""
+Benchmark suite: ingest, search, face matching and thumbnails on a synthetic library.
+
+Builds a throwaway library + database in a temp folder (see synthetic_library.py), then
+measures:
+- scan: files/sec for a full scan_libraries() run (hash + ExifTool + bulk insert)
+- search: ms/query for /search (plain and folder-scoped) and a few grid pages
+- matching: ms/query for vision.find_best_matches_for_face
+- thumbnails: thumbnails/sec for utils.generate_thumbnail (cold cache)
+- hashes: perceptual hashes/sec for the backfill path (thumbnail draft decode + batch hash)
+- semantic: ms/query for the semantic top-k scan over a synthetic float16 embedding matrix
+  (--vectors x 512, the size of CLIP ViT-B embeddings; the model itself is not timed)
+- peak RSS after each phase
+Results are written as JSON (benchmarks/results/<time>-<commit>.json by default) so runs
+can be compared across commits with --compare.
+
+If ExifTool is not installed (or with --stub), stub_exiftool.py answers the metadata
+reads, so the suite runs offline. Stub numbers are only comparable with stub numbers.
+
+Usage: python benchmarks/run_benchmarks.py [--files 500] [--compare results/old.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+# Metrics where a bigger number is better (everything else: smaller is better)
+HIGHER_IS_BETTER = ('files_per_sec', 'thumbs_per_sec', 'hashes_per_sec')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--files', type=int, default=500, help='synthetic images to generate and scan')
+    parser.add_argument('--size', default='1024x768', help='image size WxH')
+    parser.add_argument('--people', type=int, default=50)
+    parser.add_argument('--faces', type=int, default=2000)
+    parser.add_argument('--queries', type=int, default=50, help='repetitions per search / matching query')
+    parser.add_argument('--thumbs', type=int, default=200, help='thumbnails to generate')
+    parser.add_argument('--vectors', type=int, default=100000, help='embeddings in the semantic search matrix')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--stub', action='store_true', help='use the stub ExifTool even if the real one is installed')
+    parser.add_argument('--out', help='result file (default: benchmarks/results/<time>-<commit>.json)')
+    parser.add_argument('--compare', help='earlier result file to compare against')
+    parser.add_argument('--keep', action='store_true', help='keep the temporary library and database')
+    return parser.parse_args()
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None if unknown)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS bytes
+        return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+    except (ImportError, AttributeError):
+        return None
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def timings(samples):
+    """Summary of a list of durations in seconds."""
+    samples = sorted(samples)
+    return {
+        'n': len(samples),
+        'median_ms': round(statistics.median(samples) * 1000, 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+        'max_ms': round(samples[-1] * 1000, 3),
+    }
+
+def install_stub(work_dir, library, meta_root):
+    """Points the app's ExifTool calls at stub_exiftool.py. Returns the launcher path."""
+    bin_dir = os.path.join(work_dir, 'bin')
+    os.makedirs(bin_dir, exist_ok=True)
+    stub = os.path.join(BENCH_DIR, 'stub_exiftool.py')
+    if os.name == 'nt':
+        launcher = os.path.join(bin_dir, 'exiftool.bat')
+        with open(launcher, 'w') as f:
+            f.write(f'@"{sys.executable}" "{stub}" %*\n')
+    else:
+        launcher = os.path.join(bin_dir, 'exiftool')
+        with open(launcher, 'w') as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{stub}" "$@"\n')
+        os.chmod(launcher, 0o755)
+    os.environ['STUB_EXIFTOOL_LIBRARY'] = library
+    os.environ['STUB_EXIFTOOL_META'] = meta_root
+
+    from app.services import metadata, metadata_backup, metadata_writer
+    for module in (metadata, metadata_backup, metadata_writer):
+        module.EXIFTOOL_PATH = launcher
+    return launcher
+
+def bench_scan(db, library):
+    from app.models import Asset, LibraryPath
+    from app.services.scanner import scan_libraries
+
+    db.session.add(LibraryPath(path=library))
+    db.session.commit()
+    started = time.perf_counter()
+    scan_libraries([library], full=True)
+    elapsed = time.perf_counter() - started
+    files = Asset.query.count()
+    return {'files': files, 'seconds': round(elapsed, 3), 'files_per_sec': round(files / elapsed, 1) if elapsed else None}
+
+def bench_search(app, library, queries, rng):
+    from synthetic_library import WORDS
+    client = app.test_client()
+    folders = sorted(os.path.join(library, d) for d in os.listdir(library))
+    cases = {
+        'search': lambda: f"/search?q={rng.choice(WORDS)}",
+        'search_scoped': lambda: f"/search?q={rng.choice(WORDS)}&path_filter={rng.choice(folders)}",
+        'search_miss': lambda: "/search?q=zzzz-no-such-word",
+        'grid_page': lambda: f"/?page={rng.randrange(1, 6)}",
+        'grid_folder': lambda: f"/?path_filter={rng.choice(folders)}",
+    }
+    results = {}
+    for name, make_url in cases.items():
+        client.get(make_url()) # Warm-up (statement cache, page cache)
+        samples = []
+        for _ in range(queries):
+            url = make_url()
+            started = time.perf_counter()
+            response = client.get(url)
+            samples.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} -> HTTP {response.status_code}")
+        results[name] = timings(samples)
+    return results
+
+def bench_matching(db, asset_ids, args, rng):
+    from synthetic_library import seed_faces
+    from app.services.vision import find_best_matches_for_face
+
+    face_ids = seed_faces(db, asset_ids, args.people, args.faces, seed=args.seed)
+    samples = []
+    for _ in range(args.queries):
+        face_id = rng.choice(face_ids)
+        started = time.perf_counter()
+        matches = find_best_matches_for_face(face_id)
+        samples.append(time.perf_counter() - started)
+        db.session.expire_all()
+    result = timings(samples)
+    result.update({'people': args.people, 'faces': len(face_ids), 'candidates_returned': len(matches)})
+    return result
+
+def bench_thumbnails(rows, count):
+    from app.utils import generate_thumbnail
+    rows = rows[:count]
+    started = time.perf_counter()
+    made = sum(1 for asset_id, path in rows if generate_thumbnail(path, asset_id))
+    elapsed = time.perf_counter() - started
+    return {'thumbnails': made, 'seconds': round(elapsed, 3), 'thumbs_per_sec': round(made / elapsed, 1) if elapsed else None}
+
+def bench_hashes(rows):
+    from app.services.phash import grids_from_file, hash_batch
+    from app.utils import get_thumbnail_path
+    paths = [p for p in (get_thumbnail_path(asset_id) for asset_id, _ in rows) if os.path.exists(p)]
+    started = time.perf_counter()
+    grid_list = [grids_from_file(p) for p in paths]
+    decoded = time.perf_counter()
+    hash_batch(grid_list)
+    elapsed = time.perf_counter() - started
+    hash_seconds = time.perf_counter() - decoded
+    return {
+        'images': len(paths), 'seconds': round(elapsed, 3),
+        'hashes_per_sec': round(len(paths) / elapsed, 1) if elapsed else None,
+        # The NumPy part alone (no decode)
+        'batch_hashes_per_sec': round(len(paths) / hash_seconds, 1) if hash_seconds else None,
+    }
+
+def bench_semantic(work_dir, args, rng):
+    import numpy as np
+    from app.services.semantic import VectorIndex, append_vectors
+    dim = 512
+    gen = np.random.default_rng(args.seed)
+    path = os.path.join(work_dir, 'semantic.f16')
+    # Written in chunks so the benchmark itself doesn't need the float32 matrix in memory
+    for start in range(0, args.vectors, 50000):
+        chunk = gen.standard_normal((min(50000, args.vectors - start), dim)).astype(np.float32)
+        append_vectors(path, chunk / np.linalg.norm(chunk, axis=1, keepdims=True))
+    index = VectorIndex(path, dim, [(row, row + 1) for row in range(args.vectors)])
+    samples = []
+    for _ in range(args.queries):
+        query = gen.standard_normal(dim).astype(np.float32)
+        query /= np.linalg.norm(query)
+        started = time.perf_counter()
+        index.top_k(query, 200, os.cpu_count() or 1)
+        samples.append(time.perf_counter() - started)
+    result = timings(samples)
+    result['vectors'] = args.vectors
+    return result
+
+def flatten(results, prefix=''):
+    """{'scan': {'files_per_sec': 1}} -> {'scan.files_per_sec': 1} (numbers only)."""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+def compare(current, previous_path):
+    with open(previous_path, encoding='utf-8') as f:
+        previous = json.load(f)
+    if previous.get('exiftool') != current.get('exiftool'):
+        print(f"Note: ExifTool mode differs ({previous.get('exiftool')} vs {current.get('exiftool')}), scan numbers are not comparable.")
+    old, new = flatten(previous['results']), flatten(current['results'])
+    print(f"\n>>> Compared with {previous_path} (commit {previous.get('commit')})")
+    for key in sorted(new):
+        if key not in old or not (key.endswith(('_ms', '_per_sec')) or key.startswith('peak_rss')):
+            continue
+        before, after = old[key], new[key]
+        if not before:
+            continue
+        change = (after - before) / before * 100
+        better = change > 0 if key.endswith(HIGHER_IS_BETTER) else change < 0
+        flag = '' if abs(change) < 5 else ('  better' if better else '  WORSE')
+        print(f"    {key:<36} {before:>10} -> {after:>10}  ({change:+.1f}%){flag}")
+
+def main():
+    args = parse_args()
+    width, height = (int(v) for v in args.size.lower().split('x'))
+    rng = random.Random(args.seed)
+
+    work_dir = tempfile.mkdtemp(prefix='archivedb_bench_')
+    library = os.path.join(work_dir, 'library')
+    meta_root = os.path.join(work_dir, 'stub_meta')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(work_dir, 'bench.sqlite')
+
+    from synthetic_library import generate_library
+    print(f">>> Generating {args.files} images ({width}x{height}) in {library}...")
+    started = time.perf_counter()
+    generate_library(library, meta_root, args.files, seed=args.seed, size=(width, height))
+    print(f"    Generated in {time.perf_counter() - started:.1f}s")
+
+    from app import create_app, db
+    from app.models import Asset
+    from app.services.metadata import is_exiftool_available
+
+    app = create_app()
+    # Thumbnails go to the temp folder, not the real instance cache
+    app.instance_path = os.path.join(work_dir, 'instance')
+
+    use_stub = args.stub or not is_exiftool_available()
+    if use_stub:
+        install_stub(work_dir, library, meta_root)
+    print(f">>> ExifTool: {'stub' if use_stub else 'real'}")
+
+    results = {}
+    with app.app_context():
+        print(">>> Scan...")
+        results['scan'] = bench_scan(db, library)
+        results['peak_rss_mb'] = {'after_scan': peak_rss_mb()}
+        print(f"    {results['scan']['files_per_sec']} files/sec")
+
+        rows = db.session.query(Asset.id, Asset.file_path).order_by(Asset.id).all()
+
+        print(">>> Search...")
+        results['search'] = bench_search(app, library, args.queries, rng)
+        results['peak_rss_mb']['after_search'] = peak_rss_mb()
+        for name, t in results['search'].items():
+            print(f"    {name}: {t['median_ms']} ms median, {t['p95_ms']} ms p95")
+
+        print(">>> Face matching...")
+        results['matching'] = bench_matching(db, [r[0] for r in rows], args, rng)
+        results['peak_rss_mb']['after_matching'] = peak_rss_mb()
+        print(f"    {results['matching']['median_ms']} ms median over {results['matching']['faces']} faces")
+
+        print(">>> Thumbnails...")
+        results['thumbnails'] = bench_thumbnails(rows, args.thumbs)
+        results['peak_rss_mb']['after_thumbnails'] = peak_rss_mb()
+        print(f"    {results['thumbnails']['thumbs_per_sec']} thumbnails/sec")
+
+        print(">>> Perceptual hashes...")
+        results['hashes'] = bench_hashes(rows)
+        print(f"    {results['hashes']['hashes_per_sec']} images/sec from thumbnails "
+              f"({results['hashes']['batch_hashes_per_sec']}/sec batch hashing alone)")
+
+        print(">>> Semantic top-k...")
+        results['semantic'] = bench_semantic(work_dir, args, rng)
+        results['peak_rss_mb']['after_semantic'] = peak_rss_mb()
+        print(f"    {results['semantic']['median_ms']} ms median over {args.vectors} embeddings")
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'exiftool': 'stub' if use_stub else 'real',
+        'params': {k: v for k, v in vars(args).items() if k not in ('out', 'compare', 'keep')},
+        'results': results,
+    }
+
+    out = args.out or os.path.join(BENCH_DIR, 'results', f"{datetime.now():%Y%m%d-%H%M%S}-{report['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f">>> Results written to {out}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+    if args.keep:
+        print(f"    Kept {work_dir}")
+    else:
+        with app.app_context():
+            db.engine.dispose()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print("Done!")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Minimal stand-in for ExifTool, used by the benchmarks when the real one is absent.
+
+Understands the subset of the command line the app uses:
+- reads (-j, plus -a / -struct / -G1 / -c which are accepted and ignored): prints the
+  JSON metadata the synthetic library generator stored for each file
+  (STUB_EXIFTOOL_META/<path relative to STUB_EXIFTOOL_LIBRARY>.json), or a minimal
+  record for files it knows nothing about
+- writes (-TAG=VALUE, -json=FILE, -overwrite_original*): reports the files as updated
+  without touching them
+- -@ ARGFILE / -@ - (arguments from a file / stdin), -execute, -echo TEXT
+
+Run as: python stub_exiftool.py [exiftool arguments...]
+"""
+import json
+import os
+import sys
+
+# Options that take a value (the value is not a file name)
+VALUE_OPTIONS = {'-c', '-d', '-charset', '-echo', '-p', '-w', '-ext', '-if', '-api', '-fileOrder'}
+
+def stub_metadata(path):
+    library = os.environ.get('STUB_EXIFTOOL_LIBRARY')
+    meta_root = os.environ.get('STUB_EXIFTOOL_META')
+    if library and meta_root:
+        rel = os.path.relpath(os.path.abspath(path), library)
+        if not rel.startswith('..'):
+            try:
+                with open(os.path.join(meta_root, rel + '.json'), encoding='utf-8') as f:
+                    return json.load(f)
+            except OSError:
+                pass
+    return {
+        'SourceFile': path,
+        'FileName': os.path.basename(path),
+        'Directory': os.path.dirname(path),
+        'FileSize': os.path.getsize(path),
+    }
+
+def expand_args(argv):
+    args = []
+    i = 0
+    while i < len(argv):
+        if argv[i] == '-@' and i + 1 < len(argv):
+            source = argv[i + 1]
+            text = sys.stdin.read() if source == '-' else open(source, encoding='utf-8').read()
+            args.extend(line.strip() for line in text.splitlines() if line.strip())
+            i += 2
+            continue
+        args.append(argv[i])
+        i += 1
+    return args
+
+def run_command(args, out):
+    files = []
+    is_write = False
+    wants_json = False
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == '-echo' and i + 1 < len(args):
+            out.append(args[i + 1] + '\n')
+            i += 2
+            continue
+        if arg in VALUE_OPTIONS:
+            i += 2
+            continue
+        if arg == '-j':
+            wants_json = True
+        elif arg.startswith('-json=') or (arg.startswith('-') and '=' in arg):
+            is_write = True
+        elif not arg.startswith('-'):
+            files.append(arg)
+        i += 1
+
+    existing = [f for f in files if os.path.exists(f)]
+    errors = [f for f in files if not os.path.exists(f)]
+    for f in errors:
+        sys.stderr.write(f"Error: File not found - {f}\n")
+
+    if is_write:
+        out.append(f"    {len(existing)} image files updated\n")
+        if errors:
+            out.append(f"    {len(errors)} files weren't updated due to errors\n")
+    elif wants_json:
+        out.append(json.dumps([stub_metadata(f) for f in existing], ensure_ascii=False) + '\n')
+    return 1 if errors else 0
+
+def main(argv):
+    args = expand_args(argv)
+    commands = [[]]
+    for arg in args:
+        if arg == '-execute':
+            commands.append([])
+        else:
+            commands[-1].append(arg)
+
+    out = []
+    status = 0
+    for command in commands:
+        if command:
+            status = max(status, run_command(command, out))
+    sys.stdout.write(''.join(out))
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
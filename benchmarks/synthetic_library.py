@@ -0,0 +1,198 @@
+"""
+Synthetic photo library for the benchmarks.
+
+generate_library() writes N JPEGs (nested YYYY/MM-event folders) with EXIF dates,
+camera and GPS tags, an XMP packet with a title and MWG face regions, and, per file,
+the JSON record ExifTool would report for it (read by stub_exiftool.py).
+seed_faces() adds people and faces with synthetic 128-d encodings to the database.
+Everything is driven by a seeded RNG, so runs with the same parameters are comparable.
+"""
+import json
+import os
+import pickle
+import random
+from datetime import datetime, timedelta
+import numpy as np
+from PIL import Image, ImageDraw
+
+WORDS = ['beach', 'birthday', 'mountain', 'wedding', 'holiday', 'garden', 'city', 'snow',
+         'concert', 'family', 'dinner', 'harbor', 'forest', 'museum', 'picnic', 'sunset']
+CAMERAS = [('Canon', 'EOS 5D Mark IV'), ('NIKON CORPORATION', 'NIKON D750'), ('Apple', 'iPhone 13'),
+           ('SONY', 'ILCE-7M3'), ('FUJIFILM', 'X-T3')]
+PLACES = [(40.7128, -74.0060), (48.8566, 2.3522), (35.6762, 139.6503), (-33.8688, 151.2093),
+          (51.5074, -0.1278), (37.7749, -122.4194)]
+NAMES = ['Alice', 'Bob', 'Carla', 'David', 'Emma', 'Frank', 'Grace', 'Hugo', 'Ines', 'Jonas']
+
+XMP_TEMPLATE = """<?xpacket begin="" id="W5M0MpCehiHzreSzNTczkc9d"?>
+<x:xmpmeta xmlns:x="adobe:ns:meta/">
+ <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about=""
+    xmlns:dc="http://purl.org/dc/elements/1.1/"
+    xmlns:xmp="http://ns.adobe.com/xap/1.0/"
+    xmlns:mwg-rs="http://www.metadataworkinggroup.com/schemas/regions/"
+    xmlns:stArea="http://ns.adobe.com/xmp/sType/Area#"
+    xmlns:stDim="http://ns.adobe.com/xap/1.0/sType/Dimensions#"
+    xmp:Rating="{rating}">
+   <dc:title><rdf:Alt><rdf:li xml:lang="x-default">{title}</rdf:li></rdf:Alt></dc:title>
+   <dc:subject><rdf:Bag>{subjects}</rdf:Bag></dc:subject>
+   <mwg-rs:Regions rdf:parseType="Resource">
+    <mwg-rs:AppliedToDimensions stDim:w="{width}" stDim:h="{height}" stDim:unit="pixel"/>
+    <mwg-rs:RegionList><rdf:Bag>{regions}</rdf:Bag></mwg-rs:RegionList>
+   </mwg-rs:Regions>
+  </rdf:Description>
+ </rdf:RDF>
+</x:xmpmeta>
+<?xpacket end="w"?>"""
+
+XMP_REGION = ('<rdf:li rdf:parseType="Resource"><mwg-rs:Name>{name}</mwg-rs:Name><mwg-rs:Type>Face</mwg-rs:Type>'
+              '<mwg-rs:Area stArea:x="{x}" stArea:y="{y}" stArea:w="{w}" stArea:h="{h}" stArea:unit="normalized"/>'
+              '</rdf:li>')
+
+def _rational_dms(value):
+    value = abs(value)
+    degrees = int(value)
+    minutes = int((value - degrees) * 60)
+    seconds = round(((value - degrees) * 60 - minutes) * 60, 4)
+    return (degrees, minutes, seconds)
+
+def _image(rng, width, height):
+    """Cheap but JPEG-realistic content: gradient background plus random shapes."""
+    img = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(20, width // 2), y0 + rng.randrange(20, height // 2)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.rectangle((x0, y0, x1, y1), fill=color)
+        else:
+            draw.ellipse((x0, y0, x1, y1), fill=color)
+    return img
+
+def generate_library(root, meta_root, count, seed=1, size=(1024, 768)):
+    """
+    Writes count JPEGs below root and their stub metadata below meta_root.
+    Returns: List of generated file paths.
+    """
+    rng = random.Random(seed)
+    width, height = size
+    start = datetime(2005, 1, 1)
+    paths = []
+
+    for i in range(count):
+        taken = start + timedelta(seconds=rng.randrange(20 * 365 * 86400))
+        event = rng.choice(WORDS)
+        rel_dir = os.path.join(f"{taken.year}", f"{taken.month:02d}-{event}")
+        os.makedirs(os.path.join(root, rel_dir), exist_ok=True)
+        os.makedirs(os.path.join(meta_root, rel_dir), exist_ok=True)
+        rel_path = os.path.join(rel_dir, f"IMG_{i:06d}.jpg")
+        path = os.path.join(root, rel_path)
+
+        make, model = rng.choice(CAMERAS)
+        title = f"{event.capitalize()} {rng.choice(WORDS)} {i}"
+        keywords = rng.sample(WORDS, 3)
+        rating = rng.randrange(6)
+        lat = lng = None
+        if rng.random() < 0.6:
+            base_lat, base_lng = rng.choice(PLACES)
+            lat, lng = base_lat + rng.gauss(0, 0.05), base_lng + rng.gauss(0, 0.05)
+
+        regions = []
+        for _ in range(rng.choice([0, 0, 1, 1, 2, 3])):
+            w, h = round(rng.uniform(0.05, 0.2), 4), round(rng.uniform(0.05, 0.2), 4)
+            regions.append({'Name': rng.choice(NAMES), 'Type': 'Face',
+                            'Area': {'X': round(rng.uniform(w / 2, 1 - w / 2), 4), 'Y': round(rng.uniform(h / 2, 1 - h / 2), 4),
+                                     'W': w, 'H': h, 'Unit': 'normalized'}})
+
+        # EXIF (Pillow) + XMP packet, so a real ExifTool sees the same tags as the stub
+        exif = Image.Exif()
+        exif[0x010F] = make
+        exif[0x0110] = model
+        exif_ifd = exif.get_ifd(0x8769)
+        exif_ifd[0x9003] = taken.strftime('%Y:%m:%d %H:%M:%S')
+        if lat is not None:
+            gps = exif.get_ifd(0x8825)
+            gps[1] = 'N' if lat >= 0 else 'S'
+            gps[2] = _rational_dms(lat)
+            gps[3] = 'E' if lng >= 0 else 'W'
+            gps[4] = _rational_dms(lng)
+        xmp = XMP_TEMPLATE.format(
+            rating=rating, title=title, width=width, height=height,
+            subjects=''.join(f'<rdf:li>{k}</rdf:li>' for k in keywords),
+            regions=''.join(XMP_REGION.format(name=r['Name'], x=r['Area']['X'], y=r['Area']['Y'],
+                                              w=r['Area']['W'], h=r['Area']['H']) for r in regions),
+        )
+        img = _image(rng, width, height)
+        try:
+            img.save(path, 'JPEG', quality=85, exif=exif, xmp=xmp.encode('utf-8'))
+        except TypeError:
+            # Older Pillow without XMP support on save
+            img.save(path, 'JPEG', quality=85, exif=exif)
+
+        # What ExifTool would report (-j -a -struct -c %.8f)
+        meta = {
+            'SourceFile': path,
+            'FileName': os.path.basename(path),
+            'Directory': os.path.dirname(path),
+            'FileSize': os.path.getsize(path),
+            'FileType': 'JPEG',
+            'MIMEType': 'image/jpeg',
+            'ImageWidth': width,
+            'ImageHeight': height,
+            'Make': make,
+            'Model': model,
+            'DateTimeOriginal': taken.strftime('%Y:%m:%d %H:%M:%S'),
+            'CreateDate': taken.strftime('%Y:%m:%d %H:%M:%S'),
+            'Title': title,
+            'Subject': keywords,
+            'Rating': rating,
+        }
+        if lat is not None:
+            meta.update({
+                'GPSLatitudeRef': 'North' if lat >= 0 else 'South',
+                'GPSLongitudeRef': 'East' if lng >= 0 else 'West',
+                'GPSLatitude': f"{abs(lat):.8f} {'N' if lat >= 0 else 'S'}",
+                'GPSLongitude': f"{abs(lng):.8f} {'E' if lng >= 0 else 'W'}",
+            })
+        if regions:
+            meta['RegionInfo'] = {
+                'AppliedToDimensions': {'W': width, 'H': height, 'Unit': 'pixel'},
+                'RegionList': regions,
+            }
+        with open(os.path.join(meta_root, rel_path + '.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        paths.append(path)
+
+    return paths
+
+def seed_faces(db, asset_ids, num_people, num_faces, seed=1, confirmed_ratio=0.7):
+    """
+    Adds num_people people and num_faces faces (random assets, 128-d float64 encodings
+    clustered around a per-person centroid, like face_recognition produces).
+    Returns: List of all face ids.
+    """
+    from sqlalchemy import insert
+    from app.models import Face, Person
+
+    rng = np.random.default_rng(seed)
+    db.session.execute(insert(Person), [{'name': f"Person {i:04d}"} for i in range(num_people)])
+    db.session.commit()
+    person_ids = [p.id for p in Person.query.order_by(Person.id)]
+    centroids = rng.normal(0, 0.1, size=(len(person_ids), 128))
+
+    rows = []
+    for _ in range(num_faces):
+        person = int(rng.integers(len(person_ids)))
+        encoding = centroids[person] + rng.normal(0, 0.03, size=128)
+        confirmed = bool(rng.random() < confirmed_ratio)
+        rows.append({
+            'asset_id': int(rng.choice(asset_ids)),
+            'person_id': person_ids[person] if confirmed else None,
+            'encoding': pickle.dumps(encoding),
+            'location': [100, 300, 300, 100],
+            'is_confirmed': confirmed,
+        })
+    for i in range(0, len(rows), 1000):
+        db.session.execute(insert(Face), rows[i:i + 1000])
+    db.session.commit()
+    return [f.id for f in Face.query.with_entities(Face.id)]
@@ -9,7 +9,81 @@ class Config:
     # Default to a 'library' folder in the project root for dev
     LIBRARY_PATH = os.environ.get('LIBRARY_PATH') or os.path.join(os.getcwd(), 'test_assets')
     
-    # Increase timeout to fix "database is locked" errors
+    # Lock waits are handled by the busy_timeout pragma (see app/database.py) and the
+    # single background write queue, so the driver-level timeout can stay modest.
     SQLALCHEMY_ENGINE_OPTIONS = {
-        "connect_args": {"timeout": 30}
+        "connect_args": {"timeout": 10}
     }
+    # Overrides for app.database.DEFAULT_PRAGMAS, e.g. {'mmap_size': 0} on network drives
+    SQLITE_PRAGMAS = {}
+    # Seconds between PRAGMA optimize / WAL checkpoint runs (0 disables)
+    SQLITE_MAINTENANCE_INTERVAL = 600
+
+    # Incremental scans skip directories whose mtime is unchanged since the last scan.
+    # Every SCAN_FULL_VERIFY_DAYS a full verification walk is done regardless.
+    SCAN_FULL_VERIFY_DAYS = 7
+    # Rows per bulk INSERT transaction during scans
+    SCAN_WRITE_BATCH = 1000
+    # Hashing/ExifTool workers per physical device (roots sharing a disk share the budget)
+    SCAN_WORKERS_PER_DEVICE = 4
+
+    # Filesystem watcher (continuous incremental indexing). Off by default.
+    # Uses watchdog/inotify if installed, otherwise polls every WATCH_POLL_INTERVAL seconds.
+    WATCH_LIBRARIES = os.environ.get('WATCH_LIBRARIES', '0') == '1'
+    WATCH_DEBOUNCE_SECONDS = 2.0
+    WATCH_MAX_DELAY_SECONDS = 30.0
+    WATCH_POLL_INTERVAL = 60.0
+
+    # Metadata backup store (.metadata_history/segments). Compaction keeps the newest
+    # BACKUP_KEEP_LAST snapshots per file, plus anything newer than BACKUP_RETENTION_DAYS
+    # (None = count only). See run_backup_compaction.py.
+    BACKUP_SEGMENT_MAX_MB = 64
+    BACKUP_KEEP_LAST = 10
+    BACKUP_RETENTION_DAYS = 30
+
+    # /sync: writes DB edits (title, rating, people) back to files that are marked dirty.
+    # Assets are written in chunks (one backup + grouped ExifTool runs each) on a thread pool.
+    SYNC_CHUNK_SIZE = 100
+    SYNC_WORKERS = os.cpu_count() or 4
+
+    # Logging of scans, face processing, sync and exports (stdout).
+    # LOG_LEVEL=DEBUG shows per-file lines; LOG_FORMAT=json prints one JSON object per line.
+    # Loops log a progress line every LOG_PROGRESS_SECONDS; any single message template is
+    # limited to LOG_RATE_LIMIT lines per minute (0 = unlimited), the rest are counted.
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+    LOG_PROGRESS_SECONDS = float(os.environ.get('LOG_PROGRESS_SECONDS', '10'))
+    LOG_RATE_LIMIT = int(os.environ.get('LOG_RATE_LIMIT', '20'))
+
+    # Near-duplicate search: max differing bits between two 64-bit dHashes (0-15)
+    DUPLICATE_MAX_DISTANCE = 6
+
+    # Semantic search: natural-language /search queries matched against CLIP image
+    # embeddings (services/semantic.py). Off unless SEMANTIC_MODEL is set:
+    # 'onnx' (onnxruntime + tokenizers, model files in SEMANTIC_ONNX_DIR),
+    # 'open_clip' (torch CPU) or 'stand-in' (tiny test model, no dependencies).
+    # New images are embedded in the background after scans (SEMANTIC_INDEX_AFTER_SCAN),
+    # or with run_semantic_index.py. Queries with fewer than SEMANTIC_MIN_WORDS words stay
+    # on the metadata search.
+    SEMANTIC_MODEL = os.environ.get('SEMANTIC_MODEL') or None
+    SEMANTIC_ONNX_DIR = os.environ.get('SEMANTIC_ONNX_DIR') or os.path.join(os.getcwd(), 'instance', 'clip-onnx')
+    SEMANTIC_CLIP_MODEL = 'ViT-B-32'
+    SEMANTIC_CLIP_PRETRAINED = 'laion2b_s34b_b79k'
+    SEMANTIC_INDEX_DIR = None # Matrix files; default instance/semantic
+    SEMANTIC_BATCH_SIZE = int(os.environ.get('SEMANTIC_BATCH_SIZE', '32'))
+    SEMANTIC_THREADS = None # CPU threads for the model and the query scan (None = library default / all cores)
+    SEMANTIC_TOP_K = 200
+    SEMANTIC_MIN_WORDS = 3
+    SEMANTIC_INDEX_AFTER_SCAN = True
+
+    # Hot-path timings (hashing, ExifTool, DB commits, thumbnails, faces) exposed at
+    # /metrics (Prometheus text format) and per job on the Scan page. Off by default.
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+
+    # Request profiling: per-request wall time and SQL statement counts (Server-Timing
+    # header, /api/profiling), slow requests logged with their most repeated statements.
+    # PROFILER='cprofile' / 'pyinstrument' also saves a profile of slow requests (and of
+    # any request with ?profile=1) to instance/profiles. Off by default.
+    PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', '0') == '1'
+    PROFILE_SLOW_MS = int(os.environ.get('PROFILE_SLOW_MS', '500'))
+    PROFILER = os.environ.get('PROFILER') or None
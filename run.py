@@ -1,6 +1,14 @@
+import os
 from app import create_app
 
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    debug = os.environ.get('FLASK_DEBUG', '1') != '0'
+    # With the reloader (debug) the parent process only spawns and restarts the child that
+    # serves; watch in the serving process only. Without it, this process serves.
+    # (Other servers start the watcher with the first request, see watcher.init_watcher.)
+    if app.config.get('WATCH_LIBRARIES') and (not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+        from app.services.watcher import start_watcher
+        start_watcher(app)
+    app.run(debug=debug)
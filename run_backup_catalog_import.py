@@ -0,0 +1,18 @@
+import os
+import sys
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+
+from app import create_app
+from app.services import metadata_backup
+
+app = create_app()
+
+print(">>> Indexing existing metadata backups...")
+print(f"    Scanning {metadata_backup.get_backup_root()} (one-time; already indexed files are skipped).")
+
+with app.app_context():
+    added = metadata_backup.index_existing_backups()
+
+print(f"\nDone! Added {added} backups to the catalog.")
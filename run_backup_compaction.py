@@ -0,0 +1,22 @@
+import os
+import sys
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+
+from app import create_app
+from app.services import metadata_backup
+
+app = create_app()
+
+print(">>> Compacting metadata backups...")
+print(f"    Keeping the newest {app.config.get('BACKUP_KEEP_LAST')} per file, "
+      f"plus anything newer than {app.config.get('BACKUP_RETENTION_DAYS')} days.")
+print("    Legacy per-file JSON backups are moved into the compressed store.")
+
+with app.app_context():
+    stats = metadata_backup.compact_backups()
+
+print(f"\nDone! Dropped {stats['dropped']} old backups, kept {stats['kept']} "
+      f"({stats['migrated']} migrated from JSON files).")
+print(f"Store size: {stats['bytes_before'] / 1024:.1f} KB -> {stats['bytes_after'] / 1024:.1f} KB")
@@ -0,0 +1,73 @@
+import concurrent.futures
+import os
+import sys
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+
+from app import create_app
+from app.database import get_write_queue
+from app.services.duplicates import missing_hash_query, rebuild_duplicates, store_hashes
+from app.services.logs import get_logger, Progress
+from app.services.phash import grids_from_file, hash_batch
+from app.utils import generate_thumbnail, get_thumbnail_path
+
+# Usage: python run_duplicate_scan.py [max_distance]
+# 1. Computes perceptual hashes (dHash / aHash / pHash) for images that don't have them
+#    yet: from the cached thumbnail, or by generating the thumbnail. Thumbnails are
+#    decoded on a thread pool and hashed BATCH at a time with NumPy.
+# 2. Rebuilds the exact / similar duplicate groups shown at /duplicates.
+max_distance = int(sys.argv[1]) if len(sys.argv) > 1 else None
+BATCH = 500
+WORKERS = os.cpu_count() or 4
+
+app = create_app()
+log = get_logger('run_duplicate_scan')
+
+def load(row):
+    """Returns: ('grids', grids) from the cached thumbnail, ('generated', ok) or ('error', None)"""
+    asset_id, file_path = row
+    with app.app_context():
+        thumb_path = get_thumbnail_path(asset_id)
+        if os.path.exists(thumb_path):
+            try:
+                return 'grids', grids_from_file(thumb_path)
+            except Exception as e:
+                log.warning("Could not hash %s: %s", thumb_path, e)
+                return 'error', None
+        # Generating the thumbnail records the hashes too
+        return 'generated', generate_thumbnail(file_path, asset_id) is not None
+
+with app.app_context():
+    queue = get_write_queue(app)
+    rows = missing_hash_query().all()
+    print(f">>> Hashing {len(rows)} images without perceptual hashes ({WORKERS} threads)...")
+
+    progress = Progress(log, 'Hashes', total=len(rows))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='phash') as pool:
+        for start in range(0, len(rows), BATCH):
+            chunk = rows[start:start + BATCH]
+            ids, grid_list = [], []
+            generated = errors = 0
+            for (asset_id, _), (kind, value) in zip(chunk, pool.map(load, chunk)):
+                if kind == 'grids':
+                    ids.append(asset_id)
+                    grid_list.append(value)
+                elif kind == 'generated' and value:
+                    generated += 1
+                else:
+                    errors += 1
+
+            hashes = hash_batch(grid_list)
+            columns = {name: values.tolist() for name, values in hashes.items()}
+            if ids:
+                queue.submit(store_hashes, {
+                    asset_id: {name: columns[name][i] for name in columns} for i, asset_id in enumerate(ids)
+                })
+            progress.update(len(chunk), from_thumbnail=len(ids), generated=generated, errors=errors)
+    progress.finish()
+
+    print(">>> Grouping duplicates...")
+    counts = queue.run(rebuild_duplicates, max_distance)
+
+print(f"\nDone! Exact groups: {counts['exact']}, Similar groups: {counts['similar']} ({counts['hashed']} images hashed)")
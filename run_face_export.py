@@ -0,0 +1,24 @@
+import os
+import sys
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+
+from app import create_app
+from app.services import face_export
+
+# Usage: python run_face_export.py [--force] [chunk_size]
+force = '--force' in sys.argv
+args = [a for a in sys.argv[1:] if a != '--force']
+chunk_size = int(args[0]) if args else 200
+
+app = create_app()
+
+print(">>> Exporting confirmed faces to XMP-mwg-rs RegionInfo...")
+print(f"    {chunk_size} files per ExifTool run. Files whose regions already match are skipped" +
+      (" (disabled by --force)." if force else "."))
+
+with app.app_context():
+    totals = face_export.export_face_regions(chunk_size=chunk_size, force=force)
+
+print(f"\nDone! Written: {totals['written']}, Unchanged: {totals['skipped']}, Failed: {totals['failed']}")
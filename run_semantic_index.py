@@ -0,0 +1,28 @@
+import os
+import sys
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+
+from app import create_app
+from app.services.semantic import get_model, index_missing
+
+# Usage: python run_semantic_index.py [batch_size] [limit]
+# Embeds every image that has no embedding from the configured SEMANTIC_MODEL yet
+# (from the cached thumbnails; missing ones are generated). Safe to stop and re-run:
+# it picks up where it left off.
+batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else None
+limit = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+app = create_app()
+
+with app.app_context():
+    model = get_model(app)
+    if model is None:
+        print("Semantic search is not available: set SEMANTIC_MODEL (and install its dependencies), see config.py.")
+        sys.exit(1)
+
+    print(f">>> Embedding images with {model.key} ({model.dim} dimensions)...")
+    count = index_missing(app, batch_size=batch_size, limit=limit)
+
+print(f"\nDone! Embedded {count} images.")
@@ -0,0 +1,119 @@
+"""
+Concurrency stress test: runs a full scan while hammering the grid endpoints.
+
+Creates a throwaway library + database in a temp folder, starts "Scan All" on one
+thread and several reader threads requesting /, /search and /folders (plus a few
+small request-side writes), then reports latency and any failed / locked requests.
+
+Usage: python run_stress_test.py [num_files] [reader_threads] [seconds]
+Exit code is 1 if any request failed.
+"""
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+
+NUM_FILES = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+READERS = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+MIN_SECONDS = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+work_dir = tempfile.mkdtemp(prefix='archivedb_stress_')
+library = os.path.join(work_dir, 'library')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(work_dir, 'stress.sqlite')
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+
+from app import create_app, db
+from app.models import LibraryPath
+
+print(f">>> Generating {NUM_FILES} files in {library}...")
+for i in range(NUM_FILES):
+    folder = os.path.join(library, f"{2000 + i % 20}", f"{i % 12 + 1:02d}")
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, f"img_{i:06d}.txt"), 'w') as f:
+        f.write(f"stress file {i}")
+
+app = create_app()
+with app.app_context():
+    db.session.add(LibraryPath(path=library))
+    db.session.commit()
+
+stop = threading.Event()
+lock = threading.Lock()
+latencies = []
+failures = []
+
+def record(label, started, response):
+    elapsed = time.perf_counter() - started
+    with lock:
+        latencies.append(elapsed)
+        if response.status_code >= 400:
+            failures.append(f"{label} -> HTTP {response.status_code}")
+
+def reader(n):
+    client = app.test_client()
+    urls = ['/', '/?page=2', '/?sort=date_asc', '/search?q=stress', f'/folders?path={library}']
+    i = 0
+    while not stop.is_set():
+        url = urls[i % len(urls)]
+        started = time.perf_counter()
+        try:
+            record(url, started, client.get(url))
+        except Exception as e:
+            with lock:
+                failures.append(f"{url} -> {e}")
+        i += 1
+
+def request_writer():
+    # Small request-side writes competing with the scan's writer
+    client = app.test_client()
+    i = 0
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            record('POST /people', started, client.post('/people', data={'name': f"Stress Person {i}"}))
+        except Exception as e:
+            with lock:
+                failures.append(f"POST /people -> {e}")
+        i += 1
+        time.sleep(0.05)
+
+def scanner():
+    client = app.test_client()
+    started = time.perf_counter()
+    response = client.post('/scan/all')
+    print(f"    Scan finished in {time.perf_counter() - started:.1f}s (HTTP {response.status_code})")
+    if response.status_code >= 400:
+        failures.append(f"POST /scan/all -> HTTP {response.status_code}")
+
+threads = [threading.Thread(target=reader, args=(n,)) for n in range(READERS)]
+threads.append(threading.Thread(target=request_writer))
+scan_thread = threading.Thread(target=scanner)
+
+print(f">>> Scanning while {READERS} readers hammer the grid...")
+t0 = time.perf_counter()
+for t in threads:
+    t.start()
+scan_thread.start()
+scan_thread.join()
+while time.perf_counter() - t0 < MIN_SECONDS:
+    time.sleep(0.1)
+stop.set()
+for t in threads:
+    t.join()
+
+latencies.sort()
+count = len(latencies)
+if count:
+    p50 = latencies[count // 2] * 1000
+    p95 = latencies[int(count * 0.95)] * 1000
+    print(f"\nRequests: {count}  p50: {p50:.1f} ms  p95: {p95:.1f} ms  max: {latencies[-1] * 1000:.1f} ms")
+print(f"Failures: {len(failures)}")
+for f in failures[:20]:
+    print(f"    {f}")
+
+shutil.rmtree(work_dir, ignore_errors=True)
+sys.exit(1 if failures else 0)